@@ -0,0 +1,181 @@
+"""
+This module provides admission control of the storage operations.
+
+AdmissionController lets at most `max_in_flight` operations run at
+once. When they are all busy, the operations of the priorities that may
+be shed (the inline reads) are rejected at once with Overloaded, so the
+caller can answer from a cache, and the others wait in a queue ordered
+by priority and then by arrival: moderation decisions and suggestions
+first, then the reads of the commands.
+A slot freed by a finished operation is handed to the first waiter
+directly, so nothing overtakes the queue.
+
+The controller belongs to one event loop and is not thread-safe,
+the operations themselves may run anywhere, e.g. on an executor.
+"""
+
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+
+class Priority(IntEnum):
+    """Operation priorities, the lower ones are admitted first."""
+    WRITE = 0
+    READ = 1
+    # shed instead of queued when the limit is reached
+    INLINE = 2
+
+
+class Overloaded(Exception):
+    """Raised for an operation shed because of the in-flight limit."""
+
+
+class AdmissionController:
+    """
+    Bounded in-flight operations with a priority queue and shedding.
+
+    Attributes:
+        max_in_flight (int): The most operations running at once.
+        shed_priority (Priority): Operations of this and lower
+            priorities are shed instead of queued.
+        in_flight (int): Number of operations running now.
+        peak_in_flight (int): The largest number of operations run
+            at once.
+        max_queued (int): The longest the queue has been.
+        admitted (Counter): Admitted operations per priority name.
+        shed (Counter): Shed operations per priority name.
+        queued_count (Counter): Admitted operations that waited in
+            the queue per priority name.
+        total_queue_wait (dict): Seconds queued operations waited
+            per priority name.
+        max_queue_wait (dict): The longest wait in the queue
+            per priority name, in seconds.
+    """
+
+    def __init__(
+        self, max_in_flight: int, shed_priority: Priority = Priority.INLINE
+    ):
+        self.max_in_flight = max_in_flight
+        self.shed_priority = shed_priority
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.max_queued = 0
+        self.admitted: Counter = Counter()
+        self.shed: Counter = Counter()
+        self.queued_count: Counter = Counter()
+        self.total_queue_wait: Dict[str, float] = Counter()
+        self.max_queue_wait: Dict[str, float] = {}
+        # (priority, arrival, asyncio future) of the waiting operations,
+        # cancelled futures stay until they reach the top
+        self._waiters: List[Tuple[int, int, Any]] = []
+        self._queued = 0
+        self._arrivals = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        """The number of operations waiting in the queue."""
+        return self._queued
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority) -> AsyncIterator[None]:
+        """
+        Holds a slot for the operation run in the context.
+
+        :param priority: The priority of the operation.
+        :return: A context manager, raises Overloaded if the operation
+            is shed.
+        """
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: Priority) -> None:
+        """
+        Takes a slot, waiting in the queue when there is none.
+        Every successful acquire() needs a release().
+
+        :param priority: The priority of the operation.
+        :return: None, raises Overloaded if the operation is shed.
+        """
+        if self.in_flight < self.max_in_flight and not self._queued:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.admitted[priority.name] += 1
+            return
+        if priority >= self.shed_priority:
+            self.shed[priority.name] += 1
+            raise Overloaded(
+                f'{self.in_flight} storage operations in flight, '
+                f'{self._queued} queued'
+            )
+        # imported here like in PredictionStorageAsync._run, db_tools.py
+        # imports this module and its command line does without asyncio
+        import asyncio
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters, (priority, next(self._arrivals), future)
+        )
+        self._queued += 1
+        self.max_queued = max(self.max_queued, self._queued)
+        queued_at = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._queued -= 1
+            else:
+                # the slot was handed over right before the cancellation
+                self.release()
+            raise
+        wait = time.perf_counter() - queued_at
+        self.admitted[priority.name] += 1
+        self.queued_count[priority.name] += 1
+        self.total_queue_wait[priority.name] += wait
+        self.max_queue_wait[priority.name] = max(
+            self.max_queue_wait.get(priority.name, 0.0), wait
+        )
+
+    def release(self) -> None:
+        """Frees a slot or hands it to the first waiter."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._queued -= 1
+            future.set_result(None)
+            return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the admission statistic.
+
+        :return: A dict with the limit, the operations in flight and
+            queued now, their peaks, the admitted and shed operations
+            per priority and the average and the max queue wait in ms
+            per priority of the operations that waited.
+        """
+        return {
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'queued': self._queued,
+            'max_queued': self.max_queued,
+            'admitted': dict(self.admitted),
+            'shed': dict(self.shed),
+            'avg_queue_wait_ms': {
+                name: round(wait / self.queued_count[name] * 1000, 2)
+                for name, wait in self.total_queue_wait.items()
+            },
+            'max_queue_wait_ms': {
+                name: round(wait * 1000, 1)
+                for name, wait in self.max_queue_wait.items()
+            },
+        }
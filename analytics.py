@@ -0,0 +1,303 @@
+"""
+This module provides the analytics log of the served and the chosen
+predictions.
+
+Every prediction an inline query is answered with is logged as served,
+and every prediction a user sends from the answer as chosen (from
+chosen_inline_result updates, which Telegram sends only when inline
+feedback is enabled for the bot with /setinlinefeedback in @BotFather).
+
+Logging an event costs the handler one list append: AnalyticsLog
+buffers the events and a job of the bot writes them in batches on the
+default executor to a SQLite database of their own, so the analytics
+never compete with the predictions database for its write lock. User
+ids are stored as salted hashes, the salt is kept in that database.
+
+Every row of the events table looks like:
+    (ts, event, user_hash, prediction_id)
+with the unix timestamp in seconds and EVENT_SERVED or EVENT_CHOSEN.
+
+Usage:
+    python analytics.py popularity --days 30 --bucket day --top 10
+    python analytics.py popularity --prediction_id 42 --bucket week
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+import constants
+from utils import setup_logger
+
+EVENT_SERVED = 0
+EVENT_CHOSEN = 1
+# strftime formats of the popularity periods, None - all time at once
+BUCKET_FORMATS: Dict[str, Optional[str]] = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'all': None,
+}
+SCHEMA_QUERIES: Tuple[str, ...] = (
+    'PRAGMA journal_mode = WAL',
+    'CREATE TABLE IF NOT EXISTS events ('
+    'ts INTEGER NOT NULL, '
+    'event INTEGER NOT NULL, '
+    'user_hash INTEGER NOT NULL, '
+    'prediction_id INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS events_ts ON events (ts)',
+    'CREATE INDEX IF NOT EXISTS events_prediction_ts '
+    'ON events (prediction_id, ts)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)',
+)
+SALT_KEY = 'user_salt'
+INSERT_EVENTS_QUERY = (
+    'INSERT INTO events (ts, event, user_hash, prediction_id) '
+    'VALUES (?, ?, ?, ?)'
+)
+POPULARITY_QUERY = (
+    "SELECT COALESCE(strftime(?, ts, 'unixepoch'), 'all') AS period, "
+    'prediction_id, '
+    f'SUM(event = {EVENT_SERVED}) AS served, '
+    f'SUM(event = {EVENT_CHOSEN}) AS chosen, '
+    'COUNT(DISTINCT user_hash) AS users '
+    'FROM events WHERE ts >= ? {prediction_filter}'
+    'GROUP BY period, prediction_id '
+    'ORDER BY period, chosen DESC, served DESC'
+)
+
+
+class AnalyticsLog:
+    """
+    Buffers the served and the chosen predictions and writes them
+    to the analytics database in batches.
+
+    Attributes:
+        db_name (str): The analytics database file.
+        served_count (int): Number of served events logged.
+        chosen_count (int): Number of chosen events logged.
+        flushed (int): Number of events written to the database.
+        dropped (int): Number of events lost to failed writes.
+        last_flush (dict | None): The number of events and the duration
+            of the last write.
+        logger (logging.Logger): The logger instance for this class.
+
+    Methods:
+        served(user_id, prediction_id):
+            Logs a prediction an inline query was answered with.
+
+        chosen(user_id, prediction_id):
+            Logs a prediction a user sent.
+
+        flush_async():
+            Writes the buffered events on the default executor.
+    """
+
+    def __init__(
+        self, db_name: str = constants.ANALYTICS_DB_NAME,
+        logging_level: int = logging.INFO
+    ):
+        self.db_name = db_name
+        self.served_count = 0
+        self.chosen_count = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.last_flush: Optional[Dict] = None
+        # (ts, event, user id, prediction id), hashed when written
+        self._events: List[Tuple[float, int, int, int]] = []
+        # read or created with the schema on the first write
+        self._salt: Optional[bytes] = None
+        self._write_lock = threading.Lock()
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __len__(self) -> int:
+        """The number of buffered events."""
+        return len(self._events)
+
+    def served(self, user_id: int, prediction_id: int) -> None:
+        """Logs a prediction an inline query of the user was answered with."""
+        self.served_count += 1
+        self._events.append(
+            (time.time(), EVENT_SERVED, user_id, prediction_id)
+        )
+
+    def chosen(self, user_id: int, prediction_id: int) -> None:
+        """Logs a prediction the user sent from an inline answer."""
+        self.chosen_count += 1
+        self._events.append(
+            (time.time(), EVENT_CHOSEN, user_id, prediction_id)
+        )
+
+    async def flush_async(self) -> int:
+        """
+        Writes the buffered events on the default executor, events
+        logged meanwhile wait for the next flush. The events of a failed
+        write are dropped and counted in `dropped`.
+
+        :return: The number of events written.
+        """
+        events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.write, events
+            )
+        except Exception:  # pylint: disable=broad-except
+            self.dropped += len(events)
+            self.logger.exception(
+                'Writing %s analytics events failed', len(events)
+            )
+            return 0
+        return len(events)
+
+    def write(self, events: List[Tuple[float, int, int, int]]) -> None:
+        """
+        Writes events to the analytics database in one transaction.
+
+        :param events: (ts, event, user id, prediction id) tuples.
+        :return: None
+        """
+        started = time.perf_counter()
+        with self._write_lock:
+            connection = sqlite3.connect(self.db_name)
+            with closing(connection):
+                if self._salt is None:
+                    self._salt = self._prepare(connection)
+                hashes: Dict[int, int] = {}
+                rows = []
+                for ts, event, user_id, prediction_id in events:
+                    if user_id not in hashes:
+                        hashes[user_id] = self._hash(user_id)
+                    rows.append(
+                        (int(ts), event, hashes[user_id], prediction_id)
+                    )
+                with connection:
+                    connection.executemany(INSERT_EVENTS_QUERY, rows)
+            self.flushed += len(events)
+            self.last_flush = {
+                'events': len(events),
+                'duration': time.perf_counter() - started,
+            }
+
+    def _hash(self, user_id: int) -> int:
+        digest = hmac.new(
+            self._salt, str(user_id).encode(), hashlib.sha256
+        ).digest()
+        # 7 bytes fit a positive SQLite INTEGER
+        return int.from_bytes(digest[:7], 'big') or 1
+
+    @staticmethod
+    def _prepare(connection: sqlite3.Connection) -> bytes:
+        """Creates the schema if missing and returns the salt."""
+        for query in SCHEMA_QUERIES:
+            connection.execute(query)
+        with connection:
+            # os.urandom, the secrets module is the local secrets.py
+            connection.execute(
+                'INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+                (SALT_KEY, os.urandom(16))
+            )
+        return connection.execute(
+            'SELECT value FROM meta WHERE key = ?', (SALT_KEY, )
+        ).fetchone()[0]
+
+
+def popularity(
+    db_name: str, days: float, bucket: str = 'day', top: int = 10,
+    prediction_id: Optional[int] = None
+) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Returns the most popular predictions per period.
+
+    :param db_name: The analytics database file.
+    :param days: How many days back to look.
+    :param bucket: The period, one of BUCKET_FORMATS.
+    :param top: The number of predictions per period.
+    :param prediction_id: If set, only this prediction is reported.
+    :return: (period, prediction id, served, chosen, distinct users)
+        tuples by period, the most chosen first.
+    """
+    query = POPULARITY_QUERY.format(
+        prediction_filter='AND prediction_id = ? '
+        if prediction_id is not None else ''
+    )
+    parameters: Tuple = (
+        BUCKET_FORMATS[bucket], int(time.time() - days * 24 * 60 * 60)
+    )
+    if prediction_id is not None:
+        parameters += (prediction_id, )
+    connection = sqlite3.connect(f'file:{db_name}?mode=ro', uri=True)
+    with closing(connection):
+        rows = connection.execute(query, parameters).fetchall()
+    per_period: Dict[str, int] = {}
+    result = []
+    for row in rows:
+        if per_period.get(row[0], 0) < top:
+            per_period[row[0]] = per_period.get(row[0], 0) + 1
+            result.append(row)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Analytics of the served and the chosen predictions'
+    )
+    parser.add_argument('--analytics_db', default=constants.ANALYTICS_DB_NAME)
+    parser.add_argument(
+        '--db', default=constants.DB_NAME,
+        help='The predictions database the texts are taken from'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    popularity_parser = subparsers.add_parser(
+        'popularity', help='The most served and chosen predictions over time'
+    )
+    popularity_parser.add_argument('--days', type=float, default=30)
+    popularity_parser.add_argument(
+        '--bucket', choices=tuple(BUCKET_FORMATS), default='day'
+    )
+    popularity_parser.add_argument(
+        '--top', type=int, default=10, help='Predictions per period'
+    )
+    popularity_parser.add_argument('--prediction_id', type=int)
+    args = parser.parse_args()
+
+    rows = popularity(
+        args.analytics_db, args.days, args.bucket, args.top,
+        args.prediction_id
+    )
+    texts: Dict[int, str] = {}
+    if os.path.exists(args.db):
+        with closing(
+            sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+        ) as connection:
+            for row in rows:
+                prediction = connection.execute(
+                    'SELECT prediction_text FROM predictions '
+                    'WHERE prediction_id = ?', (row[1], )
+                ).fetchone()
+                texts[row[1]] = prediction[0] if prediction else ''
+    print(
+        f"{'period':<17}{'id':>8}{'served':>9}{'chosen':>8}"
+        f"{'chosen %':>10}{'users':>7}  text"
+    )
+    for period, prediction_id, served, chosen, users in rows:
+        rate = f'{chosen / served * 100:.1f}' if served else '-'
+        print(
+            f'{period:<17}{prediction_id:>8}{served:>9}{chosen:>8}'
+            f"{rate:>10}{users:>7}  {texts.get(prediction_id, '')[:60]}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the kind predictions bot.
+
+Every benchmark is a runnable module, launch it from the repository root:
+    python -m benchmarks.<module_name> --help
+"""
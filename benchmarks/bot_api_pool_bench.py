@@ -0,0 +1,195 @@
+"""
+Benchmark of the Bot API connection pools against the local fake
+Bot API server.
+
+While a getUpdates long poll is in flight, bursts of concurrent
+answerInlineQuery, sendMessage and editMessageText calls are made
+through InstrumentedHTTPXRequest pools of several sizes, and through
+a single connection shared with getUpdates for reference. Reports
+call latency, failed calls (pool timeouts, or calls still waiting
+after --call_timeout, as the shared connection is rarely handed over
+by a busy long poll), the pool wait measured by the instrumentation
+and the connections opened.
+
+Usage:
+    python -m benchmarks.bot_api_pool_bench
+    python -m benchmarks.bot_api_pool_bench --pool_sizes 1 8 32 256 \
+        --burst 200 --bursts 3 --latency 0.05 --connect_latency 0.1
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+from telegram import Bot
+
+import constants
+from bot_api_request import InstrumentedHTTPXRequest, build_request
+from fake_bot_api import FAKE_BOT_TOKEN, FakeBotAPIServer
+
+DEFAULT_POOL_SIZES = (1, 8, 32, 256)
+
+
+def _request(
+    name: str, pool_size: int, pool_timeout: float
+) -> InstrumentedHTTPXRequest:
+    return build_request(
+        name, pool_size, pool_timeout, constants.BOT_API_CONNECT_TIMEOUT,
+        constants.BOT_API_READ_TIMEOUT, constants.BOT_API_WRITE_TIMEOUT
+    )
+
+
+async def _call(bot: Bot, rnd: random.Random) -> None:
+    kind = rnd.random()
+    if kind < 0.6:
+        await bot.answer_inline_query(str(rnd.randint(1, 10 ** 9)), [])
+    elif kind < 0.9:
+        await bot.send_message(rnd.randint(1, 10 ** 6), 'Бенчмарк')
+    else:
+        await bot.edit_message_text(
+            'Бенчмарк', chat_id=rnd.randint(1, 10 ** 6), message_id=1
+        )
+
+
+async def _timed_call(
+    bot: Bot, rnd: random.Random, timeout: float
+) -> Optional[float]:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_call(bot, rnd), timeout)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    return time.perf_counter() - started
+
+
+async def benchmark_pool(
+    args: argparse.Namespace, pool_size: int, shared: bool
+) -> Dict[str, object]:
+    """
+    Runs the bursts through one pool configuration.
+
+    :param args: The command line arguments.
+    :param pool_size: The size of the pool of the outbound calls.
+    :param shared: Whether getUpdates uses the same pool.
+    :return: The latencies and the pool statistic.
+    """
+    server = FakeBotAPIServer(
+        latency=args.latency, connect_latency=args.connect_latency,
+        max_poll=args.poll_timeout
+    )
+    await server.start()
+    outbound = _request('outbound', pool_size, args.pool_timeout)
+    updates = outbound if shared else _request(
+        'get_updates', constants.BOT_API_GET_UPDATES_POOL_SIZE,
+        args.pool_timeout
+    )
+    rnd = random.Random(args.seed)
+    latencies: List[Optional[float]] = []
+    bot = Bot(
+        FAKE_BOT_TOKEN, base_url=server.base_url, request=outbound,
+        get_updates_request=updates
+    )
+    async with bot:
+        async def poll() -> None:
+            while True:
+                await bot.get_updates(timeout=args.poll_timeout)
+
+        poller = asyncio.create_task(poll())
+        # the long poll takes its connection first, like in the bot
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        for _ in range(args.bursts):
+            latencies += await asyncio.gather(*(
+                _timed_call(bot, rnd, args.call_timeout)
+                for _ in range(args.burst)
+            ))
+            await asyncio.sleep(args.pause)
+        elapsed = time.perf_counter() - started - args.pause * args.bursts
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+    await server.stop()
+    done = sorted(latency for latency in latencies if latency is not None)
+    return {
+        'latencies': done,
+        'failed': len(latencies) - len(done),
+        'calls_per_s': len(done) / elapsed if elapsed else 0,
+        'stats': outbound.stats(),
+    }
+
+
+def _ms(latencies: List[float], quantile: float) -> float:
+    if not latencies:
+        return float('nan')
+    position = min(len(latencies) - 1, int(len(latencies) * quantile))
+    return latencies[position] * 1000
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f'{args.bursts} bursts of {args.burst} calls, '
+        f'{args.latency * 1000:.0f}ms Bot API latency, '
+        f'{args.connect_latency * 1000:.0f}ms per new connection, '
+        f'pool timeout {args.pool_timeout}s\n'
+        f"{'pool':<22}{'p50 ms':>9}{'p99 ms':>9}{'calls/s':>9}"
+        f"{'failed':>8}{'wait avg':>10}{'wait max':>10}{'conns':>7}"
+    )
+    configurations = [(1, True)] + [(size, False) for size in args.pool_sizes]
+    for pool_size, shared in configurations:
+        result = await benchmark_pool(args, pool_size, shared)
+        stats = result['stats']
+        label = (
+            f'shared, {pool_size} connection' if shared
+            else f'separate, {pool_size}'
+        )
+        print(
+            f"{label:<22}{_ms(result['latencies'], 0.5):>9.1f}"
+            f"{_ms(result['latencies'], 0.99):>9.1f}"
+            f"{result['calls_per_s']:>9.0f}{result['failed']:>8}"
+            f"{stats['avg_pool_wait_ms']:>10.1f}"
+            f"{stats['max_pool_wait_ms']:>10.1f}"
+            f"{stats['connections_opened']:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--pool_sizes', type=int, nargs='+', default=DEFAULT_POOL_SIZES,
+        help='Sizes of the separate outbound pool to compare'
+    )
+    parser.add_argument(
+        '--burst', type=int, default=200, help='Concurrent calls per burst'
+    )
+    parser.add_argument('--bursts', type=int, default=3)
+    parser.add_argument(
+        '--pause', type=float, default=0.5,
+        help='Seconds between bursts, not counted in calls/s'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='Seconds every fake Bot API call takes'
+    )
+    parser.add_argument(
+        '--connect_latency', type=float, default=0.1,
+        help='Seconds added to the first call on a new connection'
+    )
+    parser.add_argument(
+        '--poll_timeout', type=float, default=2.0,
+        help='Seconds the getUpdates long poll is held'
+    )
+    parser.add_argument(
+        '--pool_timeout', type=float, default=constants.BOT_API_POOL_TIMEOUT
+    )
+    parser.add_argument(
+        '--call_timeout', type=float, default=10.0,
+        help='Seconds after which a call counts as failed'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
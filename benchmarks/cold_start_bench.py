@@ -0,0 +1,191 @@
+"""
+Cold-start benchmark of the bot.
+
+Starts the bot in a fresh interpreter against a copy of a seeded
+database and a fake Bot API with the given round-trip latency, sends
+it one inline query and reports how long after the process was
+spawned each start-up phase finished, up to the answered query:
+- imported: the interpreter is up and bot.py is imported;
+- constructed: KindPredictionsBot (the database schema check) is built;
+- initialized: the application and the Bot API (getMe) are initialised;
+- post_init: the caches are warmed up and the jobs are scheduled;
+- answered: the first inline query is answered.
+
+Every run is made with WarmStartApplication, which warms the caches up
+while the Bot API is being initialised, and with the plain Application,
+which warms them up in post_init afterwards.
+
+Usage:
+    python -m benchmarks.cold_start_bench
+    python -m benchmarks.cold_start_bench --size 100000 --runs 5 \
+        --latency 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+DEFAULT_SIZE = 100_000
+PHASES = ('imported', 'constructed', 'initialized', 'post_init', 'answered')
+MODES = ('warm_start', 'sequential')
+INLINE_QUERY_UPDATE = {
+    'update_id': 1,
+    'inline_query': {
+        'id': '1',
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Cold'},
+        'query': '',
+        'offset': '',
+    },
+}
+
+
+async def _serve_first_update(
+    bot, latency: float, mode: str, marks: Dict[str, float]
+) -> None:
+    from telegram import Update
+    from telegram.ext import Application
+
+    import constants
+    from bot import WarmStartApplication, add_handlers
+    from fake_bot_api import FAKE_BOT_TOKEN, FakeBotAPIRequest
+    from update_processor import OrderedUpdateProcessor
+
+    class AnsweringRequest(FakeBotAPIRequest):
+        def __init__(self, latency: float):
+            super().__init__(latency)
+            self.answered = asyncio.Event()
+
+        async def do_request(self, url: str, *args, **kwargs):
+            response = await super().do_request(url, *args, **kwargs)
+            if url.endswith('/answerInlineQuery'):
+                self.answered.set()
+            return response
+
+    request = AnsweringRequest(latency)
+    builder = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeBotAPIRequest())
+        .concurrent_updates(OrderedUpdateProcessor(
+            constants.MAX_CONCURRENT_UPDATES, constants.MAX_PENDING_UPDATES
+        ))
+    )
+    if mode == 'warm_start':
+        builder = builder.application_class(
+            WarmStartApplication, {'warm_up': bot.start_warm_up}
+        )
+    application = builder.build()
+    add_handlers(application, bot)
+    async with application:
+        marks['initialized'] = time.time()
+        # post_init/post_shutdown are only called by run_polling
+        await bot.post_init(application)
+        marks['post_init'] = time.time()
+        await application.start()
+        await application.update_queue.put(
+            Update.de_json(INLINE_QUERY_UPDATE, application.bot)
+        )
+        await request.answered.wait()
+        marks['answered'] = time.time()
+        await application.stop()
+        await bot.post_shutdown(application)
+
+
+def child(db_name: str, latency: float, mode: str) -> None:
+    """
+    Starts the bot once and prints the phase timestamps as JSON,
+    run in a fresh interpreter by measure().
+    """
+    marks = {}
+    from bot import KindPredictionsBot
+    marks['imported'] = time.time()
+    bot = KindPredictionsBot(
+        logging_level=logging.WARNING, test_run=True, db_name=db_name,
+        analytics_db=None
+    )
+    marks['constructed'] = time.time()
+    asyncio.run(_serve_first_update(bot, latency, mode, marks))
+    print(json.dumps(marks))
+
+
+def measure(
+    template: str, work: str, latency: float, mode: str
+) -> Dict[str, float]:
+    """
+    Runs one cold start on a fresh copy of the template database.
+
+    :return: {phase: seconds since the process was spawned}.
+    """
+    shutil.copyfile(template, work)
+    spawned = time.time()
+    output = subprocess.run(
+        [
+            sys.executable, '-m', 'benchmarks.cold_start_bench',
+            '--child', work, '--latency', str(latency), '--mode', mode,
+        ],
+        check=True, capture_output=True, text=True
+    ).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    return {phase: marks[phase] - spawned for phase in PHASES}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--size', type=int, default=DEFAULT_SIZE,
+        help='Number of predictions in the seeded database'
+    )
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument(
+        '--latency', type=float, default=0.1,
+        help='Round trip of every fake Bot API call, in seconds'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', metavar='DB', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, default=MODES[0])
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.latency, args.mode)
+        return
+
+    from benchmarks.db_tools_bench import DATA_DIR, seed_database
+    from db_tools import DBTools
+
+    template = DATA_DIR / f'cold_start_{args.size}_{args.seed}.db'
+    shutil.copyfile(seed_database(args.size, args.seed), template)
+    # brings the schema of an older seed up to date once, the runs
+    # measure the start of an up to date database
+    DBTools(str(template), logging_level=logging.WARNING)
+    work = str(DATA_DIR / 'cold_start_work.db')
+
+    results: Dict[str, List[Dict[str, float]]] = {mode: [] for mode in MODES}
+    for _ in range(args.runs):
+        # interleaved, so both modes see the same page cache conditions
+        for mode in MODES:
+            results[mode].append(
+                measure(str(template), work, args.latency, mode)
+            )
+
+    print(
+        f'{args.size} predictions, {args.latency * 1000:.0f}ms Bot API '
+        f'round trip, median of {args.runs} runs, seconds since spawn:\n'
+        + f"{'mode':<12}" + ''.join(f'{phase:>13}' for phase in PHASES)
+    )
+    for mode, runs in results.items():
+        print(f'{mode:<12}' + ''.join(
+            f'{statistics.median(run[phase] for run in runs):>13.3f}'
+            for phase in PHASES
+        ))
+
+
+if __name__ == '__main__':
+    main()
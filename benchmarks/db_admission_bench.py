@@ -0,0 +1,156 @@
+"""
+Overload benchmark of the DBToolsAsync admission control.
+
+Sends a seeded database more operations per second than it can serve,
+open loop, like traffic that does not slow down with the bot: inline
+reads (a random approved prediction), command reads (/mystats) and
+moderation writes, with and without the admission control. Reports
+the latency of every kind of operation and how many were shed.
+Without admission every operation queues on the executor behind all
+the others; with it the writes and the command reads keep their
+latency while the inline reads beyond the limit are shed, which the
+bot answers from its fallback.
+
+Usage:
+    python -m benchmarks.db_admission_bench
+    python -m benchmarks.db_admission_bench --size 100000 --rate 400 \
+        --duration 5 --max_in_flight 8
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+import constants
+from admission import Overloaded
+from benchmarks.db_tools_bench import (
+    DATA_DIR, PREDICTIONS_PER_USER, seed_database,
+)
+from db_tools import ApprovalStates, DBToolsAsync
+
+# share of every kind of operation in the traffic
+MIX: Tuple[Tuple[str, float], ...] = (
+    ('inline', 0.85), ('command', 0.10), ('write', 0.05),
+)
+TICK = 0.01
+
+
+async def _operation(
+    db_tools: DBToolsAsync, kind: str, size: int, rnd: random.Random
+) -> None:
+    if kind == 'inline':
+        await db_tools.get_random_approved_item_async()
+    elif kind == 'command':
+        await db_tools.get_user_statistic_async(
+            rnd.randint(1, max(1, size // PREDICTIONS_PER_USER))
+        )
+    else:
+        await db_tools.update_prediction_status_async(
+            rnd.randint(1, size), ApprovalStates.APPROVED.value
+        )
+
+
+async def _timed(
+    db_tools: DBToolsAsync, kind: str, size: int, rnd: random.Random
+) -> Tuple[str, Optional[float]]:
+    started = time.perf_counter()
+    try:
+        await _operation(db_tools, kind, size, rnd)
+    except Overloaded:
+        return kind, None
+    return kind, time.perf_counter() - started
+
+
+async def benchmark_mode(
+    args: argparse.Namespace, max_in_flight: Optional[int]
+) -> Tuple[Dict[str, List[Optional[float]]], float]:
+    """
+    Runs the traffic against a fresh copy of the seeded database.
+
+    :param args: The command line arguments.
+    :param max_in_flight: The admission limit, None disables it.
+    :return: The latencies per kind of operation, None for the shed
+        ones, and the seconds until all of them finished.
+    """
+    work_path = DATA_DIR / 'admission_work.db'
+    shutil.copyfile(seed_database(args.size, args.seed), work_path)
+    db_tools = DBToolsAsync(
+        str(work_path), logging_level=logging.WARNING,
+        max_in_flight=max_in_flight
+    )
+    rnd = random.Random(args.seed)
+    kinds = [kind for kind, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    tasks = []
+    started = time.perf_counter()
+    for _ in range(int(args.duration / TICK)):
+        tasks += [
+            asyncio.create_task(_timed(db_tools, kind, args.size, rnd))
+            for kind in rnd.choices(
+                kinds, weights, k=rnd.randint(0, int(2 * args.rate * TICK))
+            )
+        ]
+        await asyncio.sleep(TICK)
+    latencies: Dict[str, List[Optional[float]]] = {kind: [] for kind in kinds}
+    for kind, latency in await asyncio.gather(*tasks):
+        latencies[kind].append(latency)
+    elapsed = time.perf_counter() - started
+    db_tools.executor.shutdown()
+    work_path.unlink()
+    return latencies, elapsed
+
+
+def _ms(latencies: List[float], quantile: float) -> float:
+    if not latencies:
+        return float('nan')
+    position = min(len(latencies) - 1, int(len(latencies) * quantile))
+    return latencies[position] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument(
+        '--rate', type=float, default=400,
+        help='Operations per second on average'
+    )
+    parser.add_argument(
+        '--duration', type=float, default=5,
+        help='Seconds the traffic is sent for'
+    )
+    parser.add_argument(
+        '--max_in_flight', type=int, default=constants.DB_MAX_IN_FLIGHT
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    seed_database(args.size, args.seed)
+
+    print(
+        f'{args.size} predictions, {args.rate:.0f} operations/s '
+        f'for {args.duration}s\n'
+        f"{'mode':<20}{'operation':<10}{'done':>7}{'shed':>7}"
+        f"{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for label, max_in_flight in (
+        ('no admission', None),
+        (f'admission, {args.max_in_flight}', args.max_in_flight),
+    ):
+        latencies, elapsed = asyncio.run(benchmark_mode(args, max_in_flight))
+        for kind, results in latencies.items():
+            done = sorted(
+                latency for latency in results if latency is not None
+            )
+            print(
+                f'{label:<20}{kind:<10}{len(done):>7}'
+                f'{len(results) - len(done):>7}{_ms(done, 0.5):>10.1f}'
+                f'{_ms(done, 0.99):>10.1f}{_ms(done, 1):>10.1f}'
+            )
+        print(f'{label:<20}all done in {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
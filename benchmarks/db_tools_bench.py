@@ -0,0 +1,378 @@
+"""
+Micro-benchmark suite for DBTools and DBToolsAsync.
+
+Seeds synthetic databases of the requested sizes with a realistic mix
+of approval states, times every public method of DBTools and
+DBToolsAsync single-caller and under N concurrent callers and writes
+the results to a JSON file. The results can be compared against
+a stored baseline with a regression threshold.
+
+Usage:
+    python -m benchmarks.db_tools_bench --sizes 1000 100000 \
+        --output bench_results.json
+    python -m benchmarks.db_tools_bench --sizes 1000 \
+        --baseline bench_results.json --threshold 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from db_tools import ApprovalStates, DBTools, DBToolsAsync
+
+DEFAULT_SIZES = (1_000, 100_000, 10_000_000)
+DATA_DIR = Path('bench_data')
+SEED_CHUNK_SIZE = 50_000
+# share of predictions in every approval state, close to production
+APPROVAL_STATES_MIX = {
+    ApprovalStates.APPROVED.value: 0.55,
+    ApprovalStates.NOT_APPROVED.value: 0.05,
+    ApprovalStates.REJECTED.value: 0.30,
+    ApprovalStates.INAPPROPRIATE.value: 0.10,
+}
+PREDICTIONS_PER_USER = 20
+WORDS = (
+    'сегодня', 'завтра', 'тебя', 'ждёт', 'удача', 'булочка', 'кот',
+    'радость', 'встреча', 'друзья', 'солнце', 'дождь', 'чай', 'подарок',
+    'улыбка', 'день', 'неделя', 'сюрприз', 'новость', 'прогулка',
+)
+# ids of users added by the benchmark, far away from the seeded ones
+NEW_USER_IDS = itertools.count(10 ** 12)
+
+
+def _synthetic_predictions(
+    size: int, users_count: int, rnd: random.Random
+) -> Iterator[Tuple[str, str, int]]:
+    states = list(APPROVAL_STATES_MIX)
+    weights = list(APPROVAL_STATES_MIX.values())
+    for _ in range(size):
+        text = ' '.join(rnd.choices(WORDS, k=rnd.randint(4, 14))) + '!'
+        yield (
+            text,
+            rnd.choices(states, weights)[0],
+            rnd.randint(1, users_count),
+        )
+
+
+def seed_database(size: int, seed: int = 0) -> Path:
+    """
+    Creates (or reuses) a database seeded with `size` synthetic
+    predictions.
+
+    :param size: The number of predictions to generate.
+    :param seed: The seed of the random generator.
+    :return: The path of the seeded database.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    db_path = DATA_DIR / f'seed_{size}_{seed}.db'
+    if db_path.exists():
+        return db_path
+
+    tmp_path = db_path.with_suffix('.tmp')
+    tmp_path.unlink(missing_ok=True)
+    # DBTools creates the schema with the default predictions
+    DBTools(str(tmp_path), logging_level=logging.WARNING)
+
+    rnd = random.Random(seed)
+    users_count = max(1, size // PREDICTIONS_PER_USER)
+    started = time.perf_counter()
+    with sqlite3.connect(tmp_path) as connection:
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.executemany(
+            'INSERT OR IGNORE INTO users (user_id, user_name) VALUES (?, ?)',
+            ((user_id, f'user_{user_id}')
+             for user_id in range(1, users_count + 1))
+        )
+        predictions = _synthetic_predictions(size, users_count, rnd)
+        inserted = 0
+        while inserted < size:
+            chunk = [
+                row for _, row in zip(range(SEED_CHUNK_SIZE), predictions)
+            ]
+            connection.executemany(
+                'INSERT INTO predictions '
+                '(prediction_text, approval_state, user_id) '
+                'VALUES (?, ?, ?)',
+                chunk
+            )
+            connection.commit()
+            inserted += len(chunk)
+    tmp_path.rename(db_path)
+    print(
+        f'Seeded {size} predictions in {time.perf_counter() - started:.1f}s',
+        file=sys.stderr
+    )
+    return db_path
+
+
+def _arguments(
+    db_tools: DBTools, size: int, rnd: random.Random
+) -> Dict[str, Callable[[], Tuple]]:
+    """
+    Returns argument factories for every public method, keyed by
+    the method name.
+    """
+    users_count = max(1, size // PREDICTIONS_PER_USER)
+    states = [state.value for state in ApprovalStates]
+
+    return {
+        'check_if_table_exists': lambda: (db_tools.PREDICTIONS_TABLE_NAME, ),
+        'execute_query': lambda: ('SELECT 1', ),
+        'fetch_one': lambda: (
+            db_tools.GET_PREDICTION_BY_ID_QUERY, (rnd.randint(1, size), )
+        ),
+        'fetch_all': lambda: (
+            db_tools.GET_USER_PREDICTIONS_QUERY,
+            (rnd.randint(1, users_count), )
+        ),
+        'get_random_approved_prediction': lambda: (),
+        'get_prediction_by_id': lambda: (rnd.randint(1, size), ),
+        'update_prediction_status': lambda: (
+            rnd.randint(1, size), rnd.choice(states)
+        ),
+        'get_user_predictions': lambda: (rnd.randint(1, users_count), ),
+        'get_user_statistic': lambda: (rnd.randint(1, users_count), ),
+        'user_exists': lambda: (rnd.randint(1, users_count * 2), ),
+        'add_user': lambda: (next(NEW_USER_IDS), 'bench_user'),
+        'add_prediction': lambda: (
+            'Бенчмарк предсказывает тебе удачу!',
+            rnd.randint(1, users_count)
+        ),
+        'get_unapproved_predictions': lambda: (),
+    }
+
+
+def _sync_cases(
+    db_tools: DBTools, size: int, rnd: random.Random
+) -> Dict[str, Callable[[], object]]:
+    return {
+        name: (
+            lambda method=getattr(db_tools, name), arguments=arguments:
+            method(*arguments())
+        )
+        for name, arguments in _arguments(db_tools, size, rnd).items()
+    }
+
+
+def _async_cases(
+    db_tools: DBToolsAsync, size: int, rnd: random.Random
+) -> Dict[str, Callable[[], object]]:
+    return {
+        f'{name}_async': (
+            lambda method=getattr(db_tools, f'{name}_async'),
+            arguments=arguments: method(*arguments())
+        )
+        for name, arguments in _arguments(db_tools, size, rnd).items()
+    }
+
+
+def _summary(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'median_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000
+        if len(latencies) >= 20 else latencies[-1] * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'ops_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+def _timed(case: Callable[[], object], calls: int) -> List[float]:
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        case()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_sync(
+    case: Callable[[], object], calls: int, concurrency: int
+) -> Dict[str, float]:
+    """
+    Times a sync case with `concurrency` threads making `calls`
+    calls each.
+    """
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = _timed(case, calls)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(_timed, case, calls)
+                for _ in range(concurrency)
+            ]
+            latencies = [
+                latency for future in futures for latency in future.result()
+            ]
+    return _summary(latencies, time.perf_counter() - started)
+
+
+async def run_async(
+    case: Callable[[], object], calls: int, concurrency: int
+) -> Dict[str, float]:
+    """
+    Times an async case with `concurrency` coroutines making `calls`
+    awaits each.
+    """
+    async def caller() -> List[float]:
+        latencies = []
+        for _ in range(calls):
+            call_started = time.perf_counter()
+            await case()
+            latencies.append(time.perf_counter() - call_started)
+        return latencies
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return _summary(
+        [latency for latencies in results for latency in latencies],
+        time.perf_counter() - started
+    )
+
+
+def _calls_for(size: int, calls: int) -> int:
+    # full scans over 10M rows take seconds, keep the suite bounded
+    return max(3, min(calls, calls * 100_000 // size))
+
+
+async def benchmark_size(
+    size: int, calls: int, concurrency: int, seed: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every case against a fresh copy of the seeded database.
+
+    :return: A mapping of "<size>/<method>/<mode>" to timing summary.
+    """
+    seeded_path = seed_database(size, seed)
+    work_path = DATA_DIR / f'work_{size}.db'
+    shutil.copyfile(seeded_path, work_path)
+    rnd = random.Random(seed)
+    calls = _calls_for(size, calls)
+
+    results = {}
+    sync_tools = DBTools(str(work_path), logging_level=logging.WARNING)
+    for name, case in _sync_cases(sync_tools, size, rnd).items():
+        for mode, callers in (('single', 1), ('concurrent', concurrency)):
+            results[f'{size}/{name}/{mode}'] = run_sync(case, calls, callers)
+            print(f'{size}/{name}/{mode} done', file=sys.stderr)
+
+    # without the admission control, which sheds concurrent inline
+    # reads, see benchmarks/db_admission_bench.py
+    async_tools = DBToolsAsync(
+        str(work_path), logging_level=logging.WARNING, max_in_flight=None
+    )
+    for name, case in _async_cases(async_tools, size, rnd).items():
+        for mode, callers in (('single', 1), ('concurrent', concurrency)):
+            results[f'{size}/{name}/{mode}'] = await run_async(
+                case, calls, callers
+            )
+            print(f'{size}/{name}/{mode} done', file=sys.stderr)
+    async_tools.executor.shutdown()
+
+    work_path.unlink()
+    return results
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float
+) -> List[str]:
+    """
+    Compares median latencies against the baseline.
+
+    :param threshold: Allowed slowdown in percents.
+    :return: A list of human-readable regressions.
+    """
+    regressions = []
+    for key, summary in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['median_ms']
+        after = summary['median_ms']
+        if before > 0 and (after - before) / before * 100 > threshold:
+            regressions.append(
+                f'{key}: {before:.3f}ms -> {after:.3f}ms '
+                f'(+{(after - before) / before * 100:.0f}%)'
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='Numbers of predictions in the seeded databases'
+    )
+    parser.add_argument(
+        '--calls', type=int, default=200,
+        help='Calls per caller for every method'
+    )
+    parser.add_argument(
+        '--concurrency', type=int, default=8,
+        help='Number of concurrent callers'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', default='bench_results.json',
+        help='Where to write the results'
+    )
+    parser.add_argument(
+        '--baseline', help='Results file to compare with'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=10.0,
+        help='Allowed median slowdown against the baseline, in percents'
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results.update(asyncio.run(
+            benchmark_size(size, args.calls, args.concurrency, args.seed)
+        ))
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'calls': args.calls,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf8') as output_file:
+        json.dump(report, output_file, indent=2, ensure_ascii=False)
+    print(f'Results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare_with_baseline(
+            results, baseline, args.threshold
+        )
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
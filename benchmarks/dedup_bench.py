@@ -0,0 +1,101 @@
+"""
+Benchmark of the near-duplicate index.
+
+Builds DuplicateIndex over synthetic predictions of the requested sizes
+and measures the build time, the memory of the index and the latency
+of lookups of near-duplicates (hits) and of new texts (misses).
+
+Usage:
+    python -m benchmarks.dedup_bench --sizes 10000 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+import constants
+from dedup import DuplicateIndex
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщыьэюя'
+VOCABULARY_SIZE = 20_000
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        'median_us': statistics.median(timings) * 1e6,
+        'p95_us': timings[int(len(timings) * 0.95) - 1] * 1e6,
+    }
+
+
+def _timed(lookup: Callable[[str], object], texts: List[str]) -> List[float]:
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        lookup(text)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def benchmark_size(size: int, lookups: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    vocabulary = [
+        ''.join(rnd.choices(ALPHABET, k=rnd.randint(3, 10)))
+        for _ in range(VOCABULARY_SIZE)
+    ]
+
+    def text() -> str:
+        return ' '.join(rnd.choices(vocabulary, k=rnd.randint(4, 14))) + '!'
+
+    texts = [text() for _ in range(size)]
+    index = DuplicateIndex(constants.DUPLICATE_SIMILARITY_THRESHOLD)
+    started = time.perf_counter()
+    index.build(enumerate(texts, 1))
+    build_time = time.perf_counter() - started
+
+    near_duplicates = [
+        rnd.choice(texts).upper() + ' ' + rnd.choice(vocabulary)
+        for _ in range(lookups)
+    ]
+    found = sum(
+        index.find_duplicate(duplicate) is not None
+        for duplicate in near_duplicates
+    )
+    hits = _summary(_timed(index.find_duplicate, near_duplicates))
+    misses = _summary(
+        _timed(index.find_duplicate, [text() for _ in range(lookups)])
+    )
+    print(
+        f'{size:>9} predictions: build {build_time:.1f}s '
+        f'({build_time / size * 1e6:.0f}us each), '
+        f'{index.memory_usage() / 2 ** 20:.1f}MB, '
+        f'recall {found / lookups:.1%}\n'
+        f"           hit lookup median {hits['median_us']:.0f}us "
+        f"p95 {hits['p95_us']:.0f}us, "
+        f"miss lookup median {misses['median_us']:.0f}us "
+        f"p95 {misses['p95_us']:.0f}us"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='Numbers of indexed predictions'
+    )
+    parser.add_argument(
+        '--lookups', type=int, default=2000,
+        help='Lookups of every kind per size'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark_size(size, args.lookups, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of the bulk import of predictions.
+
+Imports synthetic predictions of the requested sizes, every tenth one
+repeating the text of the previous one, into a fresh database with
+DBTools.import_predictions() and reports the import rate. The summary
+of the import has to count exactly the rows that were inserted.
+
+Usage:
+    python -m benchmarks.import_bench
+    python -m benchmarks.import_bench --sizes 300000 1000000
+"""
+
+import argparse
+import logging
+import random
+import time
+from typing import Dict, Iterator
+
+from benchmarks.db_tools_bench import (
+    DATA_DIR, PREDICTIONS_PER_USER, _synthetic_predictions,
+)
+from db_tools import DBTools
+
+DEFAULT_SIZES = (300_000, )
+# every DUPLICATE_EVERY-th prediction repeats the text of the previous one
+DUPLICATE_EVERY = 10
+
+
+def _predictions(size: int, seed: int) -> Iterator[Dict]:
+    rnd = random.Random(seed)
+    users_count = max(1, size // PREDICTIONS_PER_USER)
+    text = ''
+    for i, (synthetic, state, user_id) in enumerate(
+        _synthetic_predictions(size, users_count, rnd)
+    ):
+        if i % DUPLICATE_EVERY != DUPLICATE_EVERY - 1:
+            # unique, the synthetic texts may repeat by chance
+            text = f'{synthetic} #{i}'
+        yield {
+            'prediction_text': text, 'approval_state': state,
+            'user_id': user_id,
+        }
+
+
+def benchmark_size(size: int, chunk_size: int, seed: int) -> None:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    db_path = DATA_DIR / 'import_work.db'
+    db_path.unlink(missing_ok=True)
+    db_tools = DBTools(str(db_path), logging_level=logging.WARNING)
+    before = db_tools.fetch_one('SELECT COUNT(*) FROM predictions')[0]
+    started = time.perf_counter()
+    processed = inserted = 0
+    for processed, inserted in db_tools.import_predictions(
+        _predictions(size, seed), chunk_size=chunk_size
+    ):
+        pass
+    elapsed = time.perf_counter() - started
+    expected = size - size // DUPLICATE_EVERY
+    assert (processed, inserted) == (size, expected), (processed, inserted)
+    assert db_tools.fetch_one(
+        'SELECT COUNT(*) FROM predictions'
+    )[0] == before + expected
+    print(
+        f'{size:>10}{inserted:>10}{elapsed:>10.1f}'
+        f'{processed / elapsed:>12.0f}'
+    )
+    db_path.unlink()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='Numbers of predictions to import'
+    )
+    parser.add_argument(
+        '--chunk_size', type=int, default=DBTools.BULK_CHUNK_SIZE
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'inserted':>10}{'seconds':>10}{'rows/s':>12}")
+    for size in args.sizes:
+        benchmark_size(size, args.chunk_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Micro-benchmark of answering an inline query.
+
+Compares building InlineQueryResultArticle objects per query, as
+the bot did before, with the pre-serialized templates of
+InlineResultFactory:
+- serialize: building the results and their JSON;
+- answer: the whole answerInlineQuery call through ExtBot with
+  FakeBotAPIRequest answering instantly, i.e. everything the bot
+  spends on an answer but the network.
+
+Usage:
+    python -m benchmarks.inline_results_bench
+    python -m benchmarks.inline_results_bench --answers 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Callable, List, Tuple
+from uuid import uuid4
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ExtBot
+
+from fake_bot_api import FAKE_BOT_TOKEN, FakeBotAPIRequest
+from inline_results import (
+    BUN_TITLE, PREDICTION_TITLE, InlineResultFactory, answer_inline_query,
+)
+
+PREDICTIONS = (
+    'Сегодня ты добьёшься признания за свои заслуги',
+    'Придумаешь целую кучу блестящих идей!',
+    'Тебя ждёт "приятный" сюрприз, а может и два',
+)
+
+
+def article_results(prediction: str) -> List[InlineQueryResultArticle]:
+    """The results of one query built the way the bot used to."""
+    return [
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=BUN_TITLE,
+            input_message_content=InputTextMessageContent(
+                f'{random.randint(50, 100)}% булка!'
+            ),
+        ),
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=PREDICTION_TITLE,
+            input_message_content=InputTextMessageContent(prediction),
+        ),
+    ]
+
+
+def _per_answer_us(run: Callable[[], None], answers: int) -> float:
+    started = time.perf_counter()
+    run()
+    return (time.perf_counter() - started) / answers * 1e6
+
+
+def benchmark_serialize(answers: int) -> Tuple[float, float]:
+    """
+    :return: Microseconds per answer with the objects and
+        with the templates.
+    """
+    factory = InlineResultFactory()
+    predictions = [PREDICTIONS[i % len(PREDICTIONS)] for i in range(answers)]
+
+    def objects() -> None:
+        for prediction in predictions:
+            # what RequestParameter does with a list of objects
+            json.dumps([
+                result.to_dict() for result in article_results(prediction)
+            ])
+
+    def templates() -> None:
+        for prediction_id, prediction in enumerate(predictions):
+            factory.results((prediction_id, prediction))
+
+    return _per_answer_us(objects, answers), _per_answer_us(templates, answers)
+
+
+async def benchmark_answer(answers: int) -> Tuple[float, float]:
+    """
+    :return: Microseconds per answerInlineQuery call with the objects
+        and with the templates.
+    """
+    factory = InlineResultFactory()
+    async with ExtBot(FAKE_BOT_TOKEN, request=FakeBotAPIRequest()) as bot:
+        started = time.perf_counter()
+        for i in range(answers):
+            await bot.answer_inline_query(
+                str(i), article_results(PREDICTIONS[i % len(PREDICTIONS)]),
+                cache_time=0, is_personal=True
+            )
+        objects = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(answers):
+            await answer_inline_query(
+                bot, str(i),
+                factory.results((i, PREDICTIONS[i % len(PREDICTIONS)])),
+                cache_time=0, is_personal=True
+            )
+        templates = time.perf_counter() - started
+    return objects / answers * 1e6, templates / answers * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--answers', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    print(
+        f'{args.answers} answers, microseconds per answer\n'
+        f"{'':<12}{'objects':>10}{'templates':>11}{'speed-up':>10}"
+    )
+    for name, (objects, templates) in (
+        ('serialize', benchmark_serialize(args.answers)),
+        ('answer', asyncio.run(benchmark_answer(args.answers))),
+    ):
+        print(
+            f'{name:<12}{objects:>10.1f}{templates:>11.1f}'
+            f'{objects / templates:>9.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
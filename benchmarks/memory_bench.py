@@ -0,0 +1,105 @@
+"""
+Memory benchmark of the compact prediction store.
+
+Compares the memory of predictions held as a list of
+(prediction id, text, approval state) tuples, as fetchall() returns
+them, with CompactPredictionStore holding the same predictions, and
+the latency of random choice and lookup by id in both.
+
+Usage:
+    python -m benchmarks.memory_bench --sizes 100000 1000000
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from compact_store import CompactPredictionStore
+from db_tools import ApprovalStates
+
+DEFAULT_SIZES = (100_000, 1_000_000)
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщыьэюя '
+STATES = [state.value for state in ApprovalStates]
+
+
+def _measured(build: Callable[[], object]) -> Tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _per_call_us(call: Callable[[], object], calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def benchmark_size(size: int, calls: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    # texts are kept as one encoded source, so that neither
+    # representation shares str objects with the generator
+    source = [
+        (
+            prediction_id,
+            ''.join(rnd.choices(ALPHABET, k=rnd.randint(20, 120))).encode(),
+            rnd.choice(STATES),
+        )
+        for prediction_id in range(1, size + 1)
+    ]
+
+    rows, rows_size = _measured(lambda: [
+        (prediction_id, text.decode(), state)
+        for prediction_id, text, state in source
+    ])
+    store, store_size = _measured(lambda: CompactPredictionStore(
+        (prediction_id, text.decode(), state)
+        for prediction_id, text, state in source
+    ))
+
+    approved = ApprovalStates.APPROVED.value
+    approved_rows: List[Tuple] = [row for row in rows if row[2] == approved]
+    by_id = {row[0]: row for row in rows}
+    ids = [rnd.randint(1, size) for _ in range(calls)]
+    tuples_random = _per_call_us(lambda: rnd.choice(approved_rows), calls)
+    store_random = _per_call_us(lambda: store.random(approved, rnd), calls)
+    tuples_get = _per_call_us(lambda: by_id.get(rnd.choice(ids)), calls)
+    store_get = _per_call_us(lambda: store.get(rnd.choice(ids)), calls)
+
+    print(
+        f'{size:>9} predictions: tuples {rows_size / 2 ** 20:.1f}MB, '
+        f'store {store_size / 2 ** 20:.1f}MB '
+        f'({store.memory_usage() / 2 ** 20:.1f}MB of columns), '
+        f'{rows_size / store_size:.1f}x smaller\n'
+        f'           random approved: tuples {tuples_random:.2f}us, '
+        f'store {store_random:.2f}us; '
+        f'get by id: dict of tuples {tuples_get:.2f}us, '
+        f'store {store_get:.2f}us'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='Numbers of stored predictions'
+    )
+    parser.add_argument(
+        '--calls', type=int, default=100_000,
+        help='Timed calls of every kind per size'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark_size(size, args.calls, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark of the storage backends.
+
+Every backend gets the same synthetic predictions and every storage
+method is timed, sync and through its *_async counterpart, side by
+side. tests/test_storage_conformance.py checks that the backends
+behave the same.
+
+Usage:
+    python -m benchmarks.storage_bench
+    python -m benchmarks.storage_bench --backends sqlite memory \
+        --sizes 1000 100000 --calls 500
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import constants
+from benchmarks.db_tools_bench import (
+    NEW_USER_IDS, PREDICTIONS_PER_USER, _calls_for, _synthetic_predictions,
+    run_async, run_sync, seed_database,
+)
+from db_tools import DBToolsAsync
+from memory_storage import MemoryStorageAsync
+from storage import (
+    ApprovalStates, PredictionStorage, PredictionStorageAsync,
+)
+
+DEFAULT_SIZES = (1_000, 100_000)
+
+
+def _sqlite_backend(directory: Path) -> PredictionStorageAsync:
+    # without the admission control, which sheds concurrent inline
+    # reads, see benchmarks/db_admission_bench.py
+    return DBToolsAsync(
+        str(directory / 'storage.db'), logging_level=logging.WARNING,
+        max_in_flight=None
+    )
+
+
+def _memory_backend(directory: Path) -> PredictionStorageAsync:
+    return MemoryStorageAsync()
+
+
+# backend name -> factory of a fresh instance in the given directory
+BACKENDS: Dict[str, Callable[[Path], PredictionStorageAsync]] = {
+    'sqlite': _sqlite_backend,
+    'memory': _memory_backend,
+}
+
+
+def seed_backend(
+    backend: str, size: int, seed: int, directory: Path
+) -> PredictionStorageAsync:
+    """
+    Returns an instance of the backend with the synthetic predictions
+    of benchmarks.db_tools_bench.
+    """
+    if backend == 'sqlite':
+        shutil.copyfile(seed_database(size, seed), directory / 'storage.db')
+        return BACKENDS[backend](directory)
+    storage = BACKENDS[backend](directory)
+    rnd = random.Random(seed)
+    users_count = max(1, size // PREDICTIONS_PER_USER)
+    for user_id in range(1, users_count + 1):
+        storage.add_user(user_id, f'user_{user_id}')
+    for text, state, user_id in _synthetic_predictions(
+        size, users_count, rnd
+    ):
+        storage.add_prediction(text, user_id, state)
+    return storage
+
+
+def _arguments(
+    storage: PredictionStorage, size: int, rnd: random.Random
+) -> Dict[str, Callable[[], Tuple]]:
+    users_count = max(1, size // PREDICTIONS_PER_USER)
+    states = [state.value for state in ApprovalStates]
+    return {
+        'get_random_approved_prediction': lambda: (),
+        'get_prediction_by_id': lambda: (rnd.randint(1, size), ),
+        'update_prediction_status': lambda: (
+            rnd.randint(1, size), rnd.choice(states)
+        ),
+        'get_user_predictions': lambda: (rnd.randint(1, users_count), ),
+        'get_user_statistic': lambda: (rnd.randint(1, users_count), ),
+        'get_leaderboard': lambda: (
+            rnd.choice(storage.LEADERBOARD_PERIODS), constants.LEADERBOARD_SIZE
+        ),
+        'user_exists': lambda: (rnd.randint(1, users_count * 2), ),
+        'add_user': lambda: (next(NEW_USER_IDS), 'bench_user'),
+        'add_prediction': lambda: (
+            'Бенчмарк предсказывает тебе удачу!',
+            rnd.randint(1, users_count)
+        ),
+        'get_unapproved_predictions_since': lambda: (
+            size - rnd.randint(0, 100),
+        ),
+        'get_state': lambda: ('bench', ),
+        'set_state': lambda: ('bench', str(rnd.random())),
+        'get_pools': lambda: (),
+        'add_pool': lambda: (f'bench_{rnd.randint(1, 100)}', ),
+        'get_chat_pool': lambda: (rnd.randint(1, 1000), ),
+        'set_chat_pool': lambda: (
+            rnd.randint(1, 1000), storage.DEFAULT_POOL_ID
+        ),
+    }
+
+
+async def benchmark_backend(
+    backend: str, size: int, calls: int, seed: int
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Times every storage method of a seeded backend.
+
+    :return: {method: (sync median ms, async median ms)}.
+    """
+    directory = Path(tempfile.mkdtemp(prefix='storage_bench_'))
+    storage = seed_backend(backend, size, seed, directory)
+    rnd = random.Random(seed)
+    calls = _calls_for(size, calls)
+    results = {}
+    try:
+        for name, arguments in _arguments(storage, size, rnd).items():
+            method = getattr(storage, name)
+            async_method = getattr(storage, f'{name}_async')
+            sync_summary = run_sync(
+                lambda method=method, arguments=arguments:
+                method(*arguments()),
+                calls, 1
+            )
+            async_summary = await run_async(
+                lambda method=async_method, arguments=arguments:
+                method(*arguments()),
+                calls, 1
+            )
+            results[name] = (
+                sync_summary['median_ms'], async_summary['median_ms']
+            )
+    finally:
+        storage.executor.shutdown()
+        shutil.rmtree(directory)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--backends', nargs='+', choices=list(BACKENDS),
+        default=list(BACKENDS)
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='Numbers of predictions the backends are seeded with'
+    )
+    parser.add_argument(
+        '--calls', type=int, default=300,
+        help='Calls of every method, sync and async'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        results = {
+            backend: asyncio.run(
+                benchmark_backend(backend, size, args.calls, args.seed)
+            )
+            for backend in args.backends
+        }
+        print(
+            f'\n{size} predictions, median ms (sync / async):\n'
+            + f"{'method':<34}"
+            + ''.join(f'{backend:>20}' for backend in args.backends)
+        )
+        for name in results[args.backends[0]]:
+            print(f'{name:<34}' + ''.join(
+                f'{results[backend][name][0]:>9.3f} / '
+                f'{results[backend][name][1]:<8.3f}'
+                for backend in args.backends
+            ))
+
+
+if __name__ == '__main__':
+    main()
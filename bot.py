@@ -11,28 +11,46 @@ The bot is capable of:
     to fun question "Насколько ты булка?".
 """
 
+import asyncio
 import json
 import logging
-import random
+import re
 import argparse
-from uuid import uuid4
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, time
 
-from telegram import (
-    InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
-    InputTextMessageContent, Update,
-)
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
 from telegram.ext import (
     Application, CommandHandler, ContextTypes, InlineQueryHandler,
-    CallbackQueryHandler,
+    CallbackQueryHandler, ChosenInlineResultHandler, TypeHandler,
 )
 
 import constants
 import secrets
-from db_tools import ApprovalStates, DBTools, DBToolsAsync
+from admission import Overloaded
+from analytics import AnalyticsLog
+from bot_api_request import InstrumentedHTTPXRequest, build_request
+from db_tools import ApprovalStates, DBToolsAsync
+from dedup import DuplicateIndex
+from inline_results import (
+    InlineResultFactory, answer_inline_query, prediction_id_of,
+)
+from loop_watchdog import LoopWatchdog
+from moderation import PreModerator
+from prediction_cache import ApprovedPredictionsCache
+from prediction_snapshot import PredictionSnapshot, build_snapshot
+from profiler import SamplingProfiler
+from rate_limiter import TokenBucketLimiter
+from storage import PredictionStorage, PredictionStorageAsync
+from update_processor import OrderedUpdateProcessor
 from utils import setup_logger
 
+# bot state key of the last prediction sent to the admin for moderation
+NOTIFIED_PREDICTION_ID_KEY = 'notified_prediction_id'
+# pool names are typed as inline queries, so they are kept short
+POOL_NAME_PATTERN = re.compile(r'[\w-]{1,32}')
+
 
 class KindPredictionsBot:
     # noinspection NonAsciiCharacters
@@ -46,10 +64,65 @@ class KindPredictionsBot:
             are sent.
         notifying_days (tuple): The days of the week when notifications
             are sent.
-        db_tools (DBToolsAsync): The database tools instance for async
-            operations.
+        db_tools (PredictionStorageAsync): The storage of predictions,
+            users and pools, DBToolsAsync unless another backend is
+            passed as `storage`.
+        db_name (str): The name of the database file (constructor
+            argument only).
+        storage (PredictionStorageAsync | None): The storage backend
+            (constructor argument only), DBToolsAsync of db_name if None.
+            Backups, archivals, the approved predictions cache and
+            snapshots need SQLite and are disabled with other backends.
         logging_level (int): The logging level.
         test_run (bool): Flag to indicate if it's a test run.
+        profile_duration (float | None): If set, profiling starts with
+            the application and stops after this many seconds
+            (0 - runs until toggled off by /profile).
+        profiler (SamplingProfiler): The profiler toggled by /profile.
+        watchdog (LoopWatchdog): The event-loop lag watchdog started
+            with the application.
+        backup_interval (float): Hours between online backups of
+            the database, 0 disables them.
+        last_backup (dict | None): The result of the last backup.
+        archive_interval (float): Hours between archivals of old
+            rejected and inappropriate predictions, 0 disables them.
+        last_archival (dict | None): The result of the last archival.
+        leaderboard (dict): The cached /top snapshot, period -> list of
+            (user name, approved predictions), refreshed by a job.
+        leaderboard_updated_at (datetime | None): When the /top
+            snapshot was refreshed.
+        duplicates (DuplicateIndex): The near-duplicate index of all
+            predictions, built in the background on start.
+        duplicates_ready (bool): Whether the duplicate index is built.
+        approved_predictions (ApprovedPredictionsCache | None):
+            The approved predictions of every prediction pool served
+            to inline queries, loaded on demand and reloaded
+            incrementally by a job when the database changes.
+            None with non-SQLite storage, which is read directly.
+        write_snapshot_path (str | None): If set, the approved predictions
+            of the default pool are written to this snapshot file after
+            every change.
+        read_snapshot_path (str | None): If set, inline queries for
+            the default pool are served from this snapshot file written
+            by another process instead of the own cache.
+        snapshot (PredictionSnapshot | None): The mapped snapshot
+            of read_snapshot_path.
+        inline_results (InlineResultFactory): Builds the pre-serialized
+            results of the inline queries.
+        analytics_db (str | None): The analytics database of the served
+            and the chosen predictions (constructor argument only),
+            None disables the analytics.
+        analytics (AnalyticsLog | None): The analytics log, flushed
+            to analytics_db by a job.
+        moderator (PreModerator): Automatic pre-moderation of
+            suggestions in a process pool.
+        user_suggestions_limiter (TokenBucketLimiter): /suggest rate
+            limit of every user.
+        suggestions_limiter (TokenBucketLimiter): /suggest rate limit
+            of all users together.
+        bot_api_requests (list): The instrumented Bot API connection
+            pools (InstrumentedHTTPXRequest) reported by /stats, set by
+            main() for the getUpdates and the outbound pools.
         log_file (str): The file where logs are stored.
         logger (logging.Logger): The logger instance for this class.
 
@@ -70,18 +143,90 @@ class KindPredictionsBot:
             Handles the /suggest command to save user suggestions and
             send them for approval.
 
+        my_stats_command(update, context):
+            Handles the /mystats command with the statistic of
+            the user's suggestions.
+
+        top_command(update, context):
+            Handles the /top command with the users whose suggestions
+            were approved the most.
+
         inline_query(update, context):
             Handles inline queries.
+
+        chosen_inline_result(update, context):
+            Logs the prediction a user sent from an inline answer.
+
+        profile_command(update, context):
+            Toggles profiling of the running bot, admin only.
+
+        stats_command(update, context):
+            Sends the bot runtime statistic to the admin.
     """
     notifying_time = time(hour=10)
     notifying_days = (0, 1, 2, 3, 4, 5, 6)
 
     def __init__(
-        self, logging_level: int = logging.INFO, test_run: bool = False
+        self, logging_level: int = logging.INFO, test_run: bool = False,
+        db_name: str = constants.DB_NAME,
+        profile_duration: Optional[float] = None,
+        backup_interval: float = constants.BACKUP_INTERVAL_HOURS,
+        archive_interval: float = constants.ARCHIVE_INTERVAL_HOURS,
+        write_snapshot_path: Optional[str] = None,
+        read_snapshot_path: Optional[str] = None,
+        storage: Optional[PredictionStorageAsync] = None,
+        analytics_db: Optional[str] = constants.ANALYTICS_DB_NAME
     ):
-        self.db_tools = DBToolsAsync(constants.DB_NAME)
+        self.db_tools: PredictionStorageAsync = (
+            storage if storage is not None else DBToolsAsync(db_name)
+        )
+        is_sqlite = isinstance(self.db_tools, DBToolsAsync)
         self.logging_level = logging_level
         self.test_run = test_run
+        self.profile_duration = profile_duration
+        self.profiler = SamplingProfiler(logging_level=logging_level)
+        self.watchdog = LoopWatchdog(logging_level=logging_level)
+        self.backup_interval = backup_interval if is_sqlite else 0
+        self.last_backup: Optional[dict] = None
+        self.archive_interval = archive_interval if is_sqlite else 0
+        self.last_archival: Optional[dict] = None
+        self.leaderboard: Dict[str, List[Tuple[str, int]]] = {}
+        self.leaderboard_updated_at: Optional[datetime] = None
+        self.duplicates = DuplicateIndex(
+            constants.DUPLICATE_SIMILARITY_THRESHOLD
+        )
+        self.duplicates_ready = False
+        self.approved_predictions: Optional[ApprovedPredictionsCache] = (
+            ApprovedPredictionsCache(
+                self.db_tools.db_name, logging_level=logging_level
+            )
+            if is_sqlite else None
+        )
+        self.write_snapshot_path = write_snapshot_path if is_sqlite else None
+        self.read_snapshot_path = read_snapshot_path if is_sqlite else None
+        self.snapshot: Optional[PredictionSnapshot] = None
+        self.inline_results = InlineResultFactory()
+        self.analytics: Optional[AnalyticsLog] = (
+            AnalyticsLog(analytics_db, logging_level=logging_level)
+            if analytics_db else None
+        )
+        self.moderator = PreModerator(logging_level=logging_level)
+        self.user_suggestions_limiter = TokenBucketLimiter(
+            constants.SUGGEST_USER_PER_HOUR / 3600,
+            constants.SUGGEST_USER_BURST
+        )
+        self.suggestions_limiter = TokenBucketLimiter(
+            constants.SUGGEST_GLOBAL_PER_HOUR / 3600,
+            constants.SUGGEST_GLOBAL_BURST
+        )
+        # pool id -> the last prediction read from the storage for inline
+        # queries, the answer when the storage sheds the read
+        self._inline_fallbacks: Dict[int, Tuple[int, str]] = {}
+        # predictions added while the duplicate index is being built
+        self._pending_duplicates: List[Tuple[int, str]] = []
+        self._duplicates_build: Optional[asyncio.Task] = None
+        self._warm_up: Optional[asyncio.Task] = None
+        self.bot_api_requests: List[InstrumentedHTTPXRequest] = []
         self.log_file = (
             f'logs/{self.__class__.__name__}.log'
             if not test_run
@@ -98,6 +243,309 @@ class KindPredictionsBot:
         )
         if self.test_run:
             self.logger.warning('It is a test run')
+        if not is_sqlite:
+            self.logger.warning(
+                'Storage %s: backups, archivals, the approved predictions '
+                'cache and snapshots are disabled',
+                self.db_tools.__class__.__name__
+            )
+
+    async def post_init(self, application: Application) -> None:
+        """
+        Runs once the application is initialised, before it starts
+        receiving updates.
+
+        :param application: The application running the bot.
+        :return: None
+        """
+        self.watchdog.start()
+        await self.start_warm_up()
+        for job, interval_hours, name in (
+            (self.backup_job, self.backup_interval, 'backup'),
+            (self.archive_job, self.archive_interval, 'archive'),
+            (
+                self.leaderboard_job,
+                constants.LEADERBOARD_REFRESH_MINUTES / 60, 'leaderboard'
+            ),
+            (
+                self.approved_cache_job,
+                constants.APPROVED_CACHE_POLL_SECONDS / 3600
+                if self.approved_predictions is not None else 0,
+                'approved_cache'
+            ),
+            (
+                self.snapshot_job,
+                constants.APPROVED_CACHE_POLL_SECONDS / 3600
+                if self.snapshot is not None else 0, 'snapshot'
+            ),
+            (
+                self.rate_limit_report_job,
+                constants.RATE_LIMIT_REPORT_MINUTES / 60, 'rate_limit_report'
+            ),
+            (
+                self.analytics_job,
+                constants.ANALYTICS_FLUSH_SECONDS / 3600
+                if self.analytics is not None else 0, 'analytics'
+            ),
+        ):
+            if not interval_hours:
+                continue
+            if application.job_queue is None:
+                self.logger.warning(
+                    'No job queue, %s job is disabled. Install '
+                    'python-telegram-bot[job-queue] to enable it', name
+                )
+                continue
+            application.job_queue.run_repeating(
+                job, interval=interval_hours * 60 * 60, name=name
+            )
+        if self.profile_duration is not None:
+            self.profiler.start(
+                asyncio.get_running_loop(),
+                duration=self.profile_duration or None
+            )
+
+    def start_warm_up(self) -> asyncio.Task:
+        """
+        Starts loading what the first updates need, once: the approved
+        predictions of the default pool (or the mapped snapshot) and
+        the /top leaderboards, then starts building the duplicate index
+        in the background. WarmStartApplication starts it while the Bot
+        API is being initialised, post_init otherwise.
+
+        :return: The warm-up task, awaited by post_init.
+        """
+        if self._warm_up is None:
+            self._warm_up = asyncio.create_task(self._warm_up_caches())
+        return self._warm_up
+
+    async def _warm_up_caches(self) -> None:
+        started = asyncio.get_running_loop().time()
+        leaderboard = asyncio.create_task(self.refresh_leaderboard())
+        if self.approved_predictions is not None:
+            await self.approved_predictions.refresh(self.db_tools.executor)
+        if self.read_snapshot_path:
+            self.snapshot = PredictionSnapshot(
+                self.read_snapshot_path, logging_level=self.logging_level
+            )
+        elif self.approved_predictions is not None:
+            await self.approved_predictions.load(
+                PredictionStorage.DEFAULT_POOL_ID, self.db_tools.executor
+            )
+            await self._write_snapshot()
+        try:
+            await leaderboard
+        except Exception:  # pylint: disable=broad-except
+            # /top refreshes it on demand
+            self.logger.exception('Leaderboard warm-up failed')
+        # CPU bound and not needed by the first updates, started last
+        # not to compete with the loads above for the GIL
+        self._duplicates_build = asyncio.create_task(
+            self.build_duplicate_index()
+        )
+        self.logger.info(
+            'Caches warmed up in %.3fs',
+            asyncio.get_running_loop().time() - started
+        )
+
+    # noinspection PyUnusedLocal
+    async def post_shutdown(self, application: Application) -> None:
+        """
+        Runs once the application is shut down.
+
+        :param application: The application running the bot.
+        :return: None
+        """
+        await self.watchdog.stop()
+        self.profiler.stop()
+        self.moderator.close()
+        if self.approved_predictions is not None:
+            self.approved_predictions.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+        if self.analytics is not None:
+            await self.analytics.flush_async()
+
+    async def build_duplicate_index(self) -> None:
+        """
+        Builds the near-duplicate index of all predictions on the default
+        executor, suggestions are not checked until it is ready.
+
+        :return: None
+        """
+        started = asyncio.get_running_loop().time()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.duplicates.build, (
+                    (row['prediction_id'], row['prediction_text'] or '')
+                    for row in self.db_tools.iter_table(
+                        PredictionStorage.PREDICTIONS_TABLE_NAME
+                    )
+                )
+            )
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Building the duplicate index failed')
+            return
+        for prediction_id, text in self._pending_duplicates:
+            self.duplicates.add(prediction_id, text)
+        self._pending_duplicates.clear()
+        self.duplicates_ready = True
+        self.logger.info(
+            'Duplicate index of %s predictions built in %.1fs',
+            len(self.duplicates),
+            asyncio.get_running_loop().time() - started
+        )
+
+    def runtime_stats(self, application: Application) -> str:
+        """
+        Returns the human-readable runtime statistic of the bot.
+
+        :param application: The application running the bot.
+        :return: The statistic text.
+        """
+        lines = []
+        if isinstance(
+            application.update_processor, OrderedUpdateProcessor
+        ):
+            processor_stats = application.update_processor.stats()
+            lines.append(
+                'Updates: '
+                + ', '.join(f'{k}: {v}' for k, v in processor_stats.items())
+                + f' (cap {application.update_processor.max_running_updates})'
+            )
+
+        watchdog_stats = self.watchdog.stats()
+        lines += [
+            'Event loop lag:',
+            f"  probes: {watchdog_stats['probes']}, "
+            f"max: {watchdog_stats['max_lag_ms']}ms, "
+            f"blocking callbacks: {watchdog_stats['slow_callbacks']}",
+        ]
+        lines.extend(
+            f'  {bucket}: {count}'
+            for bucket, count in watchdog_stats['histogram'].items()
+            if count
+        )
+        for request in self.bot_api_requests:
+            request_stats = request.stats()
+            lines.append(
+                f'Bot API pool {request.name}: '
+                f"size {request_stats['pool_size']}, "
+                f"{request_stats['requests']} calls, "
+                f"max in flight {request_stats['max_in_flight']}, "
+                f"{request_stats['connections_opened']} connections, "
+                f"{request_stats['pool_timeouts']} pool timeouts, "
+                f"wait avg {request_stats['avg_pool_wait_ms']}ms, "
+                f"max {request_stats['max_pool_wait_ms']}ms"
+            )
+        if self.last_backup:
+            lines.append(
+                f"Last backup: {self.last_backup['path']}, "
+                f"{self.last_backup['pages']} pages in "
+                f"{self.last_backup['duration']:.1f}s"
+            )
+        if self.last_archival:
+            lines.append(
+                f"Last archival: {self.last_archival['archived']} "
+                f"predictions, {self.last_archival['freed_pages']} pages "
+                f"freed in {self.last_archival['duration']:.1f}s"
+            )
+        if self.snapshot is not None:
+            lines.append(
+                f'Approved predictions snapshot: {len(self.snapshot)}, '
+                f'version {self.snapshot.version}'
+            )
+        if self.approved_predictions is not None:
+            lines.append(
+                'Approved predictions cache: '
+                f'{len(self.approved_predictions)} in '
+                f'{self.approved_predictions.loaded_pools} of '
+                f'{len(self.approved_predictions.pool_ids)} pools, '
+                f'mod_seq {self.approved_predictions.mod_seq}, '
+                f'{self.approved_predictions.pool_loads} pool loads, '
+                f'{self.approved_predictions.evictions} evictions, '
+                f'{self.approved_predictions.full_reloads} full reloads'
+            )
+        else:
+            lines.append(f'Storage: {self.db_tools.__class__.__name__}')
+        admission = getattr(self.db_tools, 'admission', None)
+        if admission is not None:
+            admission_stats = admission.stats()
+            lines += [
+                'Storage admission: '
+                f"limit {admission_stats['max_in_flight']}, "
+                f"in flight {admission_stats['in_flight']} "
+                f"(peak {admission_stats['peak_in_flight']}), "
+                f"queued {admission_stats['queued']} "
+                f"(max {admission_stats['max_queued']})",
+                f"  admitted: {admission_stats['admitted']}, "
+                f"shed: {admission_stats['shed']}",
+            ]
+            lines.extend(
+                f'  {name} queue wait avg: {avg_wait}ms, max: '
+                f"{admission_stats['max_queue_wait_ms'][name]}ms"
+                for name, avg_wait
+                in admission_stats['avg_queue_wait_ms'].items()
+            )
+        if isinstance(self.db_tools, DBToolsAsync):
+            maintenance_stats = self.db_tools.maintenance_stats()
+            lines.append(
+                'Storage maintenance (not admitted): '
+                f"pending {maintenance_stats['pending']}, "
+                f"finished {maintenance_stats['runs']}"
+            )
+        if self.analytics is not None:
+            lines.append(
+                f'Analytics: {self.analytics.served_count} served, '
+                f'{self.analytics.chosen_count} chosen, '
+                f'{len(self.analytics)} buffered, '
+                f'{self.analytics.flushed} written, '
+                f'{self.analytics.dropped} dropped'
+            )
+        lines.append(
+            f'/suggest rate limit buckets: '
+            f'{len(self.user_suggestions_limiter)} users, violations since '
+            f'the last report: '
+            f'{sum(self.user_suggestions_limiter.violations.values())} '
+            f'per user, '
+            f'{sum(self.suggestions_limiter.violations.values())} global'
+        )
+        if self.watchdog.slow_callbacks:
+            blocked_at, blocked, stack = self.watchdog.slow_callbacks[-1]
+            lines.append(
+                f'  last blocked {blocked:.3f}s at '
+                f"{datetime.fromtimestamp(blocked_at):%H:%M:%S}:\n"
+                + ''.join(stack.splitlines(keepends=True)[-4:])
+            )
+        return '\n'.join(lines)
+
+    async def _is_admin(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> bool:
+        """
+        Checks that the message was sent by the admin. Otherwise warns
+        the admin about the attempt and tells the user they are not
+        authorised to do that.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: True if the message was sent by the admin.
+        """
+        if update.message.from_user.id == secrets.MAIN_ADMIN_TG_USER_ID:
+            return True
+        await context.bot.send_message(
+            chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
+            text=(
+                'Someone tried to mess around: '
+                f'{update.message.from_user.username}'
+                f'({update.message.from_user.id})'
+            )
+        )
+        await context.bot.send_message(
+            chat_id=update.message.from_user.id,
+            text='You can`t do that!'
+        )
+        return False
 
     # noinspection PyUnusedLocal
     async def start_command(
@@ -114,11 +562,12 @@ class KindPredictionsBot:
         :return: None
         """
         self.logger.debug('Running /start command')
-        text = 'commands: /help /about'
+        text = 'commands: /help /about /mystats /top /pool'
         if update.message.from_user.id == secrets.MAIN_ADMIN_TG_USER_ID:
             text += (
                 '\nBecause you are an admin - you can use '
-                '/notify_start, /notify_stop and /check_once commands 😉'
+                '/notify_start, /notify_stop, /check_once, '
+                '/profile and /stats commands 😉'
             )
 
         await update.message.reply_text(text)
@@ -181,7 +630,8 @@ class KindPredictionsBot:
         """
         This method handles the /suggest command. It logs the action,
         checks if the user exists in the database, if not it adds them.
-        Then it saves the suggestion made by the user to the database.
+        Then it saves the suggestion made by the user to the database
+        for the prediction pool of the chat.
         Finally, it sends a markdown styled reply text to the user.
 
         :param update: An object that encapsulates an incoming Update.
@@ -197,6 +647,28 @@ class KindPredictionsBot:
         self.logger.debug(
             'Got suggestion from: %s', update.message.from_user
         )
+        if update.message.text == '/suggest':
+            self.logger.debug('Someone suggested nothing')
+            await update.message.reply_text(
+                'Try to write something after "/suggest"'
+            )
+            return
+        # the global limit is only spent by users within their own limit,
+        # and the user's token is given back when the global one refuses
+        allowed = self.user_suggestions_limiter.allow(
+            update.message.from_user.id
+        )
+        if allowed and not self.suggestions_limiter.allow():
+            self.user_suggestions_limiter.refund(update.message.from_user.id)
+            allowed = False
+        if not allowed:
+            self.logger.debug(
+                'Suggestion rate limited (%s)', update.message.from_user.id
+            )
+            await update.message.reply_text(
+                'Too many suggestions, please try again later'
+            )
+            return
         if not await self.db_tools.user_exists_async(
                 update.message.from_user.id
         ):
@@ -209,20 +681,201 @@ class KindPredictionsBot:
                 update.message.from_user.username
             )
 
-        if update.message.text == '/suggest':
-            self.logger.debug('Someone suggested nothing')
+        text = update.message.text.removeprefix('/suggest ')
+        moderation = await self.moderator.check(text)
+        duplicate = (
+            self.duplicates.find_duplicate(text)
+            if self.duplicates_ready else None
+        )
+        duplicate_of = None
+        approval_state = ApprovalStates.NOT_APPROVED.value
+        if duplicate is not None:
+            duplicate_of, similarity = duplicate
+            self.logger.debug(
+                'Suggestion is a duplicate of %s (similarity %.2f)',
+                duplicate_of, similarity
+            )
+            if constants.DUPLICATE_ACTION == 'reject':
+                approval_state = ApprovalStates.REJECTED.value
+        if moderation['inappropriate']:
+            approval_state = ApprovalStates.INAPPROPRIATE.value
+        if moderation['reasons']:
+            self.logger.debug(
+                'Pre-moderation: %s', ', '.join(moderation['reasons'])
+            )
+
+        pool_id = await self.db_tools.get_chat_pool_async(
+            update.effective_chat.id
+        )
+        self.logger.debug('Saving prediction to database')
+        prediction_id = await self.db_tools.add_prediction_async(
+            text, update.message.from_user.id,
+            approval_state=approval_state, duplicate_of=duplicate_of,
+            moderation_priority=moderation['priority'], pool_id=pool_id
+        )
+        self.logger.debug('Successfully saved prediction to database')
+        if self.duplicates_ready:
+            self.duplicates.add(prediction_id, text)
+        else:
+            self._pending_duplicates.append((prediction_id, text))
+
+        if approval_state == ApprovalStates.INAPPROPRIATE.value:
             await update.message.reply_text(
-                'Try to write something after "/suggest"'
+                'Suggestion was declined by automatic moderation'
+            )
+        elif approval_state == ApprovalStates.REJECTED.value:
+            await update.message.reply_text(
+                'This prediction has already been suggested'
             )
         else:
-            self.logger.debug('Saving prediction to database')
-            await self.db_tools.add_prediction_async(
-                update.message.text.removeprefix('/suggest '),
+            await update.message.reply_text('Suggestion sent to approve')
+
+    # noinspection PyUnusedLocal
+    async def my_stats_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Handles the /mystats command with the statistic of the user's
+        suggestions by approval state.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: None
+        """
+        self.logger.debug('Running /mystats command')
+        statistic = dict(
+            await self.db_tools.get_user_statistic_async(
                 update.message.from_user.id
             )
-            self.logger.debug('Successfully saved prediction to database')
+        )
+        if not statistic:
+            await update.message.reply_text(
+                'You have not suggested anything yet, try /suggest'
+            )
+            return
+        await update.message.reply_text(
+            f'Suggested: {sum(statistic.values())}\n'
+            f'Approved: {statistic.get(ApprovalStates.APPROVED.value, 0)}\n'
+            'Waiting for approval: '
+            f'{statistic.get(ApprovalStates.NOT_APPROVED.value, 0)}\n'
+            f'Rejected: {statistic.get(ApprovalStates.REJECTED.value, 0)}\n'
+            'Inappropriate: '
+            f'{statistic.get(ApprovalStates.INAPPROPRIATE.value, 0)}'
+        )
 
-            await update.message.reply_text('Suggestion sent to approve')
+    async def pool_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Handles the /pool [name] command. Without a name it tells which
+        prediction pool the chat belongs to. With a name the admin moves
+        the chat to the pool, creating it if needed: suggestions made
+        in the chat go to the pool and inline queries naming the pool
+        are served its approved predictions.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: None
+        """
+        self.logger.debug('Running /pool command')
+        chat_id = update.effective_chat.id
+        if not context.args:
+            pool_name = await self.db_tools.get_pool_name_async(
+                await self.db_tools.get_chat_pool_async(chat_id)
+            )
+            await update.message.reply_text(
+                f'Suggestions from this chat go to the "{pool_name}" '
+                'prediction pool'
+            )
+            return
+        if not await self._is_admin(update, context):
+            return
+        pool_name = context.args[0].casefold()
+        if not POOL_NAME_PATTERN.fullmatch(pool_name):
+            await update.message.reply_text(
+                'A pool name is up to 32 letters, digits, "_" or "-"'
+            )
+            return
+        pool_id = await self.db_tools.add_pool_async(pool_name)
+        await self.db_tools.set_chat_pool_async(chat_id, pool_id)
+        await update.message.reply_text(
+            f'Suggestions from this chat now go to the "{pool_name}" '
+            f'prediction pool, type "@{context.bot.username} {pool_name}" '
+            'to get its predictions'
+        )
+
+    async def refresh_leaderboard(self) -> None:
+        """
+        Replaces the cached /top snapshot with the current leaderboards.
+
+        :return: None
+        """
+        leaderboard = {}
+        for period in PredictionStorage.LEADERBOARD_PERIODS:
+            rows = await self.db_tools.get_leaderboard_async(
+                period,
+                constants.LEADERBOARD_SIZE
+                + len(constants.LEADERBOARD_EXCLUDED_USER_IDS)
+            )
+            leaderboard[period] = [
+                (user_name or 'anonymous', approved)
+                for user_id, user_name, approved in rows
+                if user_id not in constants.LEADERBOARD_EXCLUDED_USER_IDS
+            ][:constants.LEADERBOARD_SIZE]
+        self.leaderboard = leaderboard
+        self.leaderboard_updated_at = datetime.now()
+
+    # noinspection PyUnusedLocal
+    async def leaderboard_job(
+        self, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Refreshes the cached /top snapshot."""
+        try:
+            await self.refresh_leaderboard()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Leaderboard refresh failed')
+
+    async def top_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Handles the /top [week|month|all] command with the users whose
+        suggestions were approved the most. Served from the snapshot
+        refreshed by the leaderboard job, so it never hits the database
+        after the first call.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: None
+        """
+        self.logger.debug('Running /top command')
+        period = context.args[0].lower() if context.args else 'month'
+        if period not in PredictionStorage.LEADERBOARD_PERIODS:
+            await update.message.reply_text(
+                'Usage: /top '
+                f"[{'|'.join(PredictionStorage.LEADERBOARD_PERIODS)}]"
+            )
+            return
+        if self.leaderboard_updated_at is None:
+            await self.refresh_leaderboard()
+
+        leaders = self.leaderboard.get(period)
+        title = {
+            'all': 'of all time', 'month': 'of the month',
+            'week': 'of the week',
+        }[period]
+        if not leaders:
+            await update.message.reply_text(
+                f'No approved suggestions {title} yet, try /suggest'
+            )
+            return
+        await update.message.reply_text(
+            f'Top suggesters {title}:\n'
+            + '\n'.join(
+                f'{place}. {user_name}: {approved}'
+                for place, (user_name, approved) in enumerate(leaders, 1)
+            )
+        )
 
     # noinspection PyUnusedLocal
     async def inline_query(
@@ -230,8 +883,10 @@ class KindPredictionsBot:
     ) -> None:
         """
         This method handles inline queries.
-        It generates a list of InlineQueryResultArticle objects
-        and answers the inline query.
+        It answers the inline query with the "булка" and
+        the prediction articles pre-serialized by inline_results.
+        The query text may name a prediction pool, the default pool
+        is used otherwise.
 
         :param update: The update object containing information about
             the incoming update.
@@ -240,30 +895,89 @@ class KindPredictionsBot:
         :return: None
         """
         self.logger.debug('Running inline query')
-        results = [
-            InlineQueryResultArticle(
-                id=str(uuid4()),
-                title="Насколько ты булка?",
-                input_message_content=InputTextMessageContent(
-                    f"{str(random.randint(50, 100))}% булка!"
-                ),
-            ),
-            InlineQueryResultArticle(
-                id=str(uuid4()),
-                title="Предсказание",
-                input_message_content=InputTextMessageContent(
-                    await self.db_tools.get_random_approved_prediction_async()
-                ),
-            )
-        ]
-        await update.inline_query.answer(
-            results,
+        prediction = await self._inline_prediction(update.inline_query.query)
+        # a new pool may have no approved predictions yet, then
+        # the prediction article is left out
+        await answer_inline_query(
+            update.inline_query.get_bot(),
+            update.inline_query.id,
+            self.inline_results.results(prediction),
             cache_time=(
                 constants.INLINE_QUERY_ANSWER_CACHE_TIMEOUT
                 if not self.test_run else 0
             ),
             is_personal=True
         )
+        if self.analytics is not None and prediction is not None:
+            self.analytics.served(
+                update.inline_query.from_user.id, prediction[0]
+            )
+
+    # noinspection PyUnusedLocal
+    async def chosen_inline_result(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Logs the prediction a user sent from an inline answer. Telegram
+        sends these updates only with inline feedback enabled for the bot
+        in @BotFather (/setinlinefeedback).
+
+        :param update: The update object containing information about
+            the incoming update.
+        :param context: The context object providing additional
+            information and functionalities.
+        :return: None
+        """
+        result = update.chosen_inline_result
+        prediction_id = prediction_id_of(result.result_id)
+        if self.analytics is not None and prediction_id is not None:
+            self.analytics.chosen(result.from_user.id, prediction_id)
+
+    async def _inline_prediction(
+        self, query: str
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Chooses a random approved prediction of the pool named by
+        an inline query: from the snapshot or the cache when there are
+        ones, from the storage otherwise. If the storage is overloaded
+        and sheds the read, the last prediction read for the pool is
+        reused.
+
+        :param query: The text of the inline query.
+        :return: (prediction id, prediction text), or None if the pool
+            is empty.
+        """
+        pool_ids = (
+            self.approved_predictions.pool_ids
+            if self.approved_predictions is not None
+            else await self.db_tools.get_pools_async()
+        )
+        pool_id = pool_ids.get(
+            query.strip().casefold(), PredictionStorage.DEFAULT_POOL_ID
+        )
+        prediction = None
+        if (
+            self.snapshot is not None
+            and pool_id == PredictionStorage.DEFAULT_POOL_ID
+        ):
+            prediction = self.snapshot.random_item()
+        elif self.approved_predictions is not None:
+            await self.approved_predictions.load(
+                pool_id, self.db_tools.executor
+            )
+            prediction = self.approved_predictions.random_item(pool_id)
+        if prediction is None:
+            try:
+                prediction = (
+                    await self.db_tools.get_random_approved_item_async(
+                        pool_id
+                    )
+                )
+            except Overloaded:
+                return self._inline_fallbacks.get(pool_id)
+            if prediction is not None:
+                self._inline_fallbacks[pool_id] = prediction
+        return prediction
 
     # noinspection PyUnusedLocal
     async def notify_admin_unapproved_predictions(
@@ -271,73 +985,256 @@ class KindPredictionsBot:
         context: ContextTypes.DEFAULT_TYPE
     ):
         """
-        Notify the admin if there are unapproved predictions
-        in the DB with buttons to approve, reject or
-        mark them as inappropriate.
+        Notify the admin about the unapproved predictions added since
+        the last notification with buttons to approve, reject or
+        mark them as inappropriate, and about the number of the older
+        ones still waiting.
+
+        The last notified prediction ID (the high-water mark) is kept
+        in the bot state, so every prediction is sent once.
         """
 
         self.logger.debug('Starting to notify admin of unapproved predictions')
 
-        unapproved_predictions = (
-            await self.db_tools.get_unapproved_predictions_async()
+        notified_id = int(await self.db_tools.get_state_async(
+            NOTIFIED_PREDICTION_ID_KEY, '0'
+        ))
+        unapproved_predictions, older_count = (
+            await self.db_tools.get_unapproved_predictions_since_async(
+                notified_id
+            )
         )
 
+        if older_count:
+            await context.bot.send_message(
+                chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
+                text=(
+                    f'{older_count} earlier predictions are still waiting '
+                    'for approval'
+                ),
+            )
         if unapproved_predictions:
             self.logger.debug('There are unapproved prediction')
-            for prediction in unapproved_predictions:
-                btn_approve = InlineKeyboardButton(
-                    'Approve',
-                    callback_data=(
-                        json.dumps(
-                            [{
-                                'prediction_id': prediction[0],
-                                'state': ApprovalStates.APPROVED.value
-                            },
-                            ]
-                        ))
-                )
-                btn_reject = InlineKeyboardButton(
-                    'Reject',
-                    callback_data=(
-                        json.dumps(
-                            [{
-                                'prediction_id': prediction[0],
-                                'state': ApprovalStates.REJECTED.value
-                            },
-                            ]
-                        ))
+            await self._send_unapproved_predictions(
+                unapproved_predictions, context
+            )
+            # moved only once all are sent, a failed run is repeated
+            await self.db_tools.set_state_async(
+                NOTIFIED_PREDICTION_ID_KEY, str(max(
+                    prediction[0] for prediction in unapproved_predictions
+                ))
+            )
+        elif not older_count:
+            self.logger.debug('There is no unapproved prediction')
+            await context.bot.send_message(
+                chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
+                text='You have no unapproved predictions',
+            )
+
+    async def _send_unapproved_predictions(
+        self, unapproved_predictions: List[Tuple],
+        context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Sends the admin a message with moderation buttons
+        for every prediction.
+
+        :param unapproved_predictions: (prediction_id, prediction_text,
+            duplicate_of, pool_id) tuples.
+        :param context: The context of the job.
+        :return: None
+        """
+        for prediction in unapproved_predictions:
+            btn_approve = InlineKeyboardButton(
+                'Approve',
+                callback_data=(
+                    json.dumps(
+                        [{
+                            'prediction_id': prediction[0],
+                            'state': ApprovalStates.APPROVED.value
+                        },
+                        ]
+                    ))
+            )
+            btn_reject = InlineKeyboardButton(
+                'Reject',
+                callback_data=(
+                    json.dumps(
+                        [{
+                            'prediction_id': prediction[0],
+                            'state': ApprovalStates.REJECTED.value
+                        },
+                        ]
+                    ))
+            )
+            btn_inappropriate = InlineKeyboardButton(
+                'Mark as Inappropriate',
+                callback_data=(
+                    json.dumps(
+                        [{
+                            'prediction_id': prediction[0],
+                            'state': ApprovalStates.INAPPROPRIATE.value
+                        },
+                        ]
+                    ))
+            )
+
+            reply_markup = InlineKeyboardMarkup(
+                [[btn_approve, btn_reject], [btn_inappropriate]]
+            )
+
+            self.logger.debug(
+                'Sending message with unapproved prediction'
+            )
+
+            text = f"Prediction: {prediction[1]}"
+            if prediction[3] != PredictionStorage.DEFAULT_POOL_ID:
+                pool_name = await self.db_tools.get_pool_name_async(
+                    prediction[3]
                 )
-                btn_inappropriate = InlineKeyboardButton(
-                    'Mark as Inappropriate',
-                    callback_data=(
-                        json.dumps(
-                            [{
-                                'prediction_id': prediction[0],
-                                'state': ApprovalStates.INAPPROPRIATE.value
-                            },
-                            ]
-                        ))
+                text += f"\nPool: {pool_name}"
+            if prediction[2] is not None:
+                original = await self.db_tools.get_prediction_by_id_async(
+                    prediction[2]
                 )
-
-                reply_markup = InlineKeyboardMarkup(
-                    [[btn_approve, btn_reject], [btn_inappropriate]]
+                text += (
+                    f"\n\nPossible duplicate of {prediction[2]}: "
+                    f"{original[1] if original else '(archived)'}"
                 )
+            await context.bot.send_message(
+                chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
+                text=text,
+                reply_markup=reply_markup
+            )
 
+    # noinspection PyUnusedLocal
+    async def approved_cache_job(
+        self, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Applies the changes of the approved predictions to the cache,
+        costs a single PRAGMA when nothing has changed.
+        """
+        try:
+            changed = await self.approved_predictions.refresh(
+                self.db_tools.executor
+            )
+            if changed:
                 self.logger.debug(
-                    'Sending message with unapproved prediction'
+                    'Approved predictions cache refreshed: pools %s, '
+                    'mod_seq %s', sorted(changed),
+                    self.approved_predictions.mod_seq
                 )
+            if PredictionStorage.DEFAULT_POOL_ID in changed:
+                await self._write_snapshot()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Approved predictions cache refresh failed')
 
-                await context.bot.send_message(
-                    chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
-                    text=f"Prediction: {prediction[1]}",
-                    reply_markup=reply_markup
-                )
-        else:
-            self.logger.debug('There is no unapproved prediction')
-            await context.bot.send_message(
-                chat_id=secrets.MAIN_ADMIN_TG_USER_ID,
-                text='You have no unapproved predictions',
+    async def _write_snapshot(self) -> None:
+        """
+        Writes the approved predictions of the default pool to
+        the snapshot file. They are read from the database on
+        the executor, copying them out of the cache would take
+        the event loop as long.
+        """
+        if not self.write_snapshot_path:
+            return
+        count = await asyncio.get_running_loop().run_in_executor(
+            self.db_tools.executor, build_snapshot, self.db_tools.db_name,
+            self.write_snapshot_path
+        )
+        self.logger.debug(
+            'Snapshot %s written: %s predictions',
+            self.write_snapshot_path, count
+        )
+
+    # noinspection PyUnusedLocal
+    async def snapshot_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Maps the snapshot again when the writer has replaced it."""
+        try:
+            self.snapshot.reload()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Snapshot reload failed')
+
+    # noinspection PyUnusedLocal
+    async def backup_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Writes an online backup snapshot of the database in small steps
+        on the executor, so updates keep being processed meanwhile.
+        """
+        self.logger.debug('Starting backup')
+        try:
+            self.last_backup = await self.db_tools.backup_async()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Backup failed')
+            return
+        self.logger.info(
+            'Backup %s written: %s pages in %s steps, %.2fs, removed %s',
+            self.last_backup['path'], self.last_backup['pages'],
+            self.last_backup['steps'], self.last_backup['duration'],
+            self.last_backup['removed']
+        )
+
+    # noinspection PyUnusedLocal
+    async def archive_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Moves old rejected and inappropriate predictions to the archive
+        database in small batches on the executor and vacuums the file.
+        """
+        self.logger.debug('Starting archival')
+        try:
+            self.last_archival = (
+                await self.db_tools.archive_predictions_async()
             )
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Archival failed')
+            return
+        self.logger.info(
+            'Archived %s predictions, freed %s pages in %.2fs',
+            self.last_archival['archived'],
+            self.last_archival['freed_pages'],
+            self.last_archival['duration']
+        )
+
+    async def rate_limit_report_job(
+        self, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Drops idle rate limit buckets and sends the admin one summary
+        of the /suggest rate limit violations since the last report.
+        """
+        for limiter in (
+            self.user_suggestions_limiter, self.suggestions_limiter
+        ):
+            limiter.evict()
+        user_violations = self.user_suggestions_limiter.take_violations()
+        global_violations = sum(
+            self.suggestions_limiter.take_violations().values()
+        )
+        if not user_violations and not global_violations:
+            return
+
+        lines = [
+            f'/suggest rate limits hit in the last '
+            f'{constants.RATE_LIMIT_REPORT_MINUTES} minutes:',
+            f'per user: {sum(user_violations.values())} times '
+            f'by {len(user_violations)} users',
+        ]
+        lines.extend(
+            f'  {user_id}: {count}'
+            for user_id, count in user_violations.most_common(5)
+        )
+        lines.append(f'global: {global_violations} times')
+        await context.bot.send_message(
+            chat_id=secrets.MAIN_ADMIN_TG_USER_ID, text='\n'.join(lines)
+        )
+
+    # noinspection PyUnusedLocal
+    async def analytics_job(
+        self, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """Writes the buffered analytics events in one batch."""
+        await self.analytics.flush_async()
 
     async def remove_job_if_exists(
         self, name: str, context: ContextTypes.DEFAULT_TYPE
@@ -400,7 +1297,7 @@ class KindPredictionsBot:
             self.logger.debug('Checking once')
             context.job_queue.run_once(
                 self.notify_admin_unapproved_predictions,
-                when=datetime.now().minute + 1,
+                when=0,
                 name=str(secrets.MAIN_ADMIN_TG_USER_ID),
                 user_id=secrets.MAIN_ADMIN_TG_USER_ID
             )
@@ -453,7 +1350,7 @@ class KindPredictionsBot:
             text=text
         )
         self.logger.debug(text)
-        job = await context.job_queue.get_jobs_by_name(
+        job = context.job_queue.get_jobs_by_name(
             str(secrets.MAIN_ADMIN_TG_USER_ID)
         )
         if job:
@@ -513,6 +1410,63 @@ class KindPredictionsBot:
             update, context, run_once=True
         )
 
+    async def profile_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Toggles profiling of the running bot, admin only.
+
+        "/profile" starts profiling until the next "/profile",
+        "/profile 30" starts it for 30 seconds. Stopping writes
+        flamegraph-compatible collapsed stacks and a per-coroutine
+        wall/CPU breakdown to logs/.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: None
+        """
+        self.logger.debug('Running /profile command')
+        if not await self._is_admin(update, context):
+            return
+
+        if self.profiler.running:
+            stacks_path, coroutines_path = self.profiler.stop()
+            await update.message.reply_text(
+                f'Profiling stopped: {stacks_path}, {coroutines_path}'
+            )
+            return
+
+        duration = None
+        if context.args:
+            try:
+                duration = float(context.args[0])
+            except ValueError:
+                await update.message.reply_text('Usage: /profile [seconds]')
+                return
+        self.profiler.start(asyncio.get_running_loop(), duration=duration)
+        await update.message.reply_text(
+            'Profiling started'
+            + (f' for {duration:g}s' if duration else ', /profile to stop')
+        )
+
+    async def stats_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Sends the bot runtime statistic (event loop lag histogram,
+        blocking callbacks, etc.) to the admin.
+
+        :param update: The incoming update object.
+        :param context: The context object for this update.
+        :return: None
+        """
+        self.logger.debug('Running /stats command')
+        if not await self._is_admin(update, context):
+            return
+        await update.message.reply_text(
+            self.runtime_stats(context.application)
+        )
+
     # noinspection PyUnusedLocal
     async def button_handler(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -578,27 +1532,17 @@ class KindPredictionsBot:
         await query.answer()
 
 
-def main() -> None:
-    """Run the bot."""
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        '--test_run', help='If it is a test run',
-        action='store_true'
-    )
-    args = parser.parse_args()
-
-    is_test_run = args.test_run
-
-    bot = KindPredictionsBot(
-        logging_level=logging.DEBUG,
-        test_run=True if is_test_run is True else False
-    )
+def add_handlers(application: Application, bot: KindPredictionsBot) -> None:
+    """
+    Registers all handlers of the bot in the application.
 
-    # Create the Application and pass it your bot's token.
-    application = Application.builder().token(
-        secrets.API_TOKEN if not is_test_run else secrets.API_TOKEN_TEST
-    ).build()
+    Handlers are blocking on purpose: concurrency and ordering are
+    governed by the application's OrderedUpdateProcessor.
 
+    :param application: The application to register handlers in.
+    :param bot: The bot instance whose methods handle the updates.
+    :return: None
+    """
     # on different commands - answer in Telegram
     application.add_handler(
         CommandHandler(
@@ -617,8 +1561,22 @@ def main() -> None:
     )
     application.add_handler(
         CommandHandler(
-            "suggest", bot.suggest_command,
-            block=False
+            "suggest", bot.suggest_command
+        )
+    )
+    application.add_handler(
+        CommandHandler(
+            "mystats", bot.my_stats_command
+        )
+    )
+    application.add_handler(
+        CommandHandler(
+            "top", bot.top_command
+        )
+    )
+    application.add_handler(
+        CommandHandler(
+            "pool", bot.pool_command
         )
     )
 
@@ -626,32 +1584,245 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(bot.button_handler))
     # on inline queries - show corresponding inline results
     application.add_handler(InlineQueryHandler(bot.inline_query))
+    application.add_handler(
+        ChosenInlineResultHandler(bot.chosen_inline_result)
+    )
 
     # start job for notifying about unapproved messages
     application.add_handler(
         CommandHandler(
             "notify_start",
-            bot.start_unapproved_messages_notify,
-            block=False
+            bot.start_unapproved_messages_notify
         )
     )
     application.add_handler(
         CommandHandler(
             "notify_stop",
-            bot.stop_unapproved_messages_notify,
-            block=False
+            bot.stop_unapproved_messages_notify
         )
     )
     application.add_handler(
         CommandHandler(
             "check_once",
-            bot.check_unapproved_messages_once,
-            block=False
+            bot.check_unapproved_messages_once
+        )
+    )
+    application.add_handler(
+        CommandHandler(
+            "profile", bot.profile_command
         )
     )
+    application.add_handler(
+        CommandHandler(
+            "stats", bot.stats_command
+        )
+    )
+
+
+class WarmStartApplication(Application):
+    """
+    Application that starts warming up the bot caches before it
+    initialises the Bot API (getMe and the update processor), so on
+    a restart the database reads overlap the network round trip
+    instead of following it.
+
+    Attributes:
+        warm_up (Callable): Starts the warm-up, e.g.
+            KindPredictionsBot.start_warm_up, must be idempotent.
+    """
+
+    def __init__(self, warm_up: Callable[[], asyncio.Task], **kwargs):
+        super().__init__(**kwargs)
+        self.warm_up = warm_up
+
+    async def initialize(self) -> None:
+        self.warm_up()
+        await super().initialize()
+
+
+def main() -> None:
+    """Run the bot."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--test_run', help='If it is a test run',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--record_updates',
+        help='Record incoming updates to the given .jsonl.gz file',
+    )
+    parser.add_argument(
+        '--anonymize_recording',
+        help='Replace user and chat ids and names in the recording',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--profile',
+        help=(
+            'Profile the bot from the start for the given number of seconds '
+            '(until /profile or shutdown when omitted), dumps to logs/'
+        ),
+        type=float, nargs='?', const=0, metavar='SECONDS'
+    )
+    parser.add_argument(
+        '--backup_interval',
+        help='Hours between online backups of the database, 0 disables them',
+        type=float, default=constants.BACKUP_INTERVAL_HOURS
+    )
+    parser.add_argument(
+        '--archive_interval',
+        help=(
+            'Hours between archivals of old rejected and inappropriate '
+            'predictions, 0 disables them'
+        ),
+        type=float, default=constants.ARCHIVE_INTERVAL_HOURS
+    )
+    parser.add_argument(
+        '--write_snapshot',
+        help=(
+            'Keep the given snapshot file of the approved predictions '
+            'up to date for worker processes'
+        ),
+        nargs='?', const=constants.SNAPSHOT_PATH, metavar='PATH'
+    )
+    parser.add_argument(
+        '--read_snapshot',
+        help=(
+            'Serve inline queries from the given snapshot file written '
+            'by another process with --write_snapshot'
+        ),
+        nargs='?', const=constants.SNAPSHOT_PATH, metavar='PATH'
+    )
+    parser.add_argument(
+        '--storage',
+        help=(
+            'Storage backend: the SQLite database or memory, which keeps '
+            'nothing after exit and is meant for tests'
+        ),
+        choices=('sqlite', 'memory'), default='sqlite'
+    )
+    parser.add_argument(
+        '--analytics_db',
+        help=(
+            'Database of the served and chosen predictions, '
+            'an empty string disables the analytics'
+        ),
+        default=constants.ANALYTICS_DB_NAME, metavar='PATH'
+    )
+    parser.add_argument(
+        '--max_concurrent_updates',
+        help='Global cap on updates processed at the same time',
+        type=int, default=constants.MAX_CONCURRENT_UPDATES
+    )
+    parser.add_argument(
+        '--max_pending_updates',
+        help='Cap on updates accepted for processing, including waiting ones',
+        type=int, default=constants.MAX_PENDING_UPDATES
+    )
+    parser.add_argument(
+        '--pool_size',
+        help='Connections of the Bot API pool of everything but getUpdates',
+        type=int, default=constants.BOT_API_POOL_SIZE
+    )
+    parser.add_argument(
+        '--get_updates_pool_size',
+        help='Connections of the Bot API pool of the getUpdates long poll',
+        type=int, default=constants.BOT_API_GET_UPDATES_POOL_SIZE
+    )
+    parser.add_argument(
+        '--pool_timeout',
+        help='Seconds a Bot API call waits for a free connection',
+        type=float, default=constants.BOT_API_POOL_TIMEOUT
+    )
+    parser.add_argument(
+        '--connect_timeout',
+        help='Seconds to wait for a new Bot API connection',
+        type=float, default=constants.BOT_API_CONNECT_TIMEOUT
+    )
+    parser.add_argument(
+        '--read_timeout',
+        help='Seconds to wait for a Bot API response',
+        type=float, default=constants.BOT_API_READ_TIMEOUT
+    )
+    parser.add_argument(
+        '--write_timeout',
+        help='Seconds to wait for a Bot API request to be sent',
+        type=float, default=constants.BOT_API_WRITE_TIMEOUT
+    )
+    parser.add_argument(
+        '--http_version',
+        help='HTTP version of the Bot API calls, 2 needs the http2 extra',
+        choices=('1.1', '2'), default=constants.BOT_API_HTTP_VERSION
+    )
+    args = parser.parse_args()
+
+    is_test_run = args.test_run
+    # only needed with these options, not imported on every start
+    if args.storage == 'memory':
+        from memory_storage import MemoryStorageAsync
+    if args.record_updates:
+        from update_recorder import UpdateRecorder
+
+    bot = KindPredictionsBot(
+        logging_level=logging.DEBUG,
+        test_run=True if is_test_run is True else False,
+        profile_duration=args.profile,
+        backup_interval=args.backup_interval,
+        archive_interval=args.archive_interval,
+        write_snapshot_path=args.write_snapshot,
+        read_snapshot_path=args.read_snapshot,
+        storage=MemoryStorageAsync() if args.storage == 'memory' else None,
+        analytics_db=args.analytics_db
+    )
+
+    request, get_updates_request = (
+        build_request(
+            name, pool_size, args.pool_timeout, args.connect_timeout,
+            args.read_timeout, args.write_timeout, args.http_version
+        )
+        for name, pool_size in (
+            ('outbound', args.pool_size),
+            ('get_updates', args.get_updates_pool_size),
+        )
+    )
+    bot.bot_api_requests = [get_updates_request, request]
+
+    # Create the Application and pass it your bot's token.
+    application = (
+        Application.builder()
+        .application_class(
+            WarmStartApplication, {'warm_up': bot.start_warm_up}
+        )
+        .token(
+            secrets.API_TOKEN if not is_test_run else secrets.API_TOKEN_TEST
+        )
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .concurrent_updates(OrderedUpdateProcessor(
+            args.max_concurrent_updates, args.max_pending_updates
+        ))
+        .post_init(bot.post_init)
+        .post_shutdown(bot.post_shutdown)
+        .build()
+    )
+
+    if args.record_updates:
+        recorder = UpdateRecorder(
+            args.record_updates, anonymize=args.anonymize_recording
+        )
+        # group -1 runs before the bot handlers and sees every update
+        application.add_handler(
+            TypeHandler(Update, recorder.record), group=-1
+        )
+
+    add_handlers(application, bot)
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    try:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    finally:
+        if args.record_updates:
+            recorder.close()
 
 
 if __name__ == "__main__":
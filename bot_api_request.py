@@ -0,0 +1,166 @@
+"""
+This module provides the HTTP client of the Bot API calls.
+
+InstrumentedHTTPXRequest is the HTTPXRequest of python-telegram-bot
+with its connection pool, timeouts and HTTP version taken from
+constants or the command line, which also measures how long every
+call waits for a free connection of the pool: the time between
+httpx handing the request to the transport and the first event of
+the connection it got (a new TCP connection or the request headers
+sent on a reused one).
+
+The bot uses two of them, like python-telegram-bot does by default:
+one for the getUpdates long poll, which holds its connection for up
+to the polling timeout, and a larger one for everything else, so
+answers never queue behind polling.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest
+
+# upper bounds of the pool wait histogram buckets, in milliseconds
+POOL_WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest that counts calls, connections and pool waits.
+
+    Attributes:
+        name (str): The name of the pool in the statistic.
+        connection_pool_size (int): The number of connections
+            of the pool.
+        requests (int): Number of calls made.
+        in_flight (int): Number of calls being made now.
+        max_in_flight (int): The largest number of calls made at once.
+        connections_opened (int): Number of TCP connections opened.
+        pool_timeouts (int): Number of calls that got no connection
+            within the pool timeout.
+        pool_wait_histogram (list): Number of calls per bucket of
+            POOL_WAIT_BUCKETS_MS, the last item counts calls above
+            the last bucket.
+        total_pool_wait (float): Seconds all calls waited for
+            a connection.
+        max_pool_wait (float): The longest wait for a connection,
+            in seconds.
+    """
+
+    def __init__(
+        self, name: str, connection_pool_size: int = 1, **kwargs
+    ):
+        self.name = name
+        self.connection_pool_size = connection_pool_size
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections_opened = 0
+        self.pool_timeouts = 0
+        self.pool_wait_histogram: List[int] = (
+            [0] * (len(POOL_WAIT_BUCKETS_MS) + 1)
+        )
+        self.total_pool_wait = 0.0
+        self.max_pool_wait = 0.0
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            event_hooks={'request': [self._trace_pool_wait]},
+            **self._client_kwargs
+        )
+
+    async def _trace_pool_wait(self, request: httpx.Request) -> None:
+        # request hooks run right before the transport, which waits
+        # for a connection of the pool and then traces its first event
+        queued_at = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: Dict) -> None:
+            nonlocal acquired
+            if event_name == 'connection.connect_tcp.started':
+                self.connections_opened += 1
+            if not acquired:
+                acquired = True
+                self._count_pool_wait(time.perf_counter() - queued_at)
+
+        request.extensions['trace'] = trace
+
+    def _count_pool_wait(self, wait: float) -> None:
+        self.total_pool_wait += wait
+        self.max_pool_wait = max(self.max_pool_wait, wait)
+        self.pool_wait_histogram[
+            bisect_left(POOL_WAIT_BUCKETS_MS, wait * 1000)
+        ] += 1
+
+    async def do_request(self, *args, **kwargs):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().do_request(*args, **kwargs)
+        except TimedOut as exc:
+            if isinstance(exc.__cause__, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the pool statistic.
+
+        :return: A dict with the pool size, the numbers of calls,
+            connections and pool timeouts, the average and the max
+            pool wait in ms and the histogram as {"<=Nms": count}.
+        """
+        labels = [f'<={bucket}ms' for bucket in POOL_WAIT_BUCKETS_MS]
+        labels.append(f'>{POOL_WAIT_BUCKETS_MS[-1]}ms')
+        waited = sum(self.pool_wait_histogram)
+        return {
+            'pool_size': self.connection_pool_size,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'connections_opened': self.connections_opened,
+            'pool_timeouts': self.pool_timeouts,
+            'avg_pool_wait_ms': round(
+                self.total_pool_wait / waited * 1000 if waited else 0, 2
+            ),
+            'max_pool_wait_ms': round(self.max_pool_wait * 1000, 1),
+            'histogram': dict(zip(labels, self.pool_wait_histogram)),
+        }
+
+
+def build_request(
+    name: str, connection_pool_size: int, pool_timeout: Optional[float],
+    connect_timeout: Optional[float], read_timeout: Optional[float],
+    write_timeout: Optional[float], http_version: str = '1.1'
+) -> InstrumentedHTTPXRequest:
+    """
+    Builds an instrumented request for Application.builder().request()
+    or .get_updates_request().
+
+    :param name: The name of the pool in the statistic.
+    :param connection_pool_size: The number of connections of the pool.
+    :param pool_timeout: Seconds to wait for a free connection.
+    :param connect_timeout: Seconds to wait for a new connection.
+    :param read_timeout: Seconds to wait for a response, the getUpdates
+        timeout is added to it by python-telegram-bot.
+    :param write_timeout: Seconds to wait for a request to be sent.
+    :param http_version: "1.1" or "2", HTTP/2 needs
+        python-telegram-bot[http2].
+    :return: The request.
+    """
+    return InstrumentedHTTPXRequest(
+        name,
+        connection_pool_size=connection_pool_size,
+        pool_timeout=pool_timeout,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        http_version=http_version,
+    )
@@ -0,0 +1,219 @@
+"""
+This module provides a compact in-memory store of predictions.
+
+Instead of a tuple, an int and a str object per prediction (around
+150 bytes of object overhead each), predictions are kept in columns:
+- ids, approval state codes and text offsets in `array` columns;
+- texts in one UTF-8 bytearray, decoded only when read;
+- the ids in ascending order with the row of every one, giving
+  O(log n) membership and lookup by id with bisect and memory growing
+  with the rows only, however large and sparse the ids are;
+- an array of rows per approval state with the position of every row
+  in it, giving O(1) random choice within a state and O(1) moves
+  between states.
+
+Changed texts are appended to the buffer and removed predictions leave
+dead rows behind, compact() drops both.
+"""
+
+import random
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from db_tools import ApprovalStates
+
+STATES: Tuple[str, ...] = tuple(state.value for state in ApprovalStates)
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+_MISSING = -1
+
+
+class CompactPredictionStore:
+    """
+    Column-oriented store of (prediction id, text, approval state).
+
+    Attributes:
+        dead_rows (int): Rows of removed or replaced predictions.
+    """
+
+    def __init__(self, predictions: Iterable[Tuple[int, str, str]] = ()):
+        self._reset()
+        for prediction_id, text, state in predictions:
+            self.add(prediction_id, text, state)
+
+    def _reset(self) -> None:
+        self.dead_rows = 0
+        self._ids = array('q')
+        self._states = array('B')
+        self._starts = array('Q')
+        self._lengths = array('I')
+        self._blob = bytearray()
+        # ascending ids and their rows, mostly appended to as new
+        # predictions get the largest ids
+        self._sorted_ids = array('q')
+        self._sorted_rows = array('i')
+        self._state_rows: List[array] = [array('i') for _ in STATES]
+        # position of every row in its state_rows array
+        self._state_positions = array('i')
+
+    def __len__(self) -> int:
+        return len(self._ids) - self.dead_rows
+
+    def __contains__(self, prediction_id: int) -> bool:
+        return self._row(prediction_id) != _MISSING
+
+    def count(self, state: str) -> int:
+        """
+        Returns the number of predictions in the approval state.
+
+        :param state: The approval state.
+        :return: The number of predictions.
+        """
+        return len(self._state_rows[STATE_CODES[state]])
+
+    def get(self, prediction_id: int) -> Optional[Tuple[str, str]]:
+        """
+        Returns the prediction with the id.
+
+        :param prediction_id: The ID of the prediction.
+        :return: (prediction text, approval state), or None.
+        """
+        row = self._row(prediction_id)
+        if row == _MISSING:
+            return None
+        return self._text(row), STATES[self._states[row]]
+
+    def random(
+        self, state: str, rnd: random.Random = random
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Returns a random prediction in the approval state.
+
+        :param state: The approval state.
+        :param rnd: The random generator.
+        :return: (prediction id, prediction text), or None if there are
+            no predictions in the state.
+        """
+        rows = self._state_rows[STATE_CODES[state]]
+        if not rows:
+            return None
+        row = rows[rnd.randrange(len(rows))]
+        return self._ids[row], self._text(row)
+
+    def items(self, state: str) -> Iterator[Tuple[int, str]]:
+        """
+        Iterates over the predictions in the approval state.
+
+        :param state: The approval state.
+        :return: An iterator of (prediction id, prediction text).
+        """
+        for row in self._state_rows[STATE_CODES[state]]:
+            yield self._ids[row], self._text(row)
+
+    def add(self, prediction_id: int, text: str, state: str) -> None:
+        """
+        Adds a prediction or replaces the one with the same id.
+
+        :param prediction_id: The ID of the prediction.
+        :param text: The prediction text.
+        :param state: The approval state.
+        :return: None
+        """
+        row = self._row(prediction_id)
+        if row != _MISSING:
+            if self._text(row) == text:
+                self.set_state(prediction_id, state)
+                return
+            self.remove(prediction_id)
+
+        encoded = text.encode('utf-8')
+        row = len(self._ids)
+        self._ids.append(prediction_id)
+        self._states.append(STATE_CODES[state])
+        self._starts.append(len(self._blob))
+        self._lengths.append(len(encoded))
+        self._blob += encoded
+        position = bisect_left(self._sorted_ids, prediction_id)
+        self._sorted_ids.insert(position, prediction_id)
+        self._sorted_rows.insert(position, row)
+        state_rows = self._state_rows[STATE_CODES[state]]
+        self._state_positions.append(len(state_rows))
+        state_rows.append(row)
+
+    def set_state(self, prediction_id: int, state: str) -> None:
+        """
+        Moves a prediction to another approval state.
+
+        :param prediction_id: The ID of the prediction.
+        :param state: The new approval state.
+        :return: None
+        """
+        row = self._row(prediction_id)
+        if row == _MISSING or self._states[row] == STATE_CODES[state]:
+            return
+        self._unlink_state(row)
+        self._states[row] = STATE_CODES[state]
+        state_rows = self._state_rows[STATE_CODES[state]]
+        self._state_positions[row] = len(state_rows)
+        state_rows.append(row)
+
+    def remove(self, prediction_id: int) -> None:
+        """
+        Removes a prediction, its row stays dead until compact().
+
+        :param prediction_id: The ID of the prediction.
+        :return: None
+        """
+        row = self._row(prediction_id)
+        if row == _MISSING:
+            return
+        self._unlink_state(row)
+        position = bisect_left(self._sorted_ids, prediction_id)
+        del self._sorted_ids[position]
+        del self._sorted_rows[position]
+        self.dead_rows += 1
+
+    def compact(self) -> None:
+        """Drops dead rows and unused text bytes."""
+        live = [
+            (self._ids[row], self._text(row), STATES[self._states[row]])
+            for state_rows in self._state_rows for row in state_rows
+        ]
+        self._reset()
+        for prediction_id, text, state in sorted(live):
+            self.add(prediction_id, text, state)
+
+    def memory_usage(self) -> int:
+        """
+        Returns the size of the columns and the text buffer, in bytes.
+        """
+        return len(self._blob) + sum(
+            column.buffer_info()[1] * column.itemsize
+            for column in (
+                self._ids, self._states, self._starts, self._lengths,
+                self._sorted_ids, self._sorted_rows, self._state_positions,
+                *self._state_rows
+            )
+        )
+
+    def _row(self, prediction_id: int) -> int:
+        position = bisect_left(self._sorted_ids, prediction_id)
+        if (
+            position < len(self._sorted_ids)
+            and self._sorted_ids[position] == prediction_id
+        ):
+            return self._sorted_rows[position]
+        return _MISSING
+
+    def _text(self, row: int) -> str:
+        start = self._starts[row]
+        return self._blob[start:start + self._lengths[row]].decode('utf-8')
+
+    def _unlink_state(self, row: int) -> None:
+        # move the last row of the state into the freed position
+        state_rows = self._state_rows[self._states[row]]
+        position = self._state_positions[row]
+        last_row = state_rows.pop()
+        if last_row != row:
+            state_rows[position] = last_row
+            self._state_positions[last_row] = position
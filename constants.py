@@ -1,3 +1,66 @@
 GITHUB_URL = 'https://github.com/funaska/kind_predictions_bot'
 DB_NAME = 'kind_predictions.db'
 INLINE_QUERY_ANSWER_CACHE_TIMEOUT = 10 * 60 * 60
+# updates processed at the same time, see update_processor.py
+MAX_CONCURRENT_UPDATES = 32
+# updates accepted for processing, including the ones waiting their turn
+MAX_PENDING_UPDATES = 1024
+# online backups, see DBTools.backup
+BACKUP_DIR = 'backups'
+BACKUP_INTERVAL_HOURS = 24
+BACKUP_RETENTION = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+# archival of rejected and inappropriate predictions, see DBTools.archive_predictions
+# the archive of <name>.db is <name>_archive.db next to it
+ARCHIVE_DB_SUFFIX = '_archive'
+ARCHIVE_INTERVAL_HOURS = 24
+ARCHIVE_RETENTION_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.05
+VACUUM_PAGES_PER_STEP = 1000
+# /top leaderboard
+LEADERBOARD_SIZE = 10
+LEADERBOARD_REFRESH_MINUTES = 10
+# the author of default_predictions.sql is not a contributor
+LEADERBOARD_EXCLUDED_USER_IDS = (1, )
+# near-duplicate suggestions
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+# 'flag' - send to moderation marked as a duplicate, 'reject' - reject
+DUPLICATE_ACTION = 'flag'
+# automatic pre-moderation of suggestions
+MODERATION_BLOCKLIST = 'moderation/blocklist.txt'
+MODERATION_ALLOWLIST = 'moderation/allowlist.txt'
+MODERATION_WORKERS = 2
+MODERATION_MIN_LENGTH = 5
+MODERATION_MAX_LENGTH = 500
+# /suggest rate limits, token buckets refilled per hour
+SUGGEST_USER_PER_HOUR = 10
+SUGGEST_USER_BURST = 5
+SUGGEST_GLOBAL_PER_HOUR = 600
+SUGGEST_GLOBAL_BURST = 60
+RATE_LIMIT_REPORT_MINUTES = 60
+# approved predictions cache, seconds between change checks
+APPROVED_CACHE_POLL_SECONDS = 1
+# memory-mapped snapshot of the approved predictions shared by workers
+SNAPSHOT_PATH = 'approved.snapshot'
+# prediction pools kept in the approved predictions cache at once
+POOL_CACHE_SIZE = 100
+# Bot API HTTP connection pools, see bot_api_request.py, getUpdates
+# holds its connection for the whole long poll, so it has its own pool
+BOT_API_POOL_SIZE = 32
+BOT_API_GET_UPDATES_POOL_SIZE = 1
+BOT_API_POOL_TIMEOUT = 5.0
+BOT_API_CONNECT_TIMEOUT = 5.0
+BOT_API_READ_TIMEOUT = 5.0
+BOT_API_WRITE_TIMEOUT = 5.0
+# '1.1' or '2', HTTP/2 needs python-telegram-bot[http2]
+BOT_API_HTTP_VERSION = '1.1'
+# served and chosen predictions, see analytics.py
+ANALYTICS_DB_NAME = 'analytics.db'
+ANALYTICS_FLUSH_SECONDS = 5
+# DBToolsAsync admission control, see admission.py
+DB_MAX_IN_FLIGHT = 8
+# executor threads on top of DB_MAX_IN_FLIGHT for the approved
+# predictions cache, which is not admitted
+DB_SPARE_THREADS = 2
@@ -1,39 +1,50 @@
 """
 This module provides a collection of database tools
 for working with database for telegram bot with predictions.
+
+Run as a script it streams predictions and users in and out
+of the database as JSONL or CSV:
+    python db_tools.py export predictions predictions.jsonl
+    python db_tools.py import predictions community.csv
+    python db_tools.py show
 """
 
 
 import sqlite3
 from sqlite3 import Connection, Cursor
-from typing import List, Tuple, Union
-from enum import Enum
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union,
+)
+import argparse
+import csv
+import json
 import logging
+import os
+import sys
+import time
+import zlib
+from collections import Counter
 from contextlib import closing
-import asyncio
+from datetime import datetime
+from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import constants
+from admission import AdmissionController, Priority
+from storage import (
+    ApprovalStates, DuplicateUserError, PredictionStorage,
+    PredictionStorageAsync, UserStates,
+)
 from utils import setup_logger
 
 
-class ApprovalStates(Enum):
-    APPROVED = 'approved'
-    NOT_APPROVED = 'not approved'
-    REJECTED = 'rejected'
-    INAPPROPRIATE = 'inappropriate'
-
-
-class UserStates(Enum):
-    ACTIVE = 'active'
-    INACTIVE = 'inactive'
-
-
-class DBTools:
+class DBTools(PredictionStorage):
     """
     DBTools class is a utility class for interacting with a SQLite
     database. It provides methods for creating tables,
     executing queries, fetching data, and modifying data.
+    It is the SQLite implementation of PredictionStorage.
 
     Attributes:
         USERS_TABLE_NAME (str): The name of the users table.
@@ -50,8 +61,8 @@ class DBTools:
             the status of a prediction.
         GET_USER_PREDICTIONS_QUERY (str): The query for getting
             all predictions of a user.
-        GET_USER_STATISTIC_QUERY (str): The query for getting
-            the statistic of a user.
+        GET_USER_STATS_QUERY (str): The query for getting
+            the statistic of a user from the user_stats table.
         CHECK_IF_TABLE_EXISTS_QUERY (str): The query for checking
             if a table exists in the database.
 
@@ -65,10 +76,17 @@ class DBTools:
                 db_name (str): The name of the database.
                 logging_level (int): The logging level.
 
-        initialize_tables(self) -> None:
+        initialize_tables(self, connection=None) -> None:
             Creates the users and predictions tables
             and initializes them with default data.
 
+        migrate(self, connection=None) -> None:
+            Brings the schema of an existing database up to date.
+
+        schema_version(cls) -> int:
+            The fingerprint of the schema stored in PRAGMA user_version
+            once the database is up to date.
+
         check_if_table_exists(self, table_name: str) -> bool:
             Checks if a table exists in the database.
 
@@ -124,6 +142,13 @@ class DBTools:
                 Union[str, None]: The prediction text, or None
                 if no approved prediction is found.
 
+        get_random_approved_item(self) -> Optional[Tuple[int, str]]:
+            Gets a random approved prediction with its ID.
+
+            Returns:
+                Optional[Tuple[int, str]]: (prediction id, prediction
+                text), or None if no approved prediction is found.
+
         get_prediction_by_id(
                 self, prediction_id: int) -> Union[Tuple, None]:
             Gets a prediction by ID.
@@ -160,6 +185,41 @@ class DBTools:
 
             Returns:
                 List[Tuple]: The statistic of the user.
+
+        get_unapproved_predictions_since(
+                self, prediction_id: int) -> Tuple[List[Tuple], int]:
+            Gets the unapproved predictions added after the given one
+            and the number of the older ones.
+
+        get_state(self, key: str, default: str = None) -> str:
+            Gets a value of the persistent bot state.
+
+        set_state(self, key: str, value: str) -> None:
+            Sets a value of the persistent bot state.
+
+        get_leaderboard(self, period: str, limit: int) -> List[Tuple]:
+            Gets the users with the most approved predictions
+            in the current period (all, month or week).
+
+        get_pools(self) -> Dict[str, int]:
+            Gets the names and IDs of all prediction pools.
+
+        add_pool(self, name: str) -> int:
+            Adds a prediction pool, returns its ID.
+
+        get_chat_pool(self, chat_id: int) -> int:
+            Gets the prediction pool of a chat.
+
+        set_chat_pool(self, chat_id: int, pool_id: int) -> None:
+            Sets the prediction pool of a chat.
+
+        backup(self, backup_dir: str, retention: int, ...) -> Dict:
+            Writes a timestamped online backup snapshot of the database
+            and applies the retention.
+
+        archive_predictions(self, retention_days: float, ...) -> Dict:
+            Moves old rejected and inappropriate predictions to
+            the archive database and vacuums the freed pages.
     """
 
     USERS_TABLE_NAME = 'users'
@@ -182,7 +242,7 @@ class DBTools:
     '''
     GET_APPROVED_PREDICTION_QUERY: str = (
         f'SELECT * FROM {PREDICTIONS_TABLE_NAME} '
-        'WHERE approval_state = ? '
+        'WHERE approval_state = ? AND pool_id = ? '
         'ORDER BY random() '
         'LIMIT 1'
     )
@@ -195,23 +255,35 @@ class DBTools:
     GET_USER_PREDICTIONS_QUERY: str = (
         f'SELECT * FROM {PREDICTIONS_TABLE_NAME} WHERE user_id = ?'
     )
-    GET_USER_STATISTIC_QUERY: str = (
-        f'SELECT approval_state, COUNT(*) FROM {PREDICTIONS_TABLE_NAME} '
-        'WHERE user_id = ? GROUP BY approval_state'
-    )
     CHECK_IF_TABLE_EXISTS_QUERY = (
         "SELECT name FROM sqlite_master "
         "WHERE type='table' AND name= ?"
     )
     ADD_PREDICTION_QUERY = (
         f"INSERT INTO {PREDICTIONS_TABLE_NAME} "
-        "(prediction_text, user_id) "
-        "VALUES (?, ?)"
+        "(prediction_text, user_id, approval_state, duplicate_of, "
+        "moderation_priority, pool_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
     )
     GET_UNAPPROVED_PREDICTIONS_QUERY = (
-        f"SELECT prediction_id, prediction_text "
+        f"SELECT prediction_id, prediction_text, duplicate_of, pool_id "
         f"FROM {PREDICTIONS_TABLE_NAME} "
-        f"WHERE approval_state = '{ApprovalStates.NOT_APPROVED.value}'"
+        f"WHERE approval_state = '{ApprovalStates.NOT_APPROVED.value}' "
+        "ORDER BY moderation_priority DESC, prediction_id"
+    )
+    # both are range scans of the approval_state index, whose entries
+    # are ordered by prediction_id (the rowid) within a state
+    GET_NEW_UNAPPROVED_PREDICTIONS_QUERY = (
+        f"SELECT prediction_id, prediction_text, duplicate_of, pool_id "
+        f"FROM {PREDICTIONS_TABLE_NAME} "
+        f"WHERE approval_state = '{ApprovalStates.NOT_APPROVED.value}' "
+        "AND prediction_id > ? "
+        "ORDER BY moderation_priority DESC, prediction_id"
+    )
+    COUNT_OLD_UNAPPROVED_PREDICTIONS_QUERY = (
+        f"SELECT COUNT(*) FROM {PREDICTIONS_TABLE_NAME} "
+        f"WHERE approval_state = '{ApprovalStates.NOT_APPROVED.value}' "
+        "AND prediction_id <= ?"
     )
     ADD_USER_QUERY = f"""
         INSERT INTO {USERS_TABLE_NAME}
@@ -221,6 +293,467 @@ class DBTools:
     CHECK_USER_EXISTS_QUERY: str = (
         f"SELECT user_id FROM {USERS_TABLE_NAME} WHERE  user_id = ?"
     )
+    CREATE_PREDICTION_TEXT_INDEX_QUERY: str = (
+        'CREATE INDEX IF NOT EXISTS predictions_text_index '
+        f'ON {PREDICTIONS_TABLE_NAME} (prediction_text)'
+    )
+    IMPORT_USER_QUERY: str = (
+        f'INSERT OR IGNORE INTO {USERS_TABLE_NAME} '
+        '(user_id, user_name, state) VALUES (?, ?, ?)'
+    )
+    # inserts the prediction only if there is no prediction with the same
+    # text in its pool
+    IMPORT_PREDICTION_QUERY: str = (
+        f'INSERT INTO {PREDICTIONS_TABLE_NAME} '
+        '(prediction_text, approval_state, user_id, pool_id) '
+        'SELECT ?1, ?2, ?3, ?4 WHERE NOT EXISTS ('
+        f'SELECT 1 FROM {PREDICTIONS_TABLE_NAME} '
+        'WHERE prediction_text = ?1 AND pool_id = ?4)'
+    )
+    IMPORT_PREDICTION_WITH_ID_QUERY: str = (
+        f'INSERT OR IGNORE INTO {PREDICTIONS_TABLE_NAME} '
+        '(prediction_id, prediction_text, approval_state, user_id, pool_id) '
+        'SELECT ?1, ?2, ?3, ?4, ?5 WHERE NOT EXISTS ('
+        f'SELECT 1 FROM {PREDICTIONS_TABLE_NAME} '
+        'WHERE prediction_text = ?2 AND pool_id = ?5)'
+    )
+    # predictions of chats without a pool of their own
+    DEFAULT_POOL_ID = PredictionStorage.DEFAULT_POOL_ID
+    DEFAULT_POOL_NAME = PredictionStorage.DEFAULT_POOL_NAME
+    # Schema changes applied to existing databases by migrate(),
+    # columns are added only if missing, the rest is idempotent.
+    ADDED_PREDICTIONS_COLUMNS: Tuple[Tuple[str, str], ...] = (
+        ('state_changed_at', 'TEXT'),
+        # the prediction a near-duplicate suggestion repeats
+        ('duplicate_of', 'INTEGER'),
+        # set by the pre-moderation, higher is reviewed first
+        ('moderation_priority', 'INTEGER NOT NULL DEFAULT 0'),
+        # modification sequence number, see mod_seq triggers
+        ('mod_seq', 'INTEGER'),
+        # the pool the prediction is served in, see chat_pools
+        ('pool_id', f'INTEGER NOT NULL DEFAULT {DEFAULT_POOL_ID}'),
+    )
+    # Defaults ALTER TABLE ADD COLUMN can't set (it only takes constant
+    # ones), migrate() sets them in the table definition.
+    # (column, default)
+    PREDICTIONS_COLUMN_DEFAULTS: Tuple[Tuple[str, str], ...] = (
+        ('state_changed_at', 'CURRENT_TIMESTAMP'),
+    )
+    SCHEMA_QUERIES: Tuple[str, ...] = (
+        'CREATE INDEX IF NOT EXISTS predictions_approval_state_index '
+        f'ON {PREDICTIONS_TABLE_NAME} (approval_state)',
+        # replaced with the column default, which costs inserts nothing
+        'DROP TRIGGER IF EXISTS predictions_state_changed_at_insert',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS predictions_state_changed_at_update
+        AFTER UPDATE OF approval_state ON {PREDICTIONS_TABLE_NAME}
+        WHEN OLD.approval_state IS NOT NEW.approval_state
+        BEGIN
+            UPDATE {PREDICTIONS_TABLE_NAME}
+            SET state_changed_at = CURRENT_TIMESTAMP
+            WHERE prediction_id = NEW.prediction_id;
+        END
+        ''',
+    )
+    # every inserted prediction and every change of its text or state
+    # gets the next modification sequence number, so caches reload only
+    # the rows modified since their last reload, whoever modified them;
+    # the rows of a bulk import transaction share one, see
+    # MOD_SEQ_BACKFILL_QUERY
+    MOD_SEQ_UPDATE_QUERY: str = (
+        f'UPDATE {PREDICTIONS_TABLE_NAME} SET mod_seq = ('
+        f'SELECT COALESCE(MAX(mod_seq), 0) + 1 FROM {PREDICTIONS_TABLE_NAME}'
+        ') WHERE prediction_id = NEW.prediction_id;'
+    )
+    SCHEMA_QUERIES += (
+        'CREATE INDEX IF NOT EXISTS predictions_mod_seq_index '
+        f'ON {PREDICTIONS_TABLE_NAME} (mod_seq)',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS predictions_mod_seq_insert
+        AFTER INSERT ON {PREDICTIONS_TABLE_NAME}
+        BEGIN
+            {MOD_SEQ_UPDATE_QUERY}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS predictions_mod_seq_update
+        AFTER UPDATE OF prediction_text, approval_state
+        ON {PREDICTIONS_TABLE_NAME}
+        BEGIN
+            {MOD_SEQ_UPDATE_QUERY}
+        END
+        ''',
+    )
+    # numbers the rows inserted without the trigger (and the rows added
+    # before mod_seq existed) at once, readers see them in one commit
+    MOD_SEQ_BACKFILL_QUERY: str = (
+        f'UPDATE {PREDICTIONS_TABLE_NAME} SET mod_seq = ('
+        f'SELECT COALESCE(MAX(mod_seq), 0) + 1 FROM {PREDICTIONS_TABLE_NAME}'
+        ') WHERE mod_seq IS NULL'
+    )
+    GET_MAX_MOD_SEQ_QUERY: str = (
+        f'SELECT COALESCE(MAX(mod_seq), 0) FROM {PREDICTIONS_TABLE_NAME}'
+    )
+    GET_MODIFIED_PREDICTIONS_QUERY: str = (
+        'SELECT prediction_id, prediction_text, approval_state, mod_seq, '
+        f'pool_id FROM {PREDICTIONS_TABLE_NAME} '
+        'WHERE mod_seq > ? ORDER BY mod_seq'
+    )
+    # Prediction pools: every chat is served the approved predictions
+    # of its pool (e.g. a work chat gets a safe-for-work pool), chats
+    # without a row in chat_pools get the default pool. Inline queries
+    # carry no chat, they name the pool in the query text instead.
+    POOLS_TABLE_NAME = 'prediction_pools'
+    CHAT_POOLS_TABLE_NAME = 'chat_pools'
+    SCHEMA_QUERIES += (
+        f'''
+        CREATE TABLE IF NOT EXISTS {POOLS_TABLE_NAME} (
+            pool_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        f'INSERT OR IGNORE INTO {POOLS_TABLE_NAME} (pool_id, name) '
+        f"VALUES ({DEFAULT_POOL_ID}, '{DEFAULT_POOL_NAME}')",
+        f'''
+        CREATE TABLE IF NOT EXISTS {CHAT_POOLS_TABLE_NAME} (
+            chat_id INTEGER NOT NULL PRIMARY KEY,
+            pool_id INTEGER NOT NULL REFERENCES {POOLS_TABLE_NAME}(pool_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS predictions_pool_index '
+        f'ON {PREDICTIONS_TABLE_NAME} (pool_id, approval_state)',
+        # moving a prediction to another pool changes both pools' caches
+        f'''
+        CREATE TRIGGER IF NOT EXISTS predictions_mod_seq_pool_update
+        AFTER UPDATE OF pool_id ON {PREDICTIONS_TABLE_NAME}
+        WHEN OLD.pool_id IS NOT NEW.pool_id
+        BEGIN
+            {MOD_SEQ_UPDATE_QUERY}
+        END
+        ''',
+    )
+    GET_APPROVED_PREDICTIONS_QUERY: str = (
+        f'SELECT prediction_id, prediction_text FROM {PREDICTIONS_TABLE_NAME} '
+        f"WHERE approval_state = '{ApprovalStates.APPROVED.value}' "
+        'AND pool_id = ?'
+    )
+    COUNT_APPROVED_PREDICTIONS_QUERY: str = (
+        f'SELECT COUNT(*) FROM {PREDICTIONS_TABLE_NAME} '
+        f"WHERE approval_state = '{ApprovalStates.APPROVED.value}' "
+        'AND pool_id = ?'
+    )
+    GET_POOLS_QUERY: str = f'SELECT name, pool_id FROM {POOLS_TABLE_NAME}'
+    GET_POOL_ID_QUERY: str = (
+        f'SELECT pool_id FROM {POOLS_TABLE_NAME} WHERE name = ?'
+    )
+    GET_POOL_NAME_QUERY: str = (
+        f'SELECT name FROM {POOLS_TABLE_NAME} WHERE pool_id = ?'
+    )
+    ADD_POOL_QUERY: str = (
+        f'INSERT OR IGNORE INTO {POOLS_TABLE_NAME} (name) VALUES (?)'
+    )
+    GET_CHAT_POOL_QUERY: str = (
+        f'SELECT pool_id FROM {CHAT_POOLS_TABLE_NAME} WHERE chat_id = ?'
+    )
+    SET_CHAT_POOL_QUERY: str = (
+        f'INSERT OR REPLACE INTO {CHAT_POOLS_TABLE_NAME} (chat_id, pool_id) '
+        'VALUES (?, ?)'
+    )
+    # key/value state of the bot that must survive restarts
+    BOT_STATE_TABLE_NAME = 'bot_state'
+    SCHEMA_QUERIES += (
+        f'''
+        CREATE TABLE IF NOT EXISTS {BOT_STATE_TABLE_NAME} (
+            key TEXT NOT NULL PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+    )
+    GET_STATE_QUERY: str = (
+        f'SELECT value FROM {BOT_STATE_TABLE_NAME} WHERE key = ?'
+    )
+    SET_STATE_QUERY: str = (
+        f'INSERT OR REPLACE INTO {BOT_STATE_TABLE_NAME} (key, value) '
+        'VALUES (?, ?)'
+    )
+    # Deleted rows leave no trace in mod_seq, so deletions of approved
+    # predictions are counted in the state, and the caches of approved
+    # predictions recount their pools only when the counter has changed.
+    # Archival deletes no approved predictions and never bumps it.
+    APPROVED_DELETIONS_STATE_KEY = 'approved_deletions'
+    SCHEMA_QUERIES += (
+        f'''
+        CREATE TRIGGER IF NOT EXISTS predictions_approved_delete
+        AFTER DELETE ON {PREDICTIONS_TABLE_NAME}
+        WHEN OLD.approval_state = '{ApprovalStates.APPROVED.value}'
+        BEGIN
+            INSERT INTO {BOT_STATE_TABLE_NAME} (key, value)
+            VALUES ('{APPROVED_DELETIONS_STATE_KEY}', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1;
+        END
+        ''',
+    )
+    GET_APPROVED_DELETIONS_QUERY: str = (
+        'SELECT COALESCE(MAX(CAST(value AS INTEGER)), 0) '
+        f'FROM {BOT_STATE_TABLE_NAME} '
+        f"WHERE key = '{APPROVED_DELETIONS_STATE_KEY}'"
+    )
+    USER_STATS_TABLE_NAME = 'user_stats'
+    # approval state -> user_stats column
+    USER_STATS_COLUMNS: Dict[str, str] = {
+        state.value: state.value.replace(' ', '_') for state in ApprovalStates
+    }
+    # counts the predictions matching {condition} per user
+    USER_STATS_COUNT_QUERY: str = f'''
+            INSERT INTO {USER_STATS_TABLE_NAME}
+            (user_id, submitted, {', '.join(USER_STATS_COLUMNS.values())})
+            SELECT user_id, COUNT(*), {', '.join(
+                f"SUM(approval_state = '{state}')"
+                for state in USER_STATS_COLUMNS
+            )}
+            FROM {PREDICTIONS_TABLE_NAME}
+            WHERE user_id IS NOT NULL {{condition}}
+            GROUP BY user_id
+    '''
+    # Tables created by migrate() together with their initial content.
+    # (table name, create query, backfill query)
+    DERIVED_TABLES: Tuple[Tuple[str, str, str], ...] = (
+        (
+            USER_STATS_TABLE_NAME,
+            f'''
+            CREATE TABLE {USER_STATS_TABLE_NAME} (
+                user_id INTEGER NOT NULL PRIMARY KEY,
+                submitted INTEGER NOT NULL DEFAULT 0,
+                {', '.join(
+                    f'{column} INTEGER NOT NULL DEFAULT 0'
+                    for column in USER_STATS_COLUMNS.values()
+                )}
+            )
+            ''',
+            USER_STATS_COUNT_QUERY.format(condition=''),
+        ),
+    )
+    # user_stats is maintained incrementally, deletions (e.g. archival)
+    # are not subtracted, so it holds lifetime statistic
+    SCHEMA_QUERIES += (
+        f'''
+        CREATE TRIGGER IF NOT EXISTS user_stats_insert
+        AFTER INSERT ON {PREDICTIONS_TABLE_NAME}
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO {USER_STATS_TABLE_NAME} (user_id)
+            VALUES (NEW.user_id);
+            UPDATE {USER_STATS_TABLE_NAME} SET
+                submitted = submitted + 1,
+                {', '.join(
+                    f"{column} = {column} + (NEW.approval_state = '{state}')"
+                    for state, column in USER_STATS_COLUMNS.items()
+                )}
+            WHERE user_id = NEW.user_id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS user_stats_update
+        AFTER UPDATE OF approval_state ON {PREDICTIONS_TABLE_NAME}
+        WHEN NEW.user_id IS NOT NULL
+            AND OLD.approval_state IS NOT NEW.approval_state
+        BEGIN
+            UPDATE {USER_STATS_TABLE_NAME} SET
+                {', '.join(
+                    f"{column} = {column} + (NEW.approval_state = '{state}')"
+                    f" - (OLD.approval_state = '{state}')"
+                    for state, column in USER_STATS_COLUMNS.items()
+                )}
+            WHERE user_id = NEW.user_id;
+        END
+        ''',
+    )
+    LEADERBOARD_TABLE_NAME = 'approved_leaderboard'
+    LEADERBOARD_PERIODS = PredictionStorage.LEADERBOARD_PERIODS
+    # start of the {period} that contains {time}, NULL for NULL times
+    # except the all time period
+    LEADERBOARD_PERIOD_START: str = (
+        "CASE {period} "
+        "WHEN 'month' THEN strftime('%Y-%m', {time}) "
+        "WHEN 'week' THEN strftime('%Y-W%W', {time}) "
+        "ELSE '' END"
+    )
+    LEADERBOARD_PERIODS_VALUES: str = (
+        f"(VALUES {', '.join(f'({period!r})' for period in LEADERBOARD_PERIODS)})"
+    )
+    # counts the approved predictions matching {condition} per period
+    # and user, in the periods they were approved in; the predictions
+    # are the outer loop and the unary + keeps SQLite from reading every
+    # approved prediction through the approval_state index per period
+    # when the condition matches a few rows only
+    LEADERBOARD_COUNT_QUERY: str = f'''
+            INSERT INTO {LEADERBOARD_TABLE_NAME}
+            (period, period_start, user_id, approved)
+            SELECT column1, {LEADERBOARD_PERIOD_START.format(
+                period='column1', time='state_changed_at'
+            )} AS period_start, user_id, COUNT(*)
+            FROM {PREDICTIONS_TABLE_NAME}
+            CROSS JOIN {LEADERBOARD_PERIODS_VALUES}
+            WHERE +approval_state = '{ApprovalStates.APPROVED.value}'
+                AND user_id IS NOT NULL {{condition}}
+            GROUP BY 1, 2, 3
+            HAVING period_start IS NOT NULL
+    '''
+    DERIVED_TABLES += (
+        (
+            LEADERBOARD_TABLE_NAME,
+            f'''
+            CREATE TABLE {LEADERBOARD_TABLE_NAME} (
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                approved INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, period_start, user_id)
+            )
+            ''',
+            LEADERBOARD_COUNT_QUERY.format(condition=''),
+        ),
+    )
+    # approvals are counted in the periods they happened in,
+    # revoked approvals are subtracted from the periods of the approval
+    LEADERBOARD_INCREMENT_QUERY: str = f'''
+            INSERT INTO {LEADERBOARD_TABLE_NAME}
+            (period, period_start, user_id, approved)
+            SELECT column1, {LEADERBOARD_PERIOD_START.format(
+                period='column1', time="'now'"
+            )}, NEW.user_id, 1
+            FROM {LEADERBOARD_PERIODS_VALUES} WHERE true
+            ON CONFLICT (period, period_start, user_id)
+            DO UPDATE SET approved = approved + 1;
+    '''
+    SCHEMA_QUERIES += (
+        'CREATE INDEX IF NOT EXISTS approved_leaderboard_rank_index '
+        f'ON {LEADERBOARD_TABLE_NAME} (period, period_start, approved)',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS approved_leaderboard_insert
+        AFTER INSERT ON {PREDICTIONS_TABLE_NAME}
+        WHEN NEW.user_id IS NOT NULL
+            AND NEW.approval_state = '{ApprovalStates.APPROVED.value}'
+        BEGIN
+            {LEADERBOARD_INCREMENT_QUERY}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS approved_leaderboard_approve
+        AFTER UPDATE OF approval_state ON {PREDICTIONS_TABLE_NAME}
+        WHEN NEW.user_id IS NOT NULL
+            AND NEW.approval_state = '{ApprovalStates.APPROVED.value}'
+            AND OLD.approval_state IS NOT NEW.approval_state
+        BEGIN
+            {LEADERBOARD_INCREMENT_QUERY}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS approved_leaderboard_revoke
+        AFTER UPDATE OF approval_state ON {PREDICTIONS_TABLE_NAME}
+        WHEN NEW.user_id IS NOT NULL
+            AND OLD.approval_state = '{ApprovalStates.APPROVED.value}'
+            AND NEW.approval_state IS NOT OLD.approval_state
+        BEGIN
+            UPDATE {LEADERBOARD_TABLE_NAME} SET approved = approved - 1
+            WHERE user_id = NEW.user_id
+                AND period_start = {LEADERBOARD_PERIOD_START.format(
+                    period='period', time='OLD.state_changed_at'
+                )};
+        END
+        ''',
+    )
+    # Bulk imports insert without the per-row insert triggers and then
+    # do what the triggers would have done for all the inserted rows
+    # (those without mod_seq yet) at once, in the same transaction.
+    BULK_SKIPPED_TRIGGERS: Tuple[str, ...] = (
+        'predictions_mod_seq_insert', 'user_stats_insert',
+        'approved_leaderboard_insert',
+    )
+    # run in this order, mod_seq tells the inserted rows until the last
+    BULK_MAINTENANCE_QUERIES: Tuple[str, ...] = (
+        USER_STATS_COUNT_QUERY.format(condition='AND mod_seq IS NULL') + f'''
+            ON CONFLICT (user_id) DO UPDATE SET
+                submitted = submitted + excluded.submitted,
+                {', '.join(
+                    f'{column} = {column} + excluded.{column}'
+                    for column in USER_STATS_COLUMNS.values()
+                )}
+        ''',
+        LEADERBOARD_COUNT_QUERY.format(condition='AND mod_seq IS NULL') + '''
+            ON CONFLICT (period, period_start, user_id)
+            DO UPDATE SET approved = approved + excluded.approved
+        ''',
+        MOD_SEQ_BACKFILL_QUERY,
+    )
+    # Predictions moderated before state_changed_at was tracked count as
+    # moderated at the migration, so the archive keeps them for the
+    # retention period from then on. Approved ones are left out: the
+    # leaderboard counts them in the all time period only and revoking
+    # them must not subtract from the period of the migration.
+    STATE_CHANGED_AT_BACKFILL_QUERY: str = (
+        f'UPDATE {PREDICTIONS_TABLE_NAME} '
+        'SET state_changed_at = CURRENT_TIMESTAMP '
+        'WHERE state_changed_at IS NULL '
+        f"AND approval_state != '{ApprovalStates.APPROVED.value}'"
+    )
+    # run by migrate() after the schema queries, idempotent
+    BACKFILL_QUERIES: Tuple[str, ...] = (
+        MOD_SEQ_BACKFILL_QUERY,
+        STATE_CHANGED_AT_BACKFILL_QUERY,
+    )
+    GET_LEADERBOARD_QUERY: str = (
+        f'SELECT leaderboard.user_id, {USERS_TABLE_NAME}.user_name, '
+        'leaderboard.approved '
+        f'FROM {LEADERBOARD_TABLE_NAME} AS leaderboard '
+        f'LEFT JOIN {USERS_TABLE_NAME} USING (user_id) '
+        'WHERE leaderboard.period = :period '
+        'AND leaderboard.period_start = '
+        + LEADERBOARD_PERIOD_START.format(period=':period', time="'now'")
+        + ' AND leaderboard.approved > 0 '
+        'ORDER BY leaderboard.approved DESC LIMIT :limit'
+    )
+    GET_USER_STATS_QUERY: str = (
+        f'SELECT {", ".join(USER_STATS_COLUMNS.values())} '
+        f'FROM {USER_STATS_TABLE_NAME} WHERE user_id = ?'
+    )
+    ARCHIVE_TABLE_NAME = f'archive.{PREDICTIONS_TABLE_NAME}'
+    ARCHIVED_STATES = (
+        ApprovalStates.REJECTED.value, ApprovalStates.INAPPROPRIATE.value
+    )
+    CREATE_ARCHIVE_TABLE_QUERY: str = f'''
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE_NAME} (
+            prediction_id INTEGER PRIMARY KEY,
+            prediction_text TEXT,
+            approval_state TEXT NOT NULL,
+            user_id INTEGER,
+            state_changed_at TEXT,
+            archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    # every prediction in an archived state has state_changed_at,
+    # see STATE_CHANGED_AT_BACKFILL_QUERY
+    GET_ARCHIVABLE_PREDICTIONS_QUERY: str = (
+        f'SELECT prediction_id FROM {PREDICTIONS_TABLE_NAME} '
+        f'WHERE approval_state IN ({", ".join("?" * len(ARCHIVED_STATES))}) '
+        "AND state_changed_at < datetime('now', ?) "
+        'LIMIT ?'
+    )
+    COPY_TO_ARCHIVE_QUERY: str = (
+        f'INSERT OR REPLACE INTO {ARCHIVE_TABLE_NAME} '
+        '(prediction_id, prediction_text, approval_state, user_id, '
+        'state_changed_at) '
+        'SELECT prediction_id, prediction_text, approval_state, user_id, '
+        f'state_changed_at FROM {PREDICTIONS_TABLE_NAME} '
+        'WHERE prediction_id IN ({placeholders})'
+    )
+    DELETE_PREDICTIONS_QUERY: str = (
+        f'DELETE FROM {PREDICTIONS_TABLE_NAME} '
+        'WHERE prediction_id IN ({placeholders})'
+    )
+    BULK_CHUNK_SIZE = 50_000
+    # page cache of bulk imports, keeps the text index hot (in KiB)
+    BULK_CACHE_SIZE_KB = 128 * 1024
 
     def __init__(
         self, db_name: str = constants.DB_NAME,
@@ -228,29 +761,165 @@ class DBTools:
     ):
         self.logging_level = logging_level
         setup_logger(__name__, level=logging_level)
+        self.logger = logging.getLogger(__name__)
         self.db_name: str = db_name
-        self._connection: Connection = sqlite3.connect(db_name)
-        if (
-            not self.check_if_table_exists(self.USERS_TABLE_NAME)
-            and not self.check_if_table_exists(self.PREDICTIONS_TABLE_NAME)
-        ):
-            self.initialize_tables()
+        with closing(self.get_connection()) as connection:
+            self._prepare_schema(connection)
 
     def get_connection(self) -> sqlite3.Connection:
         return sqlite3.connect(self.db_name)
 
-    def initialize_tables(self) -> None:
+    @classmethod
+    def schema_version(cls) -> int:
+        """
+        Returns the fingerprint of the schema DBTools creates, a database
+        with it in PRAGMA user_version needs no migration.
+
+        :return: A positive 31-bit integer.
+        """
+        return zlib.crc32(repr((
+            cls.CREATE_USERS_TABLE_QUERY, cls.CREATE_PREDICTIONS_TABLE_QUERY,
+            cls.ADDED_PREDICTIONS_COLUMNS, cls.PREDICTIONS_COLUMN_DEFAULTS,
+            cls.DERIVED_TABLES, cls.SCHEMA_QUERIES, cls.BACKFILL_QUERIES,
+        )).encode()) & 0x7FFFFFFF or 1
+
+    def _prepare_schema(self, connection: Connection) -> None:
+        # a single query on every start of an up to date database,
+        # the schema is only inspected when the fingerprint differs
+        if connection.execute(
+            'PRAGMA user_version'
+        ).fetchone()[0] == self.schema_version():
+            return
+        # only has effect on a new database, before any table is created
+        connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # readers and writers don't block each other in WAL mode,
+        # online backups rely on it
+        connection.execute('PRAGMA journal_mode = WAL')
+        tables = {
+            row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        if (
+            self.USERS_TABLE_NAME not in tables
+            and self.PREDICTIONS_TABLE_NAME not in tables
+        ):
+            self.initialize_tables(connection)
+        self.migrate(connection)
+        connection.execute(f'PRAGMA user_version = {self.schema_version()}')
+
+    def initialize_tables(
+        self, connection: Optional[Connection] = None
+    ) -> None:
         """
         Method to initialize tables by executing SQL queries.
 
+        :param connection: The connection to use, a new one if None.
         :return: None
         """
-        with self.get_connection() as connection:
-            with closing(connection.cursor()) as cursor:
-                cursor.execute(self.CREATE_USERS_TABLE_QUERY)
-                cursor.execute(self.CREATE_PREDICTIONS_TABLE_QUERY)
-                with open('default_predictions.sql', 'r', encoding='utf8') as predictions_file:
-                    cursor.executescript(predictions_file.read())
+        if connection is None:
+            with closing(self.get_connection()) as connection:
+                self.initialize_tables(connection)
+            return
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(self.CREATE_USERS_TABLE_QUERY)
+            cursor.execute(self.CREATE_PREDICTIONS_TABLE_QUERY)
+            with open('default_predictions.sql', 'r', encoding='utf8') as predictions_file:
+                cursor.executescript(predictions_file.read())
+
+    def migrate(self, connection: Optional[Connection] = None) -> None:
+        """
+        Brings the schema of an existing database up to date: adds
+        missing columns and column defaults, derived tables, indexes
+        and triggers, and backfills the added columns.
+
+        :param connection: The connection to use, a new one if None.
+        :return: None
+        """
+        if connection is None:
+            with closing(self.get_connection()) as connection:
+                self.migrate(connection)
+            return
+        columns = {
+            row[1] for row in connection.execute(
+                f'PRAGMA table_info({self.PREDICTIONS_TABLE_NAME})'
+            )
+        }
+        tables = {
+            row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        with connection:
+            for column, column_type in self.ADDED_PREDICTIONS_COLUMNS:
+                if column not in columns:
+                    connection.execute(
+                        f'ALTER TABLE {self.PREDICTIONS_TABLE_NAME} '
+                        f'ADD COLUMN {column} {column_type}'
+                    )
+        self._set_column_defaults(connection)
+        with connection:
+            # derived tables are filled in the same transaction
+            # the triggers maintaining them are created in
+            for table_name, create_query, backfill_query in (
+                self.DERIVED_TABLES
+            ):
+                if table_name not in tables:
+                    self.logger.info('Creating table %s', table_name)
+                    connection.execute(create_query)
+                    connection.execute(backfill_query)
+            for query in self.SCHEMA_QUERIES:
+                connection.execute(query)
+            for query in self.BACKFILL_QUERIES:
+                connection.execute(query)
+
+    def _set_column_defaults(self, connection: Connection) -> None:
+        defaults = {
+            row[1]: row[4] for row in connection.execute(
+                f'PRAGMA table_info({self.PREDICTIONS_TABLE_NAME})'
+            )
+        }
+        missing = [
+            (column, default)
+            for column, default in self.PREDICTIONS_COLUMN_DEFAULTS
+            if defaults[column] != default
+        ]
+        if not missing:
+            return
+        table_sql = connection.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (self.PREDICTIONS_TABLE_NAME, )
+        ).fetchone()[0]
+        column_types = dict(self.ADDED_PREDICTIONS_COLUMNS)
+        for column, default in missing:
+            definition = f'{column} {column_types[column]}'
+            if table_sql.count(definition) != 1:
+                raise sqlite3.DatabaseError(
+                    f'Unexpected definition of {column} in {table_sql}'
+                )
+            table_sql = table_sql.replace(
+                definition, f'{definition} DEFAULT {default}'
+            )
+        self.logger.info(
+            'Setting defaults of %s', ', '.join(column for column, _ in missing)
+        )
+        # A default doesn't change how rows are stored, so the table
+        # definition is edited in place instead of copying the table,
+        # as described in "Making Other Kinds Of Table Schema Changes"
+        # of https://www.sqlite.org/lang_altertable.html
+        with connection:
+            connection.execute('BEGIN')
+            schema_version = connection.execute(
+                'PRAGMA schema_version'
+            ).fetchone()[0]
+            connection.execute('PRAGMA writable_schema = ON')
+            connection.execute(
+                'UPDATE sqlite_master SET sql = ? '
+                "WHERE type = 'table' AND name = ?",
+                (table_sql, self.PREDICTIONS_TABLE_NAME)
+            )
+            connection.execute(f'PRAGMA schema_version = {schema_version + 1}')
+            connection.execute('PRAGMA writable_schema = OFF')
 
     def check_if_table_exists(self, table_name: str) -> bool:
         """
@@ -321,16 +990,33 @@ class DBTools:
 
         return result
 
-    def get_random_approved_prediction(self) -> Union[str, None]:
+    def get_random_approved_prediction(
+        self, pool_id: int = DEFAULT_POOL_ID
+    ) -> Union[str, None]:
         """
         Returns a random approved prediction.
 
+        :param pool_id: The ID of the pool to choose from.
         :return: A randomly selected approved prediction as a string,
             or None if there are no approved predictions.
         """
-        return self.fetch_one(
+        prediction = self.get_random_approved_item(pool_id)
+        return prediction[1] if prediction else None
+
+    def get_random_approved_item(
+        self, pool_id: int = DEFAULT_POOL_ID
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Returns a random approved prediction with its ID.
+
+        :param pool_id: The ID of the pool to choose from.
+        :return: (prediction id, prediction text), or None if there are
+            no approved predictions.
+        """
+        prediction = self.fetch_one(
             self.GET_APPROVED_PREDICTION_QUERY,
-            (ApprovalStates.APPROVED.value, ))[1]
+            (ApprovalStates.APPROVED.value, pool_id))
+        return (prediction[0], prediction[1]) if prediction else None
 
     def get_prediction_by_id(
         self, prediction_id: int
@@ -373,11 +1059,39 @@ class DBTools:
         """
         Retrieve user statistics for a given user.
 
+        The statistic is a primary key lookup in the user_stats table
+        that triggers keep up to date, it includes archived predictions.
+
         :param user_id: The ID of the user for which to retrieve statistics.
-        :return: A list of tuples containing the user statistics.
+        :return: A list of (approval state, number of predictions)
+            tuples for states the user has predictions in.
+        """
+        counts = self.fetch_one(self.GET_USER_STATS_QUERY, (user_id, ))
+        if counts is None:
+            return []
+        return [
+            (state, count)
+            for state, count in zip(self.USER_STATS_COLUMNS, counts)
+            if count
+        ]
+
+    def get_leaderboard(
+        self, period: str, limit: int = constants.LEADERBOARD_SIZE
+    ) -> List[Tuple]:
+        """
+        Returns the users with the most approved predictions in the
+        current period.
+
+        :param period: One of LEADERBOARD_PERIODS: all, month or week.
+        :param limit: The number of users to return.
+        :return: A list of (user_id, user_name, approved) tuples,
+            the best first.
         """
+        if period not in self.LEADERBOARD_PERIODS:
+            raise ValueError(f'Unknown leaderboard period: {period}')
         return self.fetch_all(
-            self.GET_USER_STATISTIC_QUERY, (user_id, ))
+            self.GET_LEADERBOARD_QUERY, {'period': period, 'limit': limit}
+        )
 
     def user_exists(self, user_id: int) -> bool:
         """
@@ -402,12 +1116,25 @@ class DBTools:
         Args:
             user_id (int): The ID of the user.
             user_name (str): Telegram username of the user.
-        """
-        self.execute_query(
-            self.ADD_USER_QUERY, (user_id, user_name)
-        )
 
-    def add_prediction(self, prediction_text: str, user_id: int) -> None:
+        Raises:
+            DuplicateUserError: If the user exists.
+        """
+        try:
+            self.execute_query(
+                self.ADD_USER_QUERY, (user_id, user_name)
+            )
+        except sqlite3.IntegrityError as error:
+            raise DuplicateUserError(
+                f'User {user_id} already exists'
+            ) from error
+
+    def add_prediction(
+        self, prediction_text: str, user_id: int,
+        approval_state: str = ApprovalStates.NOT_APPROVED.value,
+        duplicate_of: Optional[int] = None, moderation_priority: int = 0,
+        pool_id: int = DEFAULT_POOL_ID
+    ) -> int:
         """
         Adds a prediction to the database.
 
@@ -415,12 +1142,24 @@ class DBTools:
         :type prediction_text: str
         :param user_id: The ID of the user who owns the prediction.
         :type user_id: int
-        :return: None
+        :param approval_state: The initial approval state.
+        :param duplicate_of: The ID of the prediction this one is
+            a near-duplicate of.
+        :param moderation_priority: The priority in the moderation
+            queue, higher is reviewed first.
+        :param pool_id: The ID of the pool the prediction is for.
+        :return: The ID of the added prediction.
         """
-
-        self.execute_query(
-            self.ADD_PREDICTION_QUERY, (prediction_text, user_id)
-        )
+        with self.get_connection() as connection:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(
+                    self.ADD_PREDICTION_QUERY,
+                    (
+                        prediction_text, user_id, approval_state,
+                        duplicate_of, moderation_priority, pool_id
+                    )
+                )
+                return cursor.lastrowid
 
     def get_unapproved_predictions(self) -> List[Tuple]:
         """
@@ -430,18 +1169,439 @@ class DBTools:
         """
         return self.fetch_all(self.GET_UNAPPROVED_PREDICTIONS_QUERY)
 
+    def get_unapproved_predictions_since(
+        self, prediction_id: int
+    ) -> Tuple[List[Tuple], int]:
+        """
+        Returns the unapproved predictions added after the given one
+        and the number of the older unapproved predictions.
+
+        :param prediction_id: The last already seen prediction ID.
+        :return: A list of (prediction_id, prediction_text,
+            duplicate_of, pool_id) tuples by moderation priority and
+            the number of older unapproved predictions.
+        """
+        with closing(self.get_connection()) as connection:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(
+                    self.GET_NEW_UNAPPROVED_PREDICTIONS_QUERY,
+                    (prediction_id, )
+                )
+                predictions = cursor.fetchall()
+                cursor.execute(
+                    self.COUNT_OLD_UNAPPROVED_PREDICTIONS_QUERY,
+                    (prediction_id, )
+                )
+                return predictions, cursor.fetchone()[0]
+
+    def get_state(
+        self, key: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Returns a value of the persistent bot state.
+
+        :param key: The key of the value.
+        :param default: Returned if the key is not set.
+        :return: The value.
+        """
+        row = self.fetch_one(self.GET_STATE_QUERY, (key, ))
+        return default if row is None else row[0]
+
+    def set_state(self, key: str, value: Optional[str]) -> None:
+        """
+        Sets a value of the persistent bot state.
+
+        :param key: The key of the value.
+        :param value: The value.
+        :return: None
+        """
+        self.execute_query(self.SET_STATE_QUERY, (key, value))
+
+    def get_pools(self) -> Dict[str, int]:
+        """
+        Returns all prediction pools.
+
+        :return: A {pool name: pool ID} dict.
+        """
+        return dict(self.fetch_all(self.GET_POOLS_QUERY))
+
+    def get_pool_name(self, pool_id: int) -> Optional[str]:
+        """
+        Returns the name of a prediction pool.
+
+        :param pool_id: The ID of the pool.
+        :return: The name, or None if there is no such pool.
+        """
+        row = self.fetch_one(self.GET_POOL_NAME_QUERY, (pool_id, ))
+        return row[0] if row else None
+
+    def add_pool(self, name: str) -> int:
+        """
+        Adds a prediction pool unless there is one with the name.
+
+        :param name: The name of the pool.
+        :return: The ID of the pool.
+        """
+        with self.get_connection() as connection:
+            connection.execute(self.ADD_POOL_QUERY, (name, ))
+            return connection.execute(
+                self.GET_POOL_ID_QUERY, (name, )
+            ).fetchone()[0]
 
-class DBToolsAsync(DBTools):
+    def get_chat_pool(self, chat_id: int) -> int:
+        """
+        Returns the prediction pool of a chat.
+
+        :param chat_id: The ID of the chat.
+        :return: The ID of the pool, the default pool for chats
+            without one.
+        """
+        row = self.fetch_one(self.GET_CHAT_POOL_QUERY, (chat_id, ))
+        return self.DEFAULT_POOL_ID if row is None else row[0]
+
+    def set_chat_pool(self, chat_id: int, pool_id: int) -> None:
+        """
+        Sets the prediction pool of a chat.
+
+        :param chat_id: The ID of the chat.
+        :param pool_id: The ID of the pool.
+        :return: None
+        """
+        self.execute_query(self.SET_CHAT_POOL_QUERY, (chat_id, pool_id))
+
+    def iter_table(
+        self, table_name: str, chunk_size: int = BULK_CHUNK_SIZE
+    ) -> Iterator[Dict]:
+        """
+        Streams all rows of a table as dicts, holding at most one chunk
+        of rows in memory.
+
+        :param table_name: The name of the table, users or predictions.
+        :param chunk_size: The number of rows fetched at once.
+        :return: An iterator of {column: value} dicts.
+        """
+        if table_name not in (
+            self.USERS_TABLE_NAME, self.PREDICTIONS_TABLE_NAME
+        ):
+            raise ValueError(f'Unknown table: {table_name}')
+        with closing(self.get_connection()) as connection:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(f'SELECT * FROM {table_name}')
+                columns = [column[0] for column in cursor.description]
+                while rows := cursor.fetchmany(chunk_size):
+                    for row in rows:
+                        yield dict(zip(columns, row))
+
+    def import_users(
+        self, users: Iterable[Dict], chunk_size: int = BULK_CHUNK_SIZE
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Imports users in chunked transactions, skipping users
+        that already exist.
+
+        :param users: Dicts with user_id, user_name and optionally state.
+        :param chunk_size: The number of rows inserted per transaction.
+        :return: An iterator of (processed, inserted) running totals,
+            yielded after every committed chunk.
+        """
+        rows = (
+            (
+                int(user['user_id']), user['user_name'],
+                user.get('state') or UserStates.ACTIVE.value
+            )
+            for user in users
+        )
+        return self._import_chunks(self.IMPORT_USER_QUERY, rows, chunk_size)
+
+    def import_predictions(
+        self, predictions: Iterable[Dict], keep_ids: bool = False,
+        chunk_size: int = BULK_CHUNK_SIZE
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Imports predictions in chunked transactions, skipping
+        predictions whose text is already in their pool (or earlier
+        in the same import). The per-user statistic, the leaderboard and
+        mod_seq of the rows of a chunk are updated by set-based queries
+        after the chunk is inserted, not by the per-row triggers.
+
+        :param predictions: Dicts with prediction_text and optionally
+            approval_state, user_id, pool_id (the default pool if
+            missing, pools are matched by id) and prediction_id.
+        :param keep_ids: Keep prediction_id from the input, rows whose id
+            is already taken are skipped.
+        :param chunk_size: The number of rows inserted per transaction.
+        :return: An iterator of (processed, inserted) running totals,
+            yielded after every committed chunk.
+        """
+        # deduplication looks the text up for every row
+        self.execute_query(self.CREATE_PREDICTION_TEXT_INDEX_QUERY)
+
+        def rows():
+            for prediction in predictions:
+                text = prediction['prediction_text']
+                state = (
+                    prediction.get('approval_state')
+                    or ApprovalStates.NOT_APPROVED.value
+                )
+                user_id = prediction.get('user_id')
+                user_id = int(user_id) if user_id not in (None, '') else None
+                pool_id = prediction.get('pool_id')
+                pool_id = (
+                    int(pool_id) if pool_id not in (None, '')
+                    else self.DEFAULT_POOL_ID
+                )
+                if keep_ids:
+                    yield (
+                        int(prediction['prediction_id']), text, state,
+                        user_id, pool_id
+                    )
+                else:
+                    yield text, state, user_id, pool_id
+
+        return self._import_chunks(
+            self.IMPORT_PREDICTION_WITH_ID_QUERY
+            if keep_ids else self.IMPORT_PREDICTION_QUERY,
+            rows(), chunk_size, self.BULK_SKIPPED_TRIGGERS,
+            self.BULK_MAINTENANCE_QUERIES
+        )
+
+    def backup(
+        self, backup_dir: str = constants.BACKUP_DIR,
+        retention: int = constants.BACKUP_RETENTION,
+        pages_per_step: int = constants.BACKUP_PAGES_PER_STEP,
+        step_sleep: float = constants.BACKUP_STEP_SLEEP
+    ) -> Dict:
+        """
+        Writes a timestamped snapshot of the database with SQLite's online
+        backup API, copying `pages_per_step` pages at a time and sleeping
+        between steps so other connections can read and write, then
+        removes the oldest snapshots above `retention`.
+
+        :param backup_dir: The directory snapshots are written to.
+        :param retention: The number of snapshots to keep.
+        :param pages_per_step: Pages copied per backup step.
+        :param step_sleep: Seconds to sleep between steps.
+        :return: A dict with the snapshot path, copied pages, number of
+            steps, duration in seconds and removed snapshots.
+        """
+        Path(backup_dir).mkdir(parents=True, exist_ok=True)
+        stem = Path(self.db_name).stem
+        snapshot_path = os.path.join(
+            backup_dir, f'{stem}_{datetime.now():%Y%m%d_%H%M%S}.db'
+        )
+        progress = {'pages': 0, 'steps': 0}
+
+        # noinspection PyUnusedLocal
+        def on_progress(status: int, remaining: int, total: int) -> None:
+            progress['pages'] = total - remaining
+            progress['steps'] += 1
+            # locks are released between steps, let the bot use them
+            time.sleep(step_sleep)
+
+        started = time.perf_counter()
+        tmp_path = snapshot_path + '.tmp'
+        source = sqlite3.connect(self.db_name, isolation_level=None)
+        with closing(source):
+            # Without an open read transaction the backup restarts every
+            # time another connection writes, with it every step reads
+            # the same WAL snapshot and writers are not blocked.
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            with closing(sqlite3.connect(tmp_path)) as target:
+                source.backup(
+                    target, pages=pages_per_step, progress=on_progress
+                )
+            source.execute('COMMIT')
+        os.replace(tmp_path, snapshot_path)
+
+        snapshots = sorted(Path(backup_dir).glob(f'{stem}_*.db'))
+        removed = snapshots[:-retention] if retention > 0 else []
+        for old_snapshot in removed:
+            old_snapshot.unlink()
+
+        return {
+            'path': snapshot_path,
+            'pages': progress['pages'],
+            'steps': progress['steps'],
+            'duration': time.perf_counter() - started,
+            'removed': [str(old_snapshot) for old_snapshot in removed],
+        }
+
+    def archive_predictions(
+        self, retention_days: float = constants.ARCHIVE_RETENTION_DAYS,
+        archive_db_name: Optional[str] = None,
+        batch_size: int = constants.ARCHIVE_BATCH_SIZE,
+        batch_pause: float = constants.ARCHIVE_BATCH_PAUSE,
+        vacuum_pages_per_step: int = constants.VACUUM_PAGES_PER_STEP
+    ) -> Dict:
+        """
+        Moves rejected and inappropriate predictions that have been
+        in their state for longer than `retention_days` to the archive
+        database in small transactions, then returns the freed pages
+        to the file system with incremental vacuum.
+
+        :param retention_days: Terminal-state predictions younger than
+            this stay in the predictions table.
+        :param archive_db_name: The archive database file, defaults to
+            <db name>_archive.db next to the database.
+        :param batch_size: Predictions moved per transaction.
+        :param batch_pause: Seconds to pause between transactions,
+            so the bot can write.
+        :param vacuum_pages_per_step: Pages freed per vacuum step.
+        :return: A dict with the number of archived predictions,
+            freed pages and duration in seconds.
+        """
+        if archive_db_name is None:
+            db_path = Path(self.db_name)
+            archive_db_name = str(db_path.with_name(
+                f'{db_path.stem}{constants.ARCHIVE_DB_SUFFIX}{db_path.suffix}'
+            ))
+        started = time.perf_counter()
+        archived = 0
+        with closing(self.get_connection()) as connection:
+            connection.execute(
+                'ATTACH DATABASE ? AS archive', (archive_db_name, )
+            )
+            with connection:
+                connection.execute(self.CREATE_ARCHIVE_TABLE_QUERY)
+            while True:
+                with connection:
+                    prediction_ids = [
+                        row[0] for row in connection.execute(
+                            self.GET_ARCHIVABLE_PREDICTIONS_QUERY,
+                            (
+                                *self.ARCHIVED_STATES,
+                                f'-{retention_days} days', batch_size
+                            )
+                        )
+                    ]
+                    if not prediction_ids:
+                        break
+                    placeholders = ', '.join('?' * len(prediction_ids))
+                    connection.execute(
+                        self.COPY_TO_ARCHIVE_QUERY.format(
+                            placeholders=placeholders
+                        ),
+                        prediction_ids
+                    )
+                    connection.execute(
+                        self.DELETE_PREDICTIONS_QUERY.format(
+                            placeholders=placeholders
+                        ),
+                        prediction_ids
+                    )
+                archived += len(prediction_ids)
+                time.sleep(batch_pause)
+            connection.execute('DETACH DATABASE archive')
+            freed_pages = self._incremental_vacuum(
+                connection, vacuum_pages_per_step, batch_pause
+            )
+
+        return {
+            'archived': archived,
+            'freed_pages': freed_pages,
+            'duration': time.perf_counter() - started,
+        }
+
+    def _incremental_vacuum(
+        self, connection: Connection, pages_per_step: int, pause: float
+    ) -> int:
+        if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            self.logger.warning(
+                'Incremental vacuum is not enabled for %s, free pages stay '
+                'in the file. Run "python db_tools.py vacuum" once '
+                'while the bot is stopped', self.db_name
+            )
+            return 0
+        freed_pages = 0
+        while free_pages := connection.execute(
+            'PRAGMA freelist_count'
+        ).fetchone()[0]:
+            step = min(free_pages, pages_per_step)
+            # execute() steps the pragma only once, freeing a single page
+            connection.executescript(f'PRAGMA incremental_vacuum({step});')
+            freed_pages += step
+            time.sleep(pause)
+        return freed_pages
+
+    def enable_incremental_vacuum(self) -> None:
+        """
+        Switches an existing database to incremental auto-vacuum.
+        Rewrites the whole file, run it while the bot is stopped.
+
+        :return: None
+        """
+        connection = sqlite3.connect(self.db_name, isolation_level=None)
+        with closing(connection):
+            connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            connection.execute('VACUUM')
+
+    def _import_chunks(
+        self, query: str, rows: Iterator[Tuple], chunk_size: int,
+        skipped_triggers: Tuple[str, ...] = (),
+        maintenance_queries: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[int, int]]:
+        processed = inserted = 0
+        with closing(self.get_connection()) as connection:
+            connection.execute(f'PRAGMA cache_size = -{self.BULK_CACHE_SIZE_KB}')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            while chunk := [row for _, row in zip(range(chunk_size), rows)]:
+                with connection:
+                    # the triggers are dropped and created again in the
+                    # transaction, so other connections never miss them
+                    connection.execute('BEGIN IMMEDIATE')
+                    triggers = connection.execute(
+                        "SELECT name, sql FROM sqlite_master "
+                        "WHERE type = 'trigger' AND name IN "
+                        f"({', '.join('?' * len(skipped_triggers))})",
+                        skipped_triggers
+                    ).fetchall()
+                    for name, _ in triggers:
+                        connection.execute(f'DROP TRIGGER {name}')
+                    cursor = connection.executemany(query, chunk)
+                    for maintenance_query in maintenance_queries:
+                        connection.execute(maintenance_query)
+                    for _, trigger_sql in triggers:
+                        connection.execute(trigger_sql)
+                processed += len(chunk)
+                # rows of the statement itself, total_changes would count
+                # the rows written by the triggers of every row too
+                inserted += cursor.rowcount
+                yield processed, inserted
+
+
+class DBToolsAsync(DBTools, PredictionStorageAsync):
     """
     DBToolsAsync class inherits from DBTools and provides asynchronous methods
     for interacting with a SQLite database. It is important for
     applications that need to perform database operations
     without blocking the event loop.
 
+    The *_async counterparts of the PredictionStorage methods come from
+    PredictionStorageAsync, the SQLite specific ones are below.
+
+    Every *_async call passes the admission control first, so at most
+    max_in_flight of them run on the executor at once: writes are
+    admitted before reads and inline reads are shed with Overloaded
+    instead of queued, see admission.py. The approved predictions cache
+    reads on the executor directly and is not admitted.
+
+    Backups and archivals run for minutes, they are not admitted either
+    and run one at a time on maintenance_executor, so they never hold
+    an admission slot or an executor thread of the bot's operations.
+
     Attributes:
-        loop: asyncio event loop.
         executor: Concurrency primitive, which provides a method of
         running code in a separate Python thread.
+        maintenance_executor (ThreadPoolExecutor): The single thread
+            of the backups and archivals.
+        admission (AdmissionController | None): The admission control
+            of the *_async calls, None if max_in_flight is None.
+        maintenance_pending (Counter): Maintenance runs started and not
+            finished yet (running or waiting for the thread) per method.
+        maintenance_runs (Counter): Finished maintenance runs per method.
+        OPERATION_PRIORITIES (dict): The priorities of the sync methods
+            run by the *_async ones, Priority.READ if missing.
 
     Asynchronous methods:
         check_if_table_exists_async: Asynchronously checks if a table
@@ -456,100 +1616,250 @@ class DBToolsAsync(DBTools):
         fetch_all_async: Asynchronously executes a query on the database
                         and fetches all rows.
 
-        get_random_approved_prediction_async: Asynchronously gets
-                                        a random approved prediction.
-
-        get_prediction_by_id_async: Asynchronously gets a prediction
-                                    by ID.
-
-        update_prediction_status_async: Asynchronously updates
-                                        the status of a prediction.
-
-        get_user_predictions_async: Asynchronously gets all predictions
-                                    of a user.
-
-        get_user_statistic_async: Asynchronously gets the statistic of a user.
-
-        user_exists_async: Asynchronously checks if a user with the given ID
-                           exists in the database.
-
-        add_user_async: Asynchronously adds a user to the users table.
+        backup_async: Asynchronously writes an online backup snapshot.
 
-        add_prediction_async: Asynchronously adds a prediction to the database.
-
-        get_unapproved_predictions_async: Asynchronously returns all
-                                            unapproved predictions.
+        archive_predictions_async: Asynchronously archives old rejected
+                                   and inappropriate predictions.
     """
-    def __init__(self, db_name: str = constants.DB_NAME, logging_level: int = logging.INFO):
+    OPERATION_PRIORITIES: Dict[str, Priority] = {
+        'update_prediction_status': Priority.WRITE,
+        'add_prediction': Priority.WRITE,
+        'add_user': Priority.WRITE,
+        'set_state': Priority.WRITE,
+        'add_pool': Priority.WRITE,
+        'set_chat_pool': Priority.WRITE,
+        'execute_query': Priority.WRITE,
+        'get_random_approved_prediction': Priority.INLINE,
+        'get_random_approved_item': Priority.INLINE,
+    }
+
+    def __init__(
+        self, db_name: str = constants.DB_NAME,
+        logging_level: int = logging.INFO,
+        max_in_flight: Optional[int] = constants.DB_MAX_IN_FLIGHT
+    ):
         super().__init__(db_name, logging_level)
-        self.loop = asyncio.get_event_loop()
-        self.executor = ThreadPoolExecutor()
+        self.admission: Optional[AdmissionController] = (
+            AdmissionController(max_in_flight)
+            if max_in_flight is not None else None
+        )
+        # admitted calls never wait for a thread, the spare ones are
+        # for the approved predictions cache
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_in_flight + constants.DB_SPARE_THREADS
+            if max_in_flight is not None else None
+        )
+        self.maintenance_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='db_maintenance'
+        )
+        self.maintenance_pending: Counter = Counter()
+        self.maintenance_runs: Counter = Counter()
+
+    async def _run(self, method: Callable, *args):
+        if self.admission is None:
+            return await super()._run(method, *args)
+        name = getattr(method, 'func', method).__name__
+        async with self.admission.admit(
+            self.OPERATION_PRIORITIES.get(name, Priority.READ)
+        ):
+            return await super()._run(method, *args)
 
     async def check_if_table_exists_async(self, table_name: str) -> bool:
-        return await self.loop.run_in_executor(
-            self.executor, self.check_if_table_exists, table_name
-        )
+        return await self._run(self.check_if_table_exists, table_name)
 
     async def execute_query_async(self, query: str, parameters: Tuple = ()) -> None:
-        return await self.loop.run_in_executor(
-            self.executor, self.execute_query, query, parameters
-        )
+        return await self._run(self.execute_query, query, parameters)
 
     async def fetch_one_async(self, query: str, parameters: Tuple = ()) -> Union[Tuple, None]:
-        return await self.loop.run_in_executor(
-            self.executor, self.fetch_one, query, parameters
-        )
+        return await self._run(self.fetch_one, query, parameters)
 
     async def fetch_all_async(self, query: str, parameters: Tuple = ()) -> List[Tuple]:
-        return await self.loop.run_in_executor(
-            self.executor, self.fetch_all, query, parameters
+        return await self._run(self.fetch_all, query, parameters)
+
+    async def _run_maintenance(self, method: Callable, **kwargs) -> Dict:
+        # imported here like in PredictionStorageAsync._run
+        import asyncio
+        name = method.__name__
+        self.maintenance_pending[name] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.maintenance_executor, partial(method, **kwargs)
+            )
+        finally:
+            self.maintenance_pending[name] -= 1
+            self.maintenance_runs[name] += 1
+
+    def maintenance_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the statistic of the backups and archivals.
+
+        :return: A dict with the pending and the finished runs
+            per method.
+        """
+        return {
+            'pending': {
+                name: count
+                for name, count in self.maintenance_pending.items() if count
+            },
+            'runs': dict(self.maintenance_runs),
+        }
+
+    async def backup_async(self, **kwargs) -> Dict:
+        return await self._run_maintenance(self.backup, **kwargs)
+
+    async def archive_predictions_async(self, **kwargs) -> Dict:
+        return await self._run_maintenance(
+            self.archive_predictions, **kwargs
         )
 
-    async def get_random_approved_prediction_async(self) -> Union[str, None]:
-        return await self.loop.run_in_executor(self.executor, self.get_random_approved_prediction)
 
-    async def get_prediction_by_id_async(self, prediction_id: int) -> Union[Tuple, None]:
-        return await self.loop.run_in_executor(
-            self.executor, self.get_prediction_by_id, prediction_id
-        )
+BULK_FORMATS = ('jsonl', 'csv')
 
-    async def update_prediction_status_async(self, prediction_id: int, new_status: str) -> None:
-        return await self.loop.run_in_executor(
-            self.executor, self.update_prediction_status, prediction_id, new_status
-        )
 
-    async def get_user_predictions_async(self, user_id: int) -> List[Tuple]:
-        return await self.loop.run_in_executor(
-            self.executor, self.get_user_predictions, user_id
-        )
+def read_rows(file, file_format: str) -> Iterator[Dict]:
+    """
+    Reads rows as dicts from a JSONL or CSV (with a header) file.
 
-    async def get_user_statistic_async(self, user_id: int) -> List[Tuple]:
-        return await self.loop.run_in_executor(
-            self.executor, self.get_user_statistic, user_id
-        )
+    :param file: The text file to read from.
+    :param file_format: jsonl or csv.
+    :return: An iterator of row dicts.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
 
-    async def user_exists_async(self, user_id: int) -> bool:
-        return await self.loop.run_in_executor(self.executor, self.user_exists, user_id)
 
-    async def add_user_async(self, user_id: int, user_name: str) -> None:
-        return await self.loop.run_in_executor(
-            self.executor, self.add_user, user_id, user_name
-        )
+def write_rows(file, file_format: str, rows: Iterable[Dict]) -> int:
+    """
+    Writes row dicts to a JSONL or CSV (with a header) file.
 
-    async def add_prediction_async(self, prediction_text: str, user_id: int) -> None:
-        return await self.loop.run_in_executor(
-            self.executor, self.add_prediction, prediction_text, user_id
+    :param file: The text file to write to.
+    :param file_format: jsonl or csv.
+    :param rows: The rows to write.
+    :return: The number of written rows.
+    """
+    written = 0
+    writer = None
+    for row in rows:
+        if file_format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(file, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+        else:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        written += 1
+    return written
+
+
+def _progress(
+    table_name: str, totals: Iterator[Tuple[int, int]]
+) -> Tuple[int, int]:
+    started = time.perf_counter()
+    processed = inserted = 0
+    for processed, inserted in totals:
+        rate = processed / max(time.perf_counter() - started, 1e-9)
+        print(
+            f'\r{table_name}: {processed} processed, {inserted} inserted '
+            f'({rate:.0f} rows/s)',
+            end='', file=sys.stderr, flush=True
         )
+    print(file=sys.stderr)
+    return processed, inserted
 
-    async def get_unapproved_predictions_async(self) -> List[Tuple]:
-        return await self.loop.run_in_executor(self.executor, self.get_unapproved_predictions)
 
-
-if __name__ == '__main__':
-    db_tools = DBTools(constants.DB_NAME)
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Database tools of the kind predictions bot'
+    )
+    parser.add_argument('--db', default=constants.DB_NAME)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser(
+        'show', help='Print a random approved and all unapproved predictions'
+    )
+    archive_parser = subparsers.add_parser(
+        'archive', help='Archive old rejected and inappropriate predictions'
+    )
+    archive_parser.add_argument(
+        '--retention_days', type=float,
+        default=constants.ARCHIVE_RETENTION_DAYS
+    )
+    subparsers.add_parser(
+        'vacuum',
+        help='Enable incremental vacuum, rewrites the database file'
+    )
+    for command in ('export', 'import'):
+        subparser = subparsers.add_parser(
+            command, help=f'{command.capitalize()} a table as JSONL or CSV'
+        )
+        subparser.add_argument(
+            'table', choices=(
+                DBTools.PREDICTIONS_TABLE_NAME, DBTools.USERS_TABLE_NAME
+            )
+        )
+        subparser.add_argument('file', help='File path, "-" for std streams')
+        subparser.add_argument(
+            '--format', choices=BULK_FORMATS,
+            help='Defaults to the file extension, jsonl for std streams'
+        )
+        subparser.add_argument(
+            '--chunk_size', type=int, default=DBTools.BULK_CHUNK_SIZE
+        )
+    import_parser = subparsers.choices['import']
+    import_parser.add_argument(
+        '--keep_ids', action='store_true',
+        help='Keep prediction ids from the file'
+    )
+    args = parser.parse_args()
+
+    db_tools = DBTools(args.db)
+
+    if args.command == 'archive':
+        print(db_tools.archive_predictions(args.retention_days))
+        return
+    if args.command == 'vacuum':
+        db_tools.enable_incremental_vacuum()
+        return
+    if args.command in ('export', 'import'):
+        file_format = args.format or (
+            'csv' if args.file.endswith('.csv') else 'jsonl'
+        )
+        if args.command == 'export':
+            output = (
+                sys.stdout if args.file == '-'
+                else open(args.file, 'w', encoding='utf8', newline='')
+            )
+            with output:
+                written = write_rows(
+                    output, file_format,
+                    db_tools.iter_table(args.table, args.chunk_size)
+                )
+            print(f'{args.table}: {written} exported', file=sys.stderr)
+        else:
+            source = (
+                sys.stdin if args.file == '-'
+                else open(args.file, 'r', encoding='utf8', newline='')
+            )
+            with source:
+                rows = read_rows(source, file_format)
+                if args.table == DBTools.USERS_TABLE_NAME:
+                    totals = db_tools.import_users(rows, args.chunk_size)
+                else:
+                    totals = db_tools.import_predictions(
+                        rows, args.keep_ids, args.chunk_size
+                    )
+                _progress(args.table, totals)
+        return
 
     print(db_tools.get_random_approved_prediction())
     unapproved_predictions = db_tools.get_unapproved_predictions()
 
     for prediction in unapproved_predictions:
         print(prediction)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+This module provides near-duplicate detection of predictions with
+MinHash signatures and a locality-sensitive hashing (LSH) index.
+
+- A text is normalised (case folded, punctuation and repeated spaces
+  removed) and split into character shingles.
+- Its MinHash signature holds, for each of NUM_PERMUTATIONS hash
+  functions, the minimal hash of its shingles. Two signatures agree
+  in a position with the probability equal to the Jaccard similarity
+  of the shingle sets.
+- The signature is cut into BANDS bands of ROWS_PER_BAND values,
+  texts sharing any band become candidates and their similarity is
+  estimated from the signatures.
+
+The index keeps signatures and band keys in flat arrays instead of
+per-prediction objects, so a million predictions take about 130 MB
+and a lookup is a handful of binary searches (~0.1 ms).
+"""
+
+import re
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+_MAX_HASH = (1 << 32) - 1
+_MAX_HASH64 = (1 << 64) - 1
+# odd 64-bit constants of the multiplicative hash and of densification
+_MIX = 0x9E3779B97F4A7C15
+_ROTATION = 0x7F4A7C15
+# the top 5 bits of the mixed shingle hash choose the bin
+_BIN_SHIFT = 64 - (NUM_PERMUTATIONS - 1).bit_length()
+# signature values are stored truncated to 16 bits (b-bit MinHash),
+# a false match of a truncated value adds 1/65536 to the estimate
+_STORED_MASK = 0xFFFF
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalized(text: str) -> str:
+    """
+    Returns the text without case, punctuation and repeated spaces.
+
+    :param text: The text to normalise.
+    :return: The normalised text.
+    """
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def shingles(text: str) -> List[int]:
+    """
+    Returns the hashes of the character shingles of the normalised text.
+
+    :param text: The text to split.
+    :return: A list of distinct 32-bit shingle hashes, empty for a text
+        without word characters.
+    """
+    text = normalized(text)
+    if not text:
+        return []
+    if len(text) <= SHINGLE_SIZE:
+        return [zlib.crc32(text.encode())]
+    return list({
+        zlib.crc32(text[start:start + SHINGLE_SIZE].encode())
+        for start in range(len(text) - SHINGLE_SIZE + 1)
+    })
+
+
+def signature(text: str) -> List[int]:
+    """
+    Returns the MinHash signature of the text.
+
+    Uses one permutation hashing: every shingle hash goes to one of
+    NUM_PERMUTATIONS bins and the signature holds the minimum of every
+    bin, empty bins borrow the value of the next non-empty one. It is
+    as accurate as NUM_PERMUTATIONS independent hash functions for
+    texts of a few dozen shingles, at the cost of a single one.
+
+    :param text: The text to sign.
+    :return: NUM_PERMUTATIONS 32-bit minimal hashes, an empty list for
+        a text without shingles, which resembles no other text.
+    """
+    text_shingles = shingles(text)
+    if not text_shingles:
+        return []
+    empty = _MAX_HASH + 1
+    minimums = [empty] * NUM_PERMUTATIONS
+    for value in text_shingles:
+        mixed = (value * _MIX) & _MAX_HASH64
+        value = mixed & _MAX_HASH
+        index = mixed >> _BIN_SHIFT
+        if value < minimums[index]:
+            minimums[index] = value
+    for index, value in enumerate(minimums):
+        distance = 1
+        while value == empty:
+            value = minimums[(index + distance) % NUM_PERMUTATIONS]
+            if value != empty:
+                value = (value + distance * _ROTATION) & _MAX_HASH
+            distance += 1
+        minimums[index] = value
+    return minimums
+
+
+def band_keys(text_signature: List[int]) -> List[int]:
+    """
+    Returns a 32-bit key of every band of the signature.
+
+    :param text_signature: The MinHash signature.
+    :return: BANDS band keys.
+    """
+    return [
+        hash(tuple(text_signature[start:start + ROWS_PER_BAND])) & _MAX_HASH
+        for start in range(0, NUM_PERMUTATIONS, ROWS_PER_BAND)
+    ]
+
+
+class DuplicateIndex:
+    """
+    In-memory MinHash/LSH index of prediction texts.
+
+    Every band is a sorted array of (band key << 32 | position) values,
+    where position is the index of the prediction in the ids and
+    signatures arrays. Predictions added after the last build go to
+    small per-band dicts, merged into the arrays on the next build.
+
+    Attributes:
+        threshold (float): Minimal estimated similarity of duplicates.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._ids = array('q')
+        self._signatures = array('H')
+        self._bands: List[array] = [array('Q') for _ in range(BANDS)]
+        self._recent: List[Dict[int, List[int]]] = [
+            {} for _ in range(BANDS)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def memory_usage(self) -> int:
+        """
+        Returns the size of the index arrays, in bytes. The dicts of
+        the predictions added since the last build are not counted.
+        """
+        return sum(
+            values.buffer_info()[1] * values.itemsize
+            for values in (self._ids, self._signatures, *self._bands)
+        )
+
+    def build(self, predictions: Iterable[Tuple[int, str]]) -> None:
+        """
+        Replaces the content of the index, texts without shingles
+        are left out.
+
+        :param predictions: (prediction id, prediction text) pairs.
+        :return: None
+        """
+        ids = array('q')
+        signatures = array('H')
+        bands: List[List[int]] = [[] for _ in range(BANDS)]
+        for prediction_id, text in predictions:
+            text_signature = signature(text)
+            if not text_signature:
+                continue
+            position = len(ids)
+            ids.append(prediction_id)
+            signatures.extend(
+                value & _STORED_MASK for value in text_signature
+            )
+            for band, key in zip(bands, band_keys(text_signature)):
+                band.append(key << 32 | position)
+        # swap everything at once, lookups may run in other threads
+        self._ids, self._signatures = ids, signatures
+        self._bands = [array('Q', sorted(band)) for band in bands]
+        self._recent = [{} for _ in range(BANDS)]
+
+    def add(self, prediction_id: int, text: str) -> None:
+        """
+        Adds a prediction to the index, a text without shingles
+        is left out.
+
+        :param prediction_id: The ID of the prediction.
+        :param text: The prediction text.
+        :return: None
+        """
+        text_signature = signature(text)
+        if not text_signature:
+            return
+        position = len(self._ids)
+        self._signatures.extend(
+            value & _STORED_MASK for value in text_signature
+        )
+        self._ids.append(prediction_id)
+        for recent, key in zip(self._recent, band_keys(text_signature)):
+            recent.setdefault(key, []).append(position)
+
+    def find_duplicate(self, text: str) -> Optional[Tuple[int, float]]:
+        """
+        Finds the most similar indexed prediction.
+
+        :param text: The text to look up.
+        :return: (prediction id, estimated similarity) of the most
+            similar prediction at or above the threshold, or None
+            (always for a text without shingles).
+        """
+        text_signature = signature(text)
+        if not text_signature:
+            return None
+        stored = [value & _STORED_MASK for value in text_signature]
+        candidates = set()
+        for band, recent, key in zip(
+            self._bands, self._recent, band_keys(text_signature)
+        ):
+            index = bisect_left(band, key << 32)
+            while index < len(band) and band[index] >> 32 == key:
+                candidates.add(band[index] & _MAX_HASH)
+                index += 1
+            candidates.update(recent.get(key, ()))
+
+        best: Optional[Tuple[int, float]] = None
+        for position in candidates:
+            offset = position * NUM_PERMUTATIONS
+            similarity = sum(
+                value == other for value, other in zip(
+                    stored,
+                    self._signatures[offset:offset + NUM_PERMUTATIONS]
+                )
+            ) / NUM_PERMUTATIONS
+            if similarity >= self.threshold and (
+                    best is None or similarity > best[1]
+            ):
+                best = (self._ids[position], similarity)
+        return best
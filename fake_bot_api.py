@@ -0,0 +1,205 @@
+"""
+This module provides a fake Bot API for offline runs of the bot:
+replaying recorded traffic, benchmarks and load experiments.
+
+FakeBotAPIRequest plugs into Application.builder().request(...) and
+answers every Bot API call locally with a plausible result, optionally
+after an artificial latency, counting calls per API method.
+
+FakeBotAPIServer answers the same way over local HTTP/1.1, for runs
+that exercise the real HTTP client and its connection pool, e.g.
+Application.builder().base_url(server.base_url).
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from telegram.request import BaseRequest, RequestData
+
+FAKE_BOT_TOKEN = '123456:FAKE-TOKEN'
+FAKE_BOT_USER = {
+    'id': 123456,
+    'is_bot': True,
+    'first_name': 'Kind Predictions Bot',
+    'username': 'kind_predictions_fake_bot',
+    'can_join_groups': True,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': True,
+}
+
+
+def fake_result(endpoint: str, parameters: Dict) -> object:
+    """
+    Returns a plausible Bot API result for the given method.
+
+    :param endpoint: The Bot API method name, e.g. "sendMessage".
+    :param parameters: The parameters of the call.
+    :return: The "result" field of the Bot API response.
+    """
+    if endpoint == 'getMe':
+        return FAKE_BOT_USER
+    if endpoint == 'getUpdates':
+        return []
+    if endpoint in ('sendMessage', 'editMessageText'):
+        chat_id = int(parameters.get('chat_id', 0) or 0)
+        return {
+            'message_id': int(parameters.get('message_id', 1) or 1),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': FAKE_BOT_USER,
+            'text': str(parameters.get('text', '')),
+        }
+    return True
+
+
+class FakeBotAPIRequest(BaseRequest):
+    """
+    A request backend that never touches the network.
+
+    Attributes:
+        latency (float): Seconds every call takes.
+        calls (Counter): Number of calls per Bot API method.
+        last_call_at (dict): Perf counter timestamp of the last call
+            per Bot API method.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.last_call_at: Dict[str, float] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[endpoint] += 1
+        self.last_call_at[endpoint] = time.perf_counter()
+        parameters = request_data.parameters if request_data else {}
+        return 200, json.dumps(
+            {'ok': True, 'result': fake_result(endpoint, parameters)}
+        ).encode()
+
+
+class FakeBotAPIServer:
+    """
+    A local HTTP/1.1 server with keep-alive answering Bot API calls
+    with fake_result(). getUpdates is held for its timeout parameter
+    (capped by max_poll) like a long poll with no updates.
+
+    Attributes:
+        latency (float): Seconds every call takes.
+        connect_latency (float): Seconds added to the first call on
+            every connection, imitates the TCP and TLS handshakes
+            to the real Bot API.
+        max_poll (float): The longest a getUpdates call is held.
+        calls (Counter): Number of calls per Bot API method.
+        connections (int): Number of accepted connections.
+        port (int | None): The port listened on once started.
+    """
+
+    def __init__(
+        self, latency: float = 0.0, connect_latency: float = 0.0,
+        max_poll: float = 10.0
+    ):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.max_poll = max_poll
+        self.calls: Counter = Counter()
+        self.connections = 0
+        self.port: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    @property
+    def base_url(self) -> str:
+        """The base_url of the Bot, the token is appended to it."""
+        return f'http://127.0.0.1:{self.port}/bot'
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve_connection, '127.0.0.1', 0
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        for handler in self._handlers:
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        delay = self.connect_latency
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (
+                    b'\r\n', b''
+                ):
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get('content-length', 0))
+                )
+                path = request_line.split()[1].decode()
+                endpoint = path.rsplit('/', 1)[-1]
+                parameters = dict(parse_qsl(body.decode()))
+                delay += self.latency
+                if endpoint == 'getUpdates':
+                    delay += min(
+                        float(parameters.get('timeout', 0)), self.max_poll
+                    )
+                if delay:
+                    await asyncio.sleep(delay)
+                delay = 0.0
+                self.calls[endpoint] += 1
+                payload = json.dumps(
+                    {'ok': True, 'result': fake_result(endpoint, parameters)}
+                ).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode()
+                    + b'\r\n\r\n' + payload
+                )
+                await writer.drain()
+        except (
+            ConnectionError, asyncio.IncompleteReadError,
+            asyncio.CancelledError
+        ):
+            # closed by the client or the server is stopped
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
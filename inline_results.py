@@ -0,0 +1,177 @@
+"""
+This module provides pre-serialized results of the inline queries.
+
+Building InlineQueryResultArticle objects for every inline query,
+copying them to insert the defaults in ExtBot and serializing them to
+JSON takes longer than choosing the prediction itself. The articles
+the bot answers with differ only in their id and text, so
+InlineResultFactory serializes each article once with
+python-telegram-bot into a template and per query only fills in the
+id and the JSON-encoded text, and the results go to the Bot API as
+a ready JSON string via answer_inline_query().
+
+The id of a prediction article carries the prediction id, so
+a chosen_inline_result update tells which prediction was sent,
+see prediction_id_of().
+"""
+
+import itertools
+import json
+import random
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot, InlineQueryResultArticle, InputTextMessageContent
+from telegram.warnings import PTBUserWarning
+
+BUN_TITLE = 'Насколько ты булка?'
+PREDICTION_TITLE = 'Предсказание'
+# the range of the "булка" percentage
+BUN_PERCENT_MIN = 50
+BUN_PERCENT_MAX = 100
+
+_ID_PLACEHOLDER = '\x00'
+_TEXT_PLACEHOLDER = '\x01'
+
+# do_api_request() asks to use Bot.answer_inline_query() instead, which
+# would deserialize nothing but rebuild and copy the result objects
+warnings.filterwarnings(
+    'ignore', message=r"Please use 'Bot\.answerInlineQuery'",
+    category=PTBUserWarning
+)
+
+
+class ArticleTemplate:
+    """
+    An InlineQueryResultArticle with a static title serialized once.
+
+    Attributes:
+        title (str): The title of the article.
+    """
+
+    __slots__ = ('title', '_template')
+
+    def __init__(self, title: str):
+        self.title = title
+        article = InlineQueryResultArticle(
+            id=_ID_PLACEHOLDER,
+            title=title,
+            input_message_content=InputTextMessageContent(_TEXT_PLACEHOLDER),
+        ).to_json()
+        self._template = (
+            article.replace('%', '%%')
+            .replace(json.dumps(_ID_PLACEHOLDER), '%(id)s')
+            .replace(json.dumps(_TEXT_PLACEHOLDER), '%(text)s')
+        )
+
+    def render(self, result_id: str, encoded_text: str) -> str:
+        """
+        Returns the JSON of the article.
+
+        :param result_id: The id of the result, ASCII letters, digits,
+            "-" and "_" only, as it is not escaped.
+        :param encoded_text: The JSON-encoded message text, see
+            encode_text().
+        :return: The JSON object of the article.
+        """
+        return self._template % {'id': f'"{result_id}"', 'text': encoded_text}
+
+
+def encode_text(text: str) -> str:
+    """
+    Encodes a message text for ArticleTemplate.render().
+
+    :param text: The message text.
+    :return: The JSON string literal of the text.
+    """
+    return json.dumps(text)
+
+
+class InlineResultFactory:
+    """
+    Builds the JSON results of the inline queries from templates.
+
+    Attributes:
+        bun (ArticleTemplate): The "Насколько ты булка?" article.
+        prediction (ArticleTemplate): The prediction article.
+
+    Methods:
+        results(prediction):
+            Returns the JSON array of the results of one query.
+    """
+
+    def __init__(self):
+        self.bun = ArticleTemplate(BUN_TITLE)
+        self.prediction = ArticleTemplate(PREDICTION_TITLE)
+        # the percentages are few, so their texts are encoded in advance
+        self._bun_texts: List[str] = [
+            encode_text(f'{percent}% булка!')
+            for percent in range(BUN_PERCENT_MIN, BUN_PERCENT_MAX + 1)
+        ]
+        # ids only have to be unique within one answer, a counter is
+        # cheaper than uuid4() and keeps them unique across answers too
+        self._ids = itertools.count()
+
+    def results(self, prediction: Optional[Tuple[int, str]]) -> str:
+        """
+        Returns the results of one inline query: the "булка" article
+        with a random percentage and the prediction article.
+
+        :param prediction: (prediction id, prediction text), None
+            leaves out its article, e.g. for an empty pool.
+        :return: The JSON array of the results.
+        """
+        articles = [
+            self.bun.render(
+                f'b{next(self._ids)}', random.choice(self._bun_texts)
+            )
+        ]
+        if prediction is not None:
+            prediction_id, text = prediction
+            articles.append(
+                self.prediction.render(
+                    f'p{prediction_id}-{next(self._ids)}', encode_text(text)
+                )
+            )
+        return f"[{','.join(articles)}]"
+
+
+def prediction_id_of(result_id: str) -> Optional[int]:
+    """
+    Returns the prediction id of a result built by InlineResultFactory.
+
+    :param result_id: The id of the result, e.g. of
+        a chosen_inline_result update.
+    :return: The prediction id, or None for the "булка" article
+        and unknown ids.
+    """
+    if not result_id.startswith('p'):
+        return None
+    prediction_id, _, _ = result_id[1:].partition('-')
+    return int(prediction_id) if prediction_id.isdigit() else None
+
+
+async def answer_inline_query(
+    bot: Bot, inline_query_id: str, results: str, cache_time: int,
+    is_personal: bool
+) -> bool:
+    """
+    Answers an inline query with pre-serialized results.
+
+    :param bot: The bot, e.g. update.inline_query.get_bot().
+    :param inline_query_id: The id of the inline query.
+    :param results: The JSON array of the results, see
+        InlineResultFactory.results().
+    :param cache_time: Seconds the results may be cached by Telegram.
+    :param is_personal: Whether the results are cached per user.
+    :return: True on success.
+    """
+    api_kwargs: Dict[str, object] = {
+        'inline_query_id': inline_query_id,
+        'results': results,
+        'cache_time': cache_time,
+        'is_personal': is_personal,
+    }
+    return await bot.do_api_request(
+        'answerInlineQuery', api_kwargs=api_kwargs
+    )
@@ -0,0 +1,140 @@
+"""
+This module provides an event-loop watchdog.
+
+LoopWatchdog measures event-loop scheduling lag continuously: a task on
+the loop sleeps for a fixed interval and records how late it wakes up.
+A monitor thread watches the heartbeat of that task and, when the loop
+does not come back for longer than a threshold, captures the stack of
+the loop thread, i.e. of the callback blocking every concurrent user.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils import setup_logger
+
+# upper bounds of the lag histogram buckets, in milliseconds
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+MAX_SLOW_CALLBACKS = 20
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag and records stacks of blocking callbacks.
+
+    Attributes:
+        interval (float): Seconds between lag probes.
+        threshold (float): Seconds the loop may be blocked before
+            the blocking stack is recorded.
+        histogram (list): Number of probes per bucket of LAG_BUCKETS_MS,
+            the last item counts probes above the last bucket.
+        max_lag (float): The largest lag seen, in seconds.
+        slow_callbacks (deque): (time, blocked seconds, stack) of
+            the last blocking callbacks.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(
+        self, interval: float = 0.1, threshold: float = 0.25,
+        logging_level: int = logging.INFO
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.histogram: List[int] = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.max_lag = 0.0
+        self.slow_callbacks: Deque[Tuple[float, float, str]] = deque(
+            maxlen=MAX_SLOW_CALLBACKS
+        )
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop_monitor = threading.Event()
+
+    def start(self) -> None:
+        """Starts the watchdog, must be called on the running loop."""
+        if self._probe is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._probe = asyncio.get_running_loop().create_task(
+            self._probe_lag(), name='LoopWatchdog'
+        )
+        self._stop_monitor.clear()
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name='LoopWatchdogMonitor',
+            daemon=True
+        )
+        self._monitor.start()
+        self.logger.debug(
+            'Watchdog started (interval=%ss, threshold=%ss)',
+            self.interval, self.threshold
+        )
+
+    async def stop(self) -> None:
+        """Stops the watchdog."""
+        if self._probe is None:
+            return
+        self._probe.cancel()
+        try:
+            await self._probe
+        except asyncio.CancelledError:
+            pass
+        self._probe = None
+        self._stop_monitor.set()
+        self._monitor.join()
+        self._monitor = None
+
+    async def _probe_lag(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, lag)
+            self.histogram[bisect_left(LAG_BUCKETS_MS, lag * 1000)] += 1
+
+    def _monitor_loop(self) -> None:
+        reported_heartbeat = None
+        while not self._stop_monitor.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            # one report per blocking episode
+            if blocked < self.threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            self.slow_callbacks.append((time.time(), blocked, stack))
+            self.logger.warning(
+                'Event loop blocked for %.3fs, blocking stack:\n%s',
+                blocked, stack
+            )
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the lag statistic.
+
+        :return: A dict with the number of probes, the max lag in ms,
+            the histogram as {"<=Nms": count} and the number of recorded
+            blocking callbacks.
+        """
+        labels = [f'<={bucket}ms' for bucket in LAG_BUCKETS_MS]
+        labels.append(f'>{LAG_BUCKETS_MS[-1]}ms')
+        return {
+            'probes': sum(self.histogram),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'histogram': dict(zip(labels, self.histogram)),
+            'slow_callbacks': len(self.slow_callbacks),
+        }
@@ -0,0 +1,322 @@
+"""
+This module provides a pure in-memory PredictionStorage for tests and
+ephemeral benchmark runs, nothing is persisted.
+
+It keeps the same derived data SQLite triggers maintain in DBTools:
+approved predictions per pool for random choice, lifetime statistic of
+every user and leaderboard counters per period, so every method costs
+about what its SQLite counterpart costs in index lookups.
+"""
+
+import random
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import constants
+from storage import (
+    ApprovalStates, DuplicateUserError, PREDICTION_COLUMNS,
+    PredictionStorage, PredictionStorageAsync, UserStates,
+)
+
+_ID, _TEXT, _STATE, _USER, _CHANGED_AT, _DUPLICATE_OF, _PRIORITY, \
+    _MOD_SEQ, _POOL = range(len(PREDICTION_COLUMNS))
+_APPROVED = ApprovalStates.APPROVED.value
+_NOT_APPROVED = ApprovalStates.NOT_APPROVED.value
+_STATES = [state.value for state in ApprovalStates]
+
+
+def _now() -> datetime:
+    # SQLite CURRENT_TIMESTAMP and 'now' are UTC
+    return datetime.now(timezone.utc)
+
+
+def _period_start(period: str, time: datetime) -> str:
+    # DBTools.LEADERBOARD_PERIOD_START
+    if period == 'month':
+        return time.strftime('%Y-%m')
+    if period == 'week':
+        return time.strftime('%Y-W%W')
+    return ''
+
+
+class MemoryStorage(PredictionStorage):
+    """
+    PredictionStorage kept in Python structures, safe to use from
+    several threads.
+
+    Attributes:
+        USERS_TABLE_NAME (str): The iter_table name of the users.
+        PREDICTIONS_TABLE_NAME (str): The iter_table name
+            of the predictions.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users: Dict[int, Tuple[int, str, str]] = {}
+        # prediction id -> row as a list in PREDICTION_COLUMNS order
+        self._predictions: Dict[int, list] = {}
+        self._user_predictions: Dict[int, List[int]] = defaultdict(list)
+        self._user_stats: Dict[int, Counter] = defaultdict(Counter)
+        # pool id -> approved prediction ids, and the position of every
+        # approved prediction in the list of its pool
+        self._approved: Dict[int, List[int]] = defaultdict(list)
+        self._approved_positions: Dict[int, int] = {}
+        self._unapproved: set = set()
+        # (period, period start) -> approved predictions per user
+        self._leaderboard: Dict[Tuple[str, str], Counter] = (
+            defaultdict(Counter)
+        )
+        self._state: Dict[str, Optional[str]] = {}
+        self._pools: Dict[str, int] = {
+            self.DEFAULT_POOL_NAME: self.DEFAULT_POOL_ID
+        }
+        self._pool_names: Dict[int, str] = {
+            self.DEFAULT_POOL_ID: self.DEFAULT_POOL_NAME
+        }
+        self._chat_pools: Dict[int, int] = {}
+        self._last_prediction_id = 0
+        self._mod_seq = 0
+
+    def get_random_approved_prediction(
+        self, pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> Union[str, None]:
+        prediction = self.get_random_approved_item(pool_id)
+        return prediction[1] if prediction else None
+
+    def get_random_approved_item(
+        self, pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            approved = self._approved.get(pool_id)
+            if not approved:
+                return None
+            prediction_id = random.choice(approved)
+            return prediction_id, self._predictions[prediction_id][_TEXT]
+
+    def get_prediction_by_id(
+        self, prediction_id: int
+    ) -> Union[Tuple, None]:
+        with self._lock:
+            row = self._predictions.get(prediction_id)
+            return tuple(row) if row is not None else None
+
+    def update_prediction_status(
+        self, prediction_id: int, new_status: str
+    ) -> None:
+        with self._lock:
+            row = self._predictions.get(prediction_id)
+            if row is None or row[_STATE] == new_status:
+                return
+            self._unlink_state(row)
+            if row[_USER] is not None:
+                self._user_stats[row[_USER]][row[_STATE]] -= 1
+                self._user_stats[row[_USER]][new_status] += 1
+            row[_STATE] = new_status
+            row[_CHANGED_AT] = _now().strftime('%Y-%m-%d %H:%M:%S')
+            self._link_state(row)
+            self._mod_seq += 1
+            row[_MOD_SEQ] = self._mod_seq
+
+    def get_user_predictions(self, user_id: int) -> List[Tuple]:
+        with self._lock:
+            return [
+                tuple(self._predictions[prediction_id])
+                for prediction_id in self._user_predictions.get(user_id, ())
+                if prediction_id in self._predictions
+            ]
+
+    def get_user_statistic(self, user_id: int) -> List[Tuple]:
+        with self._lock:
+            counts = self._user_stats.get(user_id, {})
+            return [
+                (state, counts[state]) for state in _STATES
+                if counts.get(state)
+            ]
+
+    def get_leaderboard(
+        self, period: str, limit: int = constants.LEADERBOARD_SIZE
+    ) -> List[Tuple]:
+        if period not in self.LEADERBOARD_PERIODS:
+            raise ValueError(f'Unknown leaderboard period: {period}')
+        with self._lock:
+            counts = self._leaderboard.get(
+                (period, _period_start(period, _now())), Counter()
+            )
+            leaders = sorted(
+                (
+                    (user_id, approved) for user_id, approved
+                    in counts.items() if approved > 0
+                ),
+                key=lambda leader: -leader[1]
+            )[:limit]
+            return [
+                (
+                    user_id,
+                    self._users[user_id][1] if user_id in self._users
+                    else None,
+                    approved
+                )
+                for user_id, approved in leaders
+            ]
+
+    def user_exists(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def add_user(self, user_id: int, user_name: str) -> None:
+        with self._lock:
+            if user_id in self._users:
+                raise DuplicateUserError(f'User {user_id} already exists')
+            self._users[user_id] = (
+                user_id, user_name, UserStates.ACTIVE.value
+            )
+
+    def add_prediction(
+        self, prediction_text: str, user_id: int,
+        approval_state: str = ApprovalStates.NOT_APPROVED.value,
+        duplicate_of: Optional[int] = None, moderation_priority: int = 0,
+        pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> int:
+        with self._lock:
+            self._last_prediction_id += 1
+            self._mod_seq += 1
+            row = [None] * len(PREDICTION_COLUMNS)
+            row[_ID] = self._last_prediction_id
+            row[_TEXT] = prediction_text
+            row[_STATE] = approval_state
+            row[_USER] = user_id
+            row[_CHANGED_AT] = _now().strftime('%Y-%m-%d %H:%M:%S')
+            row[_DUPLICATE_OF] = duplicate_of
+            row[_PRIORITY] = moderation_priority
+            row[_MOD_SEQ] = self._mod_seq
+            row[_POOL] = pool_id
+            self._predictions[row[_ID]] = row
+            if user_id is not None:
+                self._user_predictions[user_id].append(row[_ID])
+                self._user_stats[user_id][approval_state] += 1
+            self._link_state(row)
+            return row[_ID]
+
+    def get_unapproved_predictions(self) -> List[Tuple]:
+        return self.get_unapproved_predictions_since(0)[0]
+
+    def get_unapproved_predictions_since(
+        self, prediction_id: int
+    ) -> Tuple[List[Tuple], int]:
+        with self._lock:
+            rows = [
+                self._predictions[unapproved_id]
+                for unapproved_id in self._unapproved
+                if unapproved_id > prediction_id
+            ]
+            rows.sort(key=lambda row: (-row[_PRIORITY], row[_ID]))
+            return (
+                [
+                    (row[_ID], row[_TEXT], row[_DUPLICATE_OF], row[_POOL])
+                    for row in rows
+                ],
+                len(self._unapproved) - len(rows)
+            )
+
+    def get_state(
+        self, key: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        with self._lock:
+            return self._state.get(key, default)
+
+    def set_state(self, key: str, value: Optional[str]) -> None:
+        with self._lock:
+            self._state[key] = value
+
+    def get_pools(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._pools)
+
+    def get_pool_name(self, pool_id: int) -> Optional[str]:
+        with self._lock:
+            return self._pool_names.get(pool_id)
+
+    def add_pool(self, name: str) -> int:
+        with self._lock:
+            if name not in self._pools:
+                pool_id = max(self._pool_names) + 1
+                self._pools[name] = pool_id
+                self._pool_names[pool_id] = name
+            return self._pools[name]
+
+    def get_chat_pool(self, chat_id: int) -> int:
+        with self._lock:
+            return self._chat_pools.get(chat_id, self.DEFAULT_POOL_ID)
+
+    def set_chat_pool(self, chat_id: int, pool_id: int) -> None:
+        with self._lock:
+            self._chat_pools[chat_id] = pool_id
+
+    def iter_table(self, table_name: str) -> Iterator[Dict]:
+        if table_name == self.USERS_TABLE_NAME:
+            with self._lock:
+                rows = [
+                    {'user_id': user_id, 'user_name': name, 'state': state}
+                    for user_id, name, state in self._users.values()
+                ]
+        elif table_name == self.PREDICTIONS_TABLE_NAME:
+            with self._lock:
+                rows = [
+                    dict(zip(PREDICTION_COLUMNS, row))
+                    for row in self._predictions.values()
+                ]
+        else:
+            raise ValueError(f'Unknown table: {table_name}')
+        yield from rows
+
+    def _link_state(self, row: list) -> None:
+        if row[_STATE] == _APPROVED:
+            approved = self._approved[row[_POOL]]
+            self._approved_positions[row[_ID]] = len(approved)
+            approved.append(row[_ID])
+            if row[_USER] is not None:
+                self._count_approval(row, 1)
+        elif row[_STATE] == _NOT_APPROVED:
+            self._unapproved.add(row[_ID])
+
+    def _unlink_state(self, row: list) -> None:
+        if row[_STATE] == _APPROVED:
+            # move the last approved prediction into the freed position
+            approved = self._approved[row[_POOL]]
+            position = self._approved_positions.pop(row[_ID])
+            last_id = approved.pop()
+            if last_id != row[_ID]:
+                approved[position] = last_id
+                self._approved_positions[last_id] = position
+            if row[_USER] is not None:
+                self._count_approval(row, -1)
+        elif row[_STATE] == _NOT_APPROVED:
+            self._unapproved.discard(row[_ID])
+
+    def _count_approval(self, row: list, delta: int) -> None:
+        # approvals count in the periods they happened in, revoked ones
+        # are subtracted from the periods of the approval
+        time = datetime.strptime(
+            row[_CHANGED_AT], '%Y-%m-%d %H:%M:%S'
+        ) if delta < 0 else _now()
+        for period in self.LEADERBOARD_PERIODS:
+            self._leaderboard[(period, _period_start(period, time))][
+                row[_USER]
+            ] += delta
+
+
+class MemoryStorageAsync(MemoryStorage, PredictionStorageAsync):
+    """
+    MemoryStorage with the *_async methods of PredictionStorageAsync.
+
+    Attributes:
+        executor (ThreadPoolExecutor): A single thread, the storage
+            is locked as a whole anyway.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=1)
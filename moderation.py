@@ -0,0 +1,258 @@
+"""
+This module provides automatic pre-moderation of suggestions.
+
+Every suggestion is checked in a process pool, so the checks never
+block the event loop:
+- an Aho-Corasick automaton finds all phrases of the blocklist in one
+  pass over the text, matches inside phrases of the allowlist are
+  ignored (e.g. a blocked word inside an innocent longer word);
+- heuristics look for links, mentions, runs of repeated characters and
+  suspicious length.
+
+A blocklist match marks the suggestion inappropriate right away, every
+heuristic raises its priority in the moderation queue instead.
+
+Dictionaries are plain text files, one phrase per line, lines starting
+with # are comments. Matching ignores case and repeated spaces.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import constants
+from utils import setup_logger
+
+LINK_PATTERN = re.compile(
+    r'https?://|www\.|\bt\.me/|\b[\w-]+\.(?:ru|com|net|org|io|me|su)\b'
+    r'|@\w{5,}',
+    re.IGNORECASE
+)
+REPEATED_CHARACTERS_PATTERN = re.compile(r'(\S)\1{5,}')
+_SPACES = re.compile(r'\s+')
+# relative dictionary paths are relative to the bot sources
+BOT_SOURCES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalized(text: str) -> str:
+    """
+    Returns the text prepared for matching: case folded, ё replaced
+    with е and spaces collapsed.
+
+    :param text: The text to normalise.
+    :return: The normalised text.
+    """
+    return _SPACES.sub(' ', text.casefold().replace('ё', 'е')).strip()
+
+
+def read_dictionary(path: str) -> List[str]:
+    """
+    Reads phrases of a dictionary file, a missing file is empty.
+
+    :param path: The path of the dictionary.
+    :return: A list of normalised phrases.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as dictionary_file:
+            lines = dictionary_file.read().splitlines()
+    except FileNotFoundError:
+        return []
+    return [
+        phrase for phrase in map(normalized, lines)
+        if phrase and not phrase.startswith('#')
+    ]
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher finding all occurrences of many phrases
+    in a single pass over the text.
+
+    Attributes:
+        patterns (list): The phrases the automaton was built from.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(dict.fromkeys(patterns))
+        # trie transitions, failure links and matched pattern indexes
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        for pattern_index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append(pattern_index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] += self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Finds all occurrences of the patterns, overlapping ones included.
+
+        :param text: The text to search in.
+        :return: A list of (start, end, pattern) tuples.
+        """
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern_index in self._output[node]:
+                pattern = self.patterns[pattern_index]
+                matches.append(
+                    (position + 1 - len(pattern), position + 1, pattern)
+                )
+        return matches
+
+
+class ModerationRules:
+    """
+    The blocklist and allowlist automatons and the heuristics.
+
+    Attributes:
+        blocklist (AhoCorasick): Phrases that make a text inappropriate.
+        allowlist (AhoCorasick): Phrases blocklist matches are ignored in.
+    """
+
+    def __init__(self, blocklist: Iterable[str], allowlist: Iterable[str]):
+        self.blocklist = AhoCorasick(blocklist)
+        self.allowlist = AhoCorasick(allowlist)
+
+    def check(self, text: str) -> Dict:
+        """
+        Checks a suggestion.
+
+        :param text: The suggestion text.
+        :return: A dict with "inappropriate" (bool), "priority" (int,
+            higher is reviewed first) and "reasons" (list of str).
+        """
+        reasons = []
+        normalized_text = normalized(text)
+        allowed = self.allowlist.find_all(normalized_text)
+        for start, end, pattern in self.blocklist.find_all(normalized_text):
+            if not any(
+                allowed_start <= start and end <= allowed_end
+                for allowed_start, allowed_end, _ in allowed
+            ):
+                reasons.append(f'blocklist: {pattern}')
+        inappropriate = bool(reasons)
+
+        if LINK_PATTERN.search(text):
+            reasons.append('link')
+        if REPEATED_CHARACTERS_PATTERN.search(text):
+            reasons.append('repeated characters')
+        if len(normalized_text) < constants.MODERATION_MIN_LENGTH:
+            reasons.append('too short')
+        if len(text) > constants.MODERATION_MAX_LENGTH:
+            reasons.append('too long')
+        return {
+            'inappropriate': inappropriate,
+            'priority': len(reasons),
+            'reasons': reasons,
+        }
+
+
+# the rules of a pool worker process, built once by _init_worker
+_worker_rules: Optional[ModerationRules] = None
+
+
+def _init_worker(blocklist_path: str, allowlist_path: str) -> None:
+    global _worker_rules  # pylint: disable=global-statement
+    _worker_rules = ModerationRules(
+        read_dictionary(blocklist_path), read_dictionary(allowlist_path)
+    )
+
+
+def _check_in_worker(text: str) -> Dict:
+    return _worker_rules.check(text)
+
+
+class PreModerator:
+    """
+    Runs ModerationRules over suggestions in a process pool.
+
+    Attributes:
+        blocklist_path (str): The path of the blocklist file.
+        allowlist_path (str): The path of the allowlist file.
+        workers (int): The number of worker processes.
+        executor (ProcessPoolExecutor): The pool checking suggestions.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(
+        self, blocklist_path: str = constants.MODERATION_BLOCKLIST,
+        allowlist_path: str = constants.MODERATION_ALLOWLIST,
+        workers: int = constants.MODERATION_WORKERS,
+        logging_level: int = logging.INFO
+    ):
+        self.blocklist_path = os.path.join(BOT_SOURCES_DIR, blocklist_path)
+        self.allowlist_path = os.path.join(BOT_SOURCES_DIR, allowlist_path)
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        if not os.path.exists(self.blocklist_path):
+            self.logger.warning(
+                'No blocklist at %s, only heuristics are checked',
+                self.blocklist_path
+            )
+        self.workers = workers
+        self.executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, the bot process runs threads that fork does not copy
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.blocklist_path, self.allowlist_path),
+        )
+
+    async def check(self, text: str) -> Dict:
+        """
+        Checks a suggestion in the process pool. A failed check lets
+        the suggestion through to the human moderator.
+
+        :param text: The suggestion text.
+        :return: The result of ModerationRules.check.
+        """
+        executor = self.executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, _check_in_worker, text
+            )
+        except BrokenProcessPool:
+            self.logger.exception('Pre-moderation pool broken, restarting')
+            if executor is self.executor:
+                executor.shutdown(wait=False)
+                self.executor = self._new_executor()
+            return {'inappropriate': False, 'priority': 0, 'reasons': []}
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('Pre-moderation failed')
+            return {'inappropriate': False, 'priority': 0, 'reasons': []}
+
+    def close(self) -> None:
+        """Shuts the process pool down."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
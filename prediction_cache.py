@@ -0,0 +1,320 @@
+"""
+This module provides an in-memory cache of the approved predictions
+that follows changes made by any process, e.g. approvals made by hand
+with queries.sql.
+
+Every prediction pool is cached on its own and lazily: a pool is read
+from the database the first time it is asked for, and the least
+recently used pools are evicted once more than `max_pools` are loaded,
+so thousands of pools never sit in memory at once while the active
+ones are served without touching the database.
+
+Change detection is two-staged:
+- `PRAGMA data_version` of a dedicated connection changes whenever
+  another connection commits to the database, checking it costs no
+  I/O, so the cache can poll it every second;
+- only when it has changed, the rows with a modification sequence
+  number (predictions.mod_seq, maintained by triggers) above the last
+  seen one are read once for all loaded pools and applied to the pool
+  every row belongs to now.
+
+Deleted rows do not leave a trace in mod_seq, but a trigger counts the
+deleted approved predictions in the bot state. Only when that counter
+has changed, the number of cached predictions of every loaded pool is
+compared with the number of its approved predictions in the database
+and the pool is reloaded on a mismatch; other changes never count the
+approved predictions, which reads all of them.
+
+The predictions of a pool are held in a CompactPredictionStore.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextlib import closing
+from typing import Dict, List, Optional, Set, Tuple
+
+import constants
+from compact_store import CompactPredictionStore
+from db_tools import ApprovalStates, DBTools
+from utils import setup_logger
+
+
+class ApprovedPredictionsCache:
+    """
+    Approved predictions of the prediction pools kept in memory,
+    loaded lazily and reloaded incrementally.
+
+    Reads run on the executor, the cache itself is only modified on
+    the event loop, so random() never sees it half updated.
+
+    Attributes:
+        db_name (str): The name of the database file.
+        max_pools (int): The number of pools kept loaded, the default
+            pool is never evicted.
+        pool_ids (dict): {pool name: pool ID} of all the pools, read
+            again on every change of the database.
+        mod_seq (int): The last applied modification sequence number.
+        approved_deletions (int): The deleted approved predictions
+            counter of the database seen by the last refresh.
+        version (int): Incremented on every change of the cache.
+        full_reloads (int): Number of reloads of pools on a mismatch.
+        pool_loads (int): Number of pools loaded on demand.
+        evictions (int): Number of evicted pools.
+        refreshed_at (float | None): time.time() of the last refresh
+            that found changes.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(
+        self, db_name: str, max_pools: int = constants.POOL_CACHE_SIZE,
+        logging_level: int = logging.INFO
+    ):
+        self.db_name = db_name
+        self.max_pools = max_pools
+        self.pool_ids: Dict[str, int] = {}
+        self.mod_seq = 0
+        self.approved_deletions = 0
+        self.version = 0
+        self.full_reloads = 0
+        self.pool_loads = 0
+        self.evictions = 0
+        self.refreshed_at: Optional[float] = None
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        # pool ID -> store, the least recently used first
+        self._stores: 'OrderedDict[int, CompactPredictionStore]' = (
+            OrderedDict()
+        )
+        self._data_version: Optional[int] = None
+        # only used by one executor thread at a time, see refresh()
+        self._connection = sqlite3.connect(
+            db_name, isolation_level=None, check_same_thread=False
+        )
+        self._refresh_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self._stores.values())
+
+    @property
+    def loaded(self) -> bool:
+        return self._data_version is not None
+
+    @property
+    def loaded_pools(self) -> int:
+        return len(self._stores)
+
+    def is_loaded(self, pool_id: int) -> bool:
+        return pool_id in self._stores
+
+    def random(
+        self, pool_id: int = DBTools.DEFAULT_POOL_ID
+    ) -> Optional[str]:
+        """
+        Returns a random approved prediction of a loaded pool.
+
+        :param pool_id: The ID of the pool.
+        :return: The prediction text, or None if the pool is empty
+            or not loaded, see load().
+        """
+        prediction = self.random_item(pool_id)
+        return prediction[1] if prediction else None
+
+    def random_item(
+        self, pool_id: int = DBTools.DEFAULT_POOL_ID
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Returns a random approved prediction of a loaded pool
+        with its ID.
+
+        :param pool_id: The ID of the pool.
+        :return: (prediction id, prediction text), or None if the pool
+            is empty or not loaded, see load().
+        """
+        store = self._stores.get(pool_id)
+        if store is None:
+            return None
+        self._stores.move_to_end(pool_id)
+        return store.random(ApprovalStates.APPROVED.value)
+
+    async def load(
+        self, pool_id: int, executor: Optional[Executor] = None
+    ) -> bool:
+        """
+        Loads a pool unless it is loaded, evicting the least recently
+        used pools above max_pools.
+
+        :param pool_id: The ID of the pool.
+        :param executor: The executor to read the database on,
+            the default executor if None.
+        :return: True if the pool was read from the database.
+        """
+        if pool_id in self._stores:
+            self._stores.move_to_end(pool_id)
+            return False
+        async with self._refresh_lock:
+            # loaded by another caller meanwhile
+            if pool_id in self._stores:
+                return False
+            self._stores[pool_id] = (
+                await asyncio.get_running_loop().run_in_executor(
+                    executor, self._read_store, pool_id
+                )
+            )
+            self.pool_loads += 1
+            while len(self._stores) > self.max_pools:
+                evicted_id = next(
+                    (
+                        loaded_id for loaded_id in self._stores
+                        if loaded_id != DBTools.DEFAULT_POOL_ID
+                    ),
+                    None
+                )
+                if evicted_id is None:
+                    break
+                del self._stores[evicted_id]
+                self.evictions += 1
+            return True
+
+    async def refresh(self, executor: Optional[Executor] = None) -> Set[int]:
+        """
+        Applies the changes made since the last refresh, if any,
+        to the loaded pools.
+
+        :param executor: The executor to read the database on,
+            the default executor if None.
+        :return: The IDs of the loaded pools that have changed.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._refresh_lock:
+            changes = await loop.run_in_executor(
+                executor, self._read_changes, tuple(self._stores)
+            )
+            if changes is None:
+                return set()
+            (
+                data_version, kind, rows, mod_seq, approved_deletions,
+                counts, pool_ids
+            ) = changes
+            if kind == 'full':
+                for pool_id, pool_rows in rows.items():
+                    self._stores[pool_id] = self._new_store(pool_rows)
+                changed = set(rows)
+            else:
+                changed = self._apply(rows)
+            for pool_id, count in counts.items():
+                if len(self._stores[pool_id]) == count:
+                    continue
+                self.logger.info(
+                    'Approved predictions count mismatch in pool %s '
+                    '(%s cached, %s in the database), reloading',
+                    pool_id, len(self._stores[pool_id]), count
+                )
+                self._stores[pool_id] = await loop.run_in_executor(
+                    executor, self._read_store, pool_id
+                )
+                self.full_reloads += 1
+                changed.add(pool_id)
+            self._data_version = data_version
+            self.mod_seq = mod_seq
+            self.approved_deletions = approved_deletions
+            self.pool_ids = pool_ids
+            if changed:
+                self.version += 1
+                self.refreshed_at = time.time()
+            return changed
+
+    def _read_changes(self, pool_ids: Tuple[int, ...]) -> Optional[Tuple]:
+        data_version = self._connection.execute(
+            'PRAGMA data_version'
+        ).fetchone()[0]
+        if data_version == self._data_version:
+            return None
+        with closing(self._connection.cursor()) as cursor:
+            # one read transaction, so the counts match the changes
+            cursor.execute('BEGIN')
+            try:
+                pools = dict(cursor.execute(DBTools.GET_POOLS_QUERY))
+                approved_deletions = cursor.execute(
+                    DBTools.GET_APPROVED_DELETIONS_QUERY
+                ).fetchone()[0]
+                if self._data_version is None:
+                    # pools loaded before the first refresh are read
+                    # again at the mod_seq the changes start from
+                    mod_seq = cursor.execute(
+                        DBTools.GET_MAX_MOD_SEQ_QUERY
+                    ).fetchone()[0]
+                    pool_rows = {
+                        pool_id: cursor.execute(
+                            DBTools.GET_APPROVED_PREDICTIONS_QUERY,
+                            (pool_id, )
+                        ).fetchall()
+                        for pool_id in pool_ids
+                    }
+                    return (
+                        data_version, 'full', pool_rows, mod_seq,
+                        approved_deletions, {}, pools
+                    )
+                rows = cursor.execute(
+                    DBTools.GET_MODIFIED_PREDICTIONS_QUERY, (self.mod_seq, )
+                ).fetchall()
+                # only deletions can leave a loaded pool out of date
+                counts = {
+                    pool_id: cursor.execute(
+                        DBTools.COUNT_APPROVED_PREDICTIONS_QUERY, (pool_id, )
+                    ).fetchone()[0]
+                    for pool_id in pool_ids
+                } if approved_deletions != self.approved_deletions else {}
+            finally:
+                cursor.execute('COMMIT')
+        mod_seq = rows[-1][3] if rows else self.mod_seq
+        return (
+            data_version, 'delta', rows, mod_seq, approved_deletions,
+            counts, pools
+        )
+
+    def _read_pool(self, pool_id: int) -> List[Tuple]:
+        with closing(self._connection.cursor()) as cursor:
+            return cursor.execute(
+                DBTools.GET_APPROVED_PREDICTIONS_QUERY, (pool_id, )
+            ).fetchall()
+
+    def _read_store(self, pool_id: int) -> CompactPredictionStore:
+        # the store of a whole pool is built on the executor as well,
+        # it is only swapped in on the event loop
+        return self._new_store(self._read_pool(pool_id))
+
+    @staticmethod
+    def _new_store(rows: List[Tuple]) -> CompactPredictionStore:
+        return CompactPredictionStore(
+            (prediction_id, text, ApprovalStates.APPROVED.value)
+            for prediction_id, text in rows
+        )
+
+    def _apply(self, rows: List[Tuple]) -> Set[int]:
+        changed = set()
+        for prediction_id, text, approval_state, _, pool_id in rows:
+            # a prediction may have moved from any loaded pool
+            for loaded_id, store in self._stores.items():
+                if (
+                    loaded_id == pool_id
+                    and approval_state == ApprovalStates.APPROVED.value
+                ):
+                    store.add(prediction_id, text, approval_state)
+                elif prediction_id in store:
+                    store.remove(prediction_id)
+                else:
+                    continue
+                changed.add(loaded_id)
+        for loaded_id in changed:
+            store = self._stores[loaded_id]
+            if store.dead_rows > len(store):
+                store.compact()
+        return changed
+
+    def close(self) -> None:
+        """Closes the dedicated connection."""
+        self._connection.close()
@@ -0,0 +1,229 @@
+"""
+This module provides a read-only snapshot file of the approved
+predictions of the default pool, shared by several bot worker
+processes through mmap.
+
+File layout (little-endian):
+    header   magic b'KPSNAP1\\0', version (u64, mod_seq of the data),
+             count (u64)
+    ids      count x i64, prediction ids
+    offsets  (count + 1) x u64, start of every text in the blob
+    blob     UTF-8 texts, one after another
+
+A snapshot is written to a temporary file and moved over the previous
+one with os.replace, so readers see either the old or the new file.
+Readers map the file and remap it when its inode changes, pages are
+shared between all the processes by the OS page cache.
+
+Usage:
+    python prediction_snapshot.py --db kind_predictions.db \\
+        --output approved.snapshot
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import random
+import sqlite3
+import struct
+import sys
+from array import array
+from contextlib import closing
+from typing import Iterable, Optional, Tuple
+
+import constants
+from db_tools import DBTools
+from utils import setup_logger
+
+MAGIC = b'KPSNAP1\0'
+HEADER = struct.Struct('<8sQQ')
+
+
+def write_snapshot(
+    path: str, predictions: Iterable[Tuple[int, str]], version: int = 0
+) -> int:
+    """
+    Atomically replaces the snapshot file.
+
+    :param path: The path of the snapshot.
+    :param predictions: (prediction id, prediction text) pairs.
+    :param version: The version stored in the header.
+    :return: The number of written predictions.
+    """
+    ids = array('q')
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for prediction_id, text in predictions:
+        ids.append(prediction_id)
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+    if sys.byteorder != 'little':
+        ids.byteswap()
+        offsets.byteswap()
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, version, len(ids)))
+        snapshot_file.write(ids.tobytes())
+        snapshot_file.write(offsets.tobytes())
+        snapshot_file.write(blob)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+def build_snapshot(db_name: str, path: str) -> int:
+    """
+    Writes the snapshot of the approved predictions of the default pool.
+
+    :param db_name: The name of the database file.
+    :param path: The path of the snapshot.
+    :return: The number of written predictions.
+    """
+    with closing(sqlite3.connect(db_name, isolation_level=None)) as connection:
+        connection.execute('BEGIN')
+        version = connection.execute(
+            DBTools.GET_MAX_MOD_SEQ_QUERY
+        ).fetchone()[0]
+        count = write_snapshot(
+            path,
+            connection.execute(
+                DBTools.GET_APPROVED_PREDICTIONS_QUERY,
+                (DBTools.DEFAULT_POOL_ID, )
+            ),
+            version
+        )
+        connection.execute('COMMIT')
+    return count
+
+
+class PredictionSnapshot:
+    """
+    A memory-mapped snapshot of the approved predictions.
+
+    Attributes:
+        path (str): The path of the snapshot.
+        version (int): The version of the mapped snapshot.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(self, path: str, logging_level: int = logging.INFO):
+        self.path = path
+        self.version = 0
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._map: Optional[mmap.mmap] = None
+        self._ids: Optional[memoryview] = None
+        self._offsets: Optional[memoryview] = None
+        self._blob_start = 0
+        self._count = 0
+        self._inode: Optional[Tuple[int, int]] = None
+        self.reload()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def reload(self) -> bool:
+        """
+        Maps the snapshot again if the file was replaced.
+
+        :return: True if a new snapshot was mapped.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        inode = (stat.st_dev, stat.st_ino)
+        if inode == self._inode:
+            return False
+
+        with open(self.path, 'rb') as snapshot_file:
+            new_map = mmap.mmap(
+                snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        magic, version, count = HEADER.unpack_from(new_map)
+        if magic != MAGIC:
+            new_map.close()
+            self.logger.error('%s is not a snapshot file', self.path)
+            return False
+        ids_start = HEADER.size
+        offsets_start = ids_start + 8 * count
+        view = memoryview(new_map)
+        ids = view[ids_start:offsets_start].cast('q')
+        offsets = view[offsets_start:offsets_start + 8 * (count + 1)].cast('Q')
+        view.release()
+
+        self._close_map()
+        self._map, self._ids, self._offsets = new_map, ids, offsets
+        self._blob_start = offsets_start + 8 * (count + 1)
+        self._count = count
+        self._inode = inode
+        self.version = version
+        self.logger.info(
+            'Mapped snapshot %s: %s predictions, version %s',
+            self.path, count, version
+        )
+        return True
+
+    def get(self, index: int) -> Tuple[int, str]:
+        """
+        Returns the prediction at the index.
+
+        :param index: The index of the prediction, 0 <= index < len.
+        :return: (prediction id, prediction text).
+        """
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._ids[index], self._map[start:end].decode('utf-8')
+
+    def random(self) -> Optional[str]:
+        """
+        Returns a random prediction.
+
+        :return: The prediction text, or None if the snapshot is empty.
+        """
+        prediction = self.random_item()
+        return prediction[1] if prediction else None
+
+    def random_item(self) -> Optional[Tuple[int, str]]:
+        """
+        Returns a random prediction with its ID.
+
+        :return: (prediction id, prediction text), or None if
+            the snapshot is empty.
+        """
+        if not self._count:
+            return None
+        return self.get(random.randrange(self._count))
+
+    def _close_map(self) -> None:
+        if self._map is None:
+            return
+        # exported views must be released before the map is closed
+        self._ids.release()
+        self._offsets.release()
+        self._map.close()
+
+    def close(self) -> None:
+        """Unmaps the snapshot."""
+        self._close_map()
+        self._map = None
+        self._count = 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default=constants.DB_NAME)
+    parser.add_argument(
+        '--output', default=constants.SNAPSHOT_PATH,
+        help='The path of the snapshot file'
+    )
+    args = parser.parse_args()
+    count = build_snapshot(args.db, args.output)
+    print(f'Written {count} approved predictions to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+This module provides a low-overhead async-aware sampling profiler
+for the running bot.
+
+While running, the profiler:
+- samples the stacks of every thread (the event loop and the executor
+  threads running SQLite queries) from a background thread and dumps
+  them in the collapsed format understood by flamegraph.pl and
+  speedscope;
+- wraps every task created on the event loop and measures wall and CPU
+  time of every step the coroutine runs on the loop, grouped by
+  the bot coroutine (e.g. KindPredictionsBot.inline_query) it ran for.
+"""
+
+import asyncio
+import collections.abc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import setup_logger
+
+# frames of files in this directory are attributed to the bot itself
+BOT_SOURCES_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_STACK_DEPTH = 128
+
+
+class _CoroutineStats:
+    __slots__ = ('steps', 'wall', 'cpu')
+
+    def __init__(self):
+        self.steps = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+def _owner(coro) -> str:
+    """
+    Walks the chain of awaited coroutines and returns the qualified name
+    of the innermost one that belongs to the bot sources, or the name of
+    the outermost coroutine when there is none.
+    """
+    owner = getattr(coro, '__qualname__', type(coro).__name__)
+    while coro is not None:
+        code = getattr(coro, 'cr_code', None)
+        if code is not None and code.co_filename.startswith(BOT_SOURCES_DIR):
+            owner = coro.__qualname__
+        coro = getattr(coro, 'cr_await', None)
+    return owner
+
+
+class _TimedCoroutine(collections.abc.Coroutine):
+    """Coroutine wrapper measuring every step it runs on the loop."""
+
+    __slots__ = ('_coro', '_stats')
+
+    def __init__(
+        self, coro, stats: Dict[str, _CoroutineStats]
+    ):
+        self._coro = coro
+        self._stats = stats
+
+    def _step(self, method: Callable, *args):
+        owner = _owner(self._coro)
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            return method(*args)
+        finally:
+            stats = self._stats[owner]
+            stats.steps += 1
+            stats.wall += time.perf_counter() - wall_started
+            stats.cpu += time.thread_time() - cpu_started
+
+    def send(self, value):
+        return self._step(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+
+class SamplingProfiler:
+    """
+    Samples thread stacks and measures coroutine steps while running.
+
+    Attributes:
+        interval (float): Seconds between stack samples.
+        output_dir (str): The directory the profiles are written to.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(
+        self, interval: float = 0.005, output_dir: str = 'logs',
+        logging_level: int = logging.INFO
+    ):
+        self.interval = interval
+        self.output_dir = output_dir
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._previous_task_factory = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampling = threading.Event()
+        self._stop_handle: Optional[asyncio.TimerHandle] = None
+        self._stacks: Counter = Counter()
+        self._coroutines: Dict[str, _CoroutineStats] = (
+            defaultdict(_CoroutineStats)
+        )
+        self._started_at = 0.0
+        self._samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    def start(
+        self, loop: asyncio.AbstractEventLoop,
+        duration: Optional[float] = None
+    ) -> None:
+        """
+        Starts profiling.
+
+        :param loop: The event loop the bot runs on.
+        :param duration: Stop and dump automatically after this many
+            seconds. Runs until stop() when None.
+        :return: None
+        """
+        if self.running:
+            return
+        self._loop = loop
+        self._stacks = Counter()
+        self._coroutines = defaultdict(_CoroutineStats)
+        self._samples = 0
+        self._started_at = time.perf_counter()
+
+        self._previous_task_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name='SamplingProfiler', daemon=True
+        )
+        self._sampler.start()
+        if duration:
+            self._stop_handle = loop.call_later(duration, self.stop)
+        self.logger.info(
+            'Profiling started (interval=%ss, duration=%s)',
+            self.interval, duration
+        )
+
+    def stop(self) -> Optional[Tuple[str, str]]:
+        """
+        Stops profiling and dumps the results.
+
+        :return: Paths of the collapsed stacks and the coroutine
+            breakdown files, or None if the profiler was not running.
+        """
+        if not self.running:
+            return None
+        self._stop_sampling.set()
+        self._sampler.join()
+        self._sampler = None
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+        if self._loop.get_task_factory() == self._task_factory:
+            self._loop.set_task_factory(self._previous_task_factory)
+        paths = self._dump(time.perf_counter() - self._started_at)
+        self.logger.info('Profiling stopped, written %s and %s', *paths)
+        return paths
+
+    def _task_factory(self, loop, coro, **kwargs) -> asyncio.Task:
+        if self._previous_task_factory is not None:
+            return self._previous_task_factory(
+                loop, _TimedCoroutine(coro, self._coroutines), **kwargs
+            )
+        return asyncio.Task(
+            _TimedCoroutine(coro, self._coroutines), loop=loop, **kwargs
+        )
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.interval):
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self._stacks[
+                    self._collapsed(names.get(thread_id, thread_id), frame)
+                ] += 1
+            self._samples += 1
+
+    @staticmethod
+    def _collapsed(thread_name, frame) -> str:
+        stack: List[str] = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            name = getattr(code, 'co_qualname', code.co_name)
+            stack.append(
+                f'{name} '
+                f'({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            )
+            frame = frame.f_back
+        stack.append(str(thread_name))
+        # collapsed format is root first, frames separated by semicolons
+        return ';'.join(reversed(stack)).replace(' ', '_')
+
+    def _dump(self, elapsed: float) -> Tuple[str, str]:
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        prefix = os.path.join(
+            self.output_dir,
+            f'profile_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        )
+        stacks_path = f'{prefix}.collapsed'
+        with open(stacks_path, 'w', encoding='utf-8') as stacks_file:
+            for stack, count in self._stacks.most_common():
+                stacks_file.write(f'{stack} {count}\n')
+
+        coroutines_path = f'{prefix}_coroutines.txt'
+        with open(coroutines_path, 'w', encoding='utf-8') as report_file:
+            report_file.write(
+                f'Profiled {elapsed:.2f}s, {self._samples} stack samples\n'
+                f'{"coroutine":<70} {"steps":>8} {"wall ms":>10} '
+                f'{"cpu ms":>10} {"loop %":>7}\n'
+            )
+            for owner, stats in sorted(
+                self._coroutines.items(), key=lambda item: -item[1].wall
+            ):
+                report_file.write(
+                    f'{owner[:70]:<70} {stats.steps:>8} '
+                    f'{stats.wall * 1000:>10.1f} {stats.cpu * 1000:>10.1f} '
+                    f'{stats.wall / elapsed * 100 if elapsed else 0:>7.2f}\n'
+                )
+        return stacks_path, coroutines_path
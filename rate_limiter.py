@@ -0,0 +1,94 @@
+"""
+This module provides in-memory token bucket rate limiting.
+
+Every key (e.g. a user id) has a bucket of `burst` tokens refilled at
+`rate` tokens per second, an action takes one token. A bucket is kept
+only while it is not full: once it has refilled it behaves exactly like
+a missing one, so evict() drops it and memory stays proportional to
+the recently active keys.
+"""
+
+import time
+from collections import Counter
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket rate limiter for many keys.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (float): Capacity of a bucket.
+        violations (Counter): Rejected actions per key since
+            the last take_violations().
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.violations: Counter = Counter()
+        # key -> (tokens, monotonic time of the last update)
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def allow(self, key: Hashable = None, now: Optional[float] = None) -> bool:
+        """
+        Takes a token from the bucket of the key.
+
+        :param key: The key to limit, None for a global limit.
+        :param now: time.monotonic() of the action.
+        :return: True if the action is allowed, False if it is rate
+            limited (and counted as a violation).
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.violations[key] += 1
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def refund(self, key: Hashable = None, now: Optional[float] = None) -> None:
+        """
+        Gives back the token taken by allow() for an action that was
+        not carried out after all, e.g. refused by another limiter.
+
+        :param key: The key the token was taken for.
+        :param now: time.monotonic() of the refund.
+        :return: None
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        self._buckets[key] = (
+            min(self.burst, tokens + (now - updated) * self.rate + 1), now
+        )
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Drops the buckets that have refilled completely.
+
+        :param now: time.monotonic() of the eviction.
+        :return: The number of dropped buckets.
+        """
+        now = time.monotonic() if now is None else now
+        idle = [
+            key for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate >= self.burst
+        ]
+        for key in idle:
+            del self._buckets[key]
+        return len(idle)
+
+    def take_violations(self) -> Counter:
+        """
+        Returns the violations counted so far and starts counting anew.
+
+        :return: Rejected actions per key.
+        """
+        violations, self.violations = self.violations, Counter()
+        return violations
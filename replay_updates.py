@@ -0,0 +1,151 @@
+"""
+Replays a recording made with `bot.py --record_updates` into
+KindPredictionsBot handlers against a scratch database and a fake
+Bot API, to reproduce load incidents offline.
+
+Usage:
+    python replay_updates.py updates.jsonl.gz --speed 10
+    python replay_updates.py updates.jsonl.gz --speed 0 --db replay.db
+"""
+
+import argparse
+import asyncio
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot import KindPredictionsBot, add_handlers
+import constants
+from fake_bot_api import FAKE_BOT_TOKEN, FakeBotAPIRequest
+from update_processor import OrderedUpdateProcessor
+from update_recorder import read_recording
+
+
+async def replay(
+    recording: str, speed: float, db_name: str, latency: float,
+    profile: bool = False
+) -> None:
+    """
+    Feeds the recorded updates to the bot handlers.
+
+    :param recording: The path of the recording.
+    :param speed: Replay speed multiplier, 0 replays as fast as possible.
+    :param db_name: The scratch database to run against.
+    :param latency: Artificial latency of every fake Bot API call,
+        in seconds.
+    :param profile: Profile the bot for the whole replay.
+    :return: None
+    """
+    bot = KindPredictionsBot(
+        logging_level=logging.WARNING, test_run=True, db_name=db_name,
+        profile_duration=0 if profile else None,
+        # replays must not mix into the analytics of the production bot
+        analytics_db=None
+    )
+    request = FakeBotAPIRequest(latency=latency)
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeBotAPIRequest())
+        .concurrent_updates(OrderedUpdateProcessor(
+            constants.MAX_CONCURRENT_UPDATES, constants.MAX_PENDING_UPDATES
+        ))
+        .build()
+    )
+    add_handlers(application, bot)
+
+    replayed = 0
+    async with application:
+        # post_init/post_shutdown are only called by run_polling
+        await bot.post_init(application)
+        await application.start()
+        started = time.perf_counter()
+        first_ts: Optional[float] = None
+        for ts, update_dict in read_recording(recording):
+            if first_ts is None:
+                first_ts = ts
+            if speed > 0:
+                delay = (ts - first_ts) / speed - (
+                    time.perf_counter() - started
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await application.update_queue.put(
+                Update.de_json(update_dict, application.bot)
+            )
+            replayed += 1
+        await application.update_queue.join()
+        # waits for the non-blocking handlers as well
+        await application.stop()
+        elapsed = time.perf_counter() - started
+        await bot.post_shutdown(application)
+
+    print(
+        f'Replayed {replayed} updates in {elapsed:.2f}s '
+        f'({replayed / elapsed if elapsed else 0:.1f} updates/s)'
+    )
+    for endpoint, count in request.calls.most_common():
+        print(f'  {endpoint}: {count}')
+
+
+def copy_database(source: str, target: str) -> None:
+    """
+    Copies a database, which may be in use by the bot, with SQLite's
+    backup API: unlike a copy of the file it includes the commits still
+    in the -wal file and is consistent while the bot writes.
+
+    :param source: The database to copy.
+    :param target: The database to overwrite.
+    :return: None
+    """
+    with closing(
+        sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+    ) as source_connection:
+        with closing(sqlite3.connect(target)) as target_connection:
+            source_connection.backup(target_connection)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', help='Path of the .jsonl.gz recording')
+    parser.add_argument(
+        '--speed', type=float, default=1.0,
+        help='Replay speed: 1, 10, ... or 0 for max speed'
+    )
+    parser.add_argument(
+        '--db', default='replay.db',
+        help='Scratch database, created from scratch if it does not exist'
+    )
+    parser.add_argument(
+        '--copy_db',
+        help='Database to copy into the scratch database before replaying'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Latency of every fake Bot API call, in seconds'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Profile the bot during the replay, dumps to logs/'
+    )
+    args = parser.parse_args()
+
+    if args.copy_db:
+        if Path(args.copy_db).resolve() == Path(args.db).resolve():
+            parser.error('--copy_db and --db must be different files')
+        copy_database(args.copy_db, args.db)
+
+    asyncio.run(replay(
+        args.recording, args.speed, args.db, args.latency, args.profile
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+This module provides the storage interface of the bot.
+
+PredictionStorage is what the handlers need from a storage backend:
+predictions and their moderation, users and their statistic, pools,
+the leaderboard and the persistent bot state. PredictionStorageAsync
+adds the *_async counterparts the handlers call, which run the sync
+methods on the executor of the backend.
+
+Backends:
+- DBTools / DBToolsAsync (db_tools.py), SQLite, the production one;
+- MemoryStorage / MemoryStorageAsync (memory_storage.py), plain
+  Python structures for tests and ephemeral benchmark runs.
+
+tests/test_storage_conformance.py checks that every backend behaves
+the same and benchmarks/storage_bench.py compares their speed.
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from enum import Enum
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import constants
+
+
+class ApprovalStates(Enum):
+    APPROVED = 'approved'
+    NOT_APPROVED = 'not approved'
+    REJECTED = 'rejected'
+    INAPPROPRIATE = 'inappropriate'
+
+
+class UserStates(Enum):
+    ACTIVE = 'active'
+    INACTIVE = 'inactive'
+
+
+class StorageError(Exception):
+    """Base of the errors every backend raises the same way."""
+
+
+class DuplicateUserError(StorageError):
+    """Raised by add_user for a user that already exists."""
+
+
+# the fields of a prediction row, in the order get_prediction_by_id
+# and get_user_predictions return them
+PREDICTION_COLUMNS: Tuple[str, ...] = (
+    'prediction_id', 'prediction_text', 'approval_state', 'user_id',
+    'state_changed_at', 'duplicate_of', 'moderation_priority', 'mod_seq',
+    'pool_id',
+)
+USER_COLUMNS: Tuple[str, ...] = ('user_id', 'user_name', 'state')
+
+
+class PredictionStorage(ABC):
+    """
+    The storage the bot handlers work with.
+
+    Attributes:
+        DEFAULT_POOL_ID (int): The pool of chats without a pool
+            of their own.
+        DEFAULT_POOL_NAME (str): The name of the default pool.
+        LEADERBOARD_PERIODS (tuple): The periods of get_leaderboard.
+        USERS_TABLE_NAME (str): The iter_table name of the users.
+        PREDICTIONS_TABLE_NAME (str): The iter_table name
+            of the predictions.
+    """
+
+    DEFAULT_POOL_ID = 0
+    DEFAULT_POOL_NAME = 'default'
+    LEADERBOARD_PERIODS: Tuple[str, ...] = ('all', 'month', 'week')
+    USERS_TABLE_NAME = 'users'
+    PREDICTIONS_TABLE_NAME = 'predictions'
+
+    @abstractmethod
+    def get_random_approved_prediction(
+        self, pool_id: int = DEFAULT_POOL_ID
+    ) -> Union[str, None]:
+        """
+        :param pool_id: The ID of the pool to choose from.
+        :return: The text of a random approved prediction of the pool,
+            or None if there are none.
+        """
+
+    @abstractmethod
+    def get_random_approved_item(
+        self, pool_id: int = DEFAULT_POOL_ID
+    ) -> Optional[Tuple[int, str]]:
+        """
+        :param pool_id: The ID of the pool to choose from.
+        :return: (prediction id, prediction text) of a random approved
+            prediction of the pool, or None if there are none.
+        """
+
+    @abstractmethod
+    def get_prediction_by_id(
+        self, prediction_id: int
+    ) -> Union[Tuple, None]:
+        """
+        :param prediction_id: The ID of the prediction.
+        :return: The prediction row (see PREDICTION_COLUMNS), or None.
+        """
+
+    @abstractmethod
+    def update_prediction_status(
+        self, prediction_id: int, new_status: str
+    ) -> None:
+        """
+        Sets the approval state of a prediction, a missing one is
+        ignored.
+
+        :param prediction_id: The ID of the prediction.
+        :param new_status: The new approval state.
+        :return: None
+        """
+
+    @abstractmethod
+    def get_user_predictions(self, user_id: int) -> List[Tuple]:
+        """
+        :param user_id: The ID of the user.
+        :return: The prediction rows of the user by prediction ID.
+        """
+
+    @abstractmethod
+    def get_user_statistic(self, user_id: int) -> List[Tuple]:
+        """
+        :param user_id: The ID of the user.
+        :return: A list of (approval state, number of predictions)
+            tuples for the states the user has predictions in,
+            in ApprovalStates order.
+        """
+
+    @abstractmethod
+    def get_leaderboard(
+        self, period: str, limit: int = constants.LEADERBOARD_SIZE
+    ) -> List[Tuple]:
+        """
+        :param period: One of LEADERBOARD_PERIODS, ValueError otherwise.
+        :param limit: The number of users to return.
+        :return: A list of (user_id, user_name, approved) tuples of
+            the users with approvals in the current period, the best
+            first.
+        """
+
+    @abstractmethod
+    def user_exists(self, user_id: int) -> bool:
+        """
+        :param user_id: The ID of the user.
+        :return: True if the user was added.
+        """
+
+    @abstractmethod
+    def add_user(self, user_id: int, user_name: str) -> None:
+        """
+        Adds an active user, the user must not exist.
+
+        :param user_id: The ID of the user.
+        :param user_name: Telegram username of the user.
+        :return: None, raises DuplicateUserError if the user exists.
+        """
+
+    @abstractmethod
+    def add_prediction(
+        self, prediction_text: str, user_id: int,
+        approval_state: str = ApprovalStates.NOT_APPROVED.value,
+        duplicate_of: Optional[int] = None, moderation_priority: int = 0,
+        pool_id: int = DEFAULT_POOL_ID
+    ) -> int:
+        """
+        Adds a prediction.
+
+        :return: The ID of the added prediction, greater than the IDs
+            of all the earlier ones.
+        """
+
+    @abstractmethod
+    def get_unapproved_predictions(self) -> List[Tuple]:
+        """
+        :return: (prediction_id, prediction_text, duplicate_of, pool_id)
+            tuples of the unapproved predictions, by moderation priority
+            (higher first) and prediction ID.
+        """
+
+    @abstractmethod
+    def get_unapproved_predictions_since(
+        self, prediction_id: int
+    ) -> Tuple[List[Tuple], int]:
+        """
+        :param prediction_id: The last already seen prediction ID.
+        :return: The get_unapproved_predictions tuples of the predictions
+            after prediction_id and the number of the older ones.
+        """
+
+    @abstractmethod
+    def get_state(
+        self, key: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        :param key: The key of the value.
+        :param default: Returned if the key is not set.
+        :return: A value of the persistent bot state.
+        """
+
+    @abstractmethod
+    def set_state(self, key: str, value: Optional[str]) -> None:
+        """
+        Sets a value of the persistent bot state.
+
+        :param key: The key of the value.
+        :param value: The value.
+        :return: None
+        """
+
+    @abstractmethod
+    def get_pools(self) -> Dict[str, int]:
+        """
+        :return: A {pool name: pool ID} dict of all the pools,
+            the default one included.
+        """
+
+    @abstractmethod
+    def get_pool_name(self, pool_id: int) -> Optional[str]:
+        """
+        :param pool_id: The ID of the pool.
+        :return: The name, or None if there is no such pool.
+        """
+
+    @abstractmethod
+    def add_pool(self, name: str) -> int:
+        """
+        Adds a prediction pool unless there is one with the name.
+
+        :param name: The name of the pool.
+        :return: The ID of the pool.
+        """
+
+    @abstractmethod
+    def get_chat_pool(self, chat_id: int) -> int:
+        """
+        :param chat_id: The ID of the chat.
+        :return: The ID of the pool of the chat, the default pool
+            for chats without one.
+        """
+
+    @abstractmethod
+    def set_chat_pool(self, chat_id: int, pool_id: int) -> None:
+        """
+        Sets the prediction pool of a chat.
+
+        :param chat_id: The ID of the chat.
+        :param pool_id: The ID of the pool.
+        :return: None
+        """
+
+    @abstractmethod
+    def iter_table(self, table_name: str) -> Iterator[Dict]:
+        """
+        Streams all users (USER_COLUMNS) or predictions
+        (PREDICTION_COLUMNS) as dicts, ValueError for other names.
+
+        :param table_name: USERS_TABLE_NAME or PREDICTIONS_TABLE_NAME.
+        :return: An iterator of {column: value} dicts.
+        """
+
+
+class PredictionStorageAsync(PredictionStorage, ABC):
+    """
+    A PredictionStorage with *_async counterparts of its methods,
+    which run the sync ones on the executor, so the event loop never
+    waits for the storage.
+
+    Attributes:
+        executor (Executor): The executor the methods run on,
+            set by the backend.
+    """
+
+    executor: Executor
+
+    async def _run(self, method: Callable, *args):
+        # imported here, the sync methods (e.g. the db_tools.py command
+        # line) do without asyncio, which takes longer to import than
+        # the rest of the storage
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, method, *args
+        )
+
+    async def get_random_approved_prediction_async(
+        self, pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> Union[str, None]:
+        return await self._run(self.get_random_approved_prediction, pool_id)
+
+    async def get_random_approved_item_async(
+        self, pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> Optional[Tuple[int, str]]:
+        return await self._run(self.get_random_approved_item, pool_id)
+
+    async def get_prediction_by_id_async(
+        self, prediction_id: int
+    ) -> Union[Tuple, None]:
+        return await self._run(self.get_prediction_by_id, prediction_id)
+
+    async def update_prediction_status_async(
+        self, prediction_id: int, new_status: str
+    ) -> None:
+        return await self._run(
+            self.update_prediction_status, prediction_id, new_status
+        )
+
+    async def get_user_predictions_async(self, user_id: int) -> List[Tuple]:
+        return await self._run(self.get_user_predictions, user_id)
+
+    async def get_user_statistic_async(self, user_id: int) -> List[Tuple]:
+        return await self._run(self.get_user_statistic, user_id)
+
+    async def get_leaderboard_async(
+        self, period: str, limit: int = constants.LEADERBOARD_SIZE
+    ) -> List[Tuple]:
+        return await self._run(self.get_leaderboard, period, limit)
+
+    async def user_exists_async(self, user_id: int) -> bool:
+        return await self._run(self.user_exists, user_id)
+
+    async def add_user_async(self, user_id: int, user_name: str) -> None:
+        return await self._run(self.add_user, user_id, user_name)
+
+    async def add_prediction_async(
+        self, prediction_text: str, user_id: int,
+        approval_state: str = ApprovalStates.NOT_APPROVED.value,
+        duplicate_of: Optional[int] = None, moderation_priority: int = 0,
+        pool_id: int = PredictionStorage.DEFAULT_POOL_ID
+    ) -> int:
+        return await self._run(
+            self.add_prediction, prediction_text, user_id, approval_state,
+            duplicate_of, moderation_priority, pool_id
+        )
+
+    async def get_unapproved_predictions_async(self) -> List[Tuple]:
+        return await self._run(self.get_unapproved_predictions)
+
+    async def get_unapproved_predictions_since_async(
+        self, prediction_id: int
+    ) -> Tuple[List[Tuple], int]:
+        return await self._run(
+            self.get_unapproved_predictions_since, prediction_id
+        )
+
+    async def get_state_async(
+        self, key: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        return await self._run(self.get_state, key, default)
+
+    async def set_state_async(self, key: str, value: Optional[str]) -> None:
+        return await self._run(self.set_state, key, value)
+
+    async def get_pools_async(self) -> Dict[str, int]:
+        return await self._run(self.get_pools)
+
+    async def get_pool_name_async(self, pool_id: int) -> Optional[str]:
+        return await self._run(self.get_pool_name, pool_id)
+
+    async def add_pool_async(self, name: str) -> int:
+        return await self._run(self.add_pool, name)
+
+    async def get_chat_pool_async(self, chat_id: int) -> int:
+        return await self._run(self.get_chat_pool, chat_id)
+
+    async def set_chat_pool_async(self, chat_id: int, pool_id: int) -> None:
+        return await self._run(self.set_chat_pool, chat_id, pool_id)
@@ -0,0 +1,28 @@
+"""
+Fixtures shared by the tests.
+
+Run the tests from the repository root:
+    python -m pytest
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from db_tools import DBTools
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch: pytest.MonkeyPatch) -> Path:
+    # DBTools reads default_predictions.sql from the working directory
+    monkeypatch.chdir(ROOT)
+    return ROOT
+
+
+@pytest.fixture
+def db_tools(tmp_path: Path) -> DBTools:
+    """A fresh database with the default predictions."""
+    return DBTools(str(tmp_path / 'test.db'), logging_level=logging.WARNING)
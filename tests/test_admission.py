@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from admission import AdmissionController, Overloaded, Priority
+from db_tools import DBToolsAsync
+
+
+def test_queue_order_and_shedding() -> None:
+    async def scenario() -> List[str]:
+        admission = AdmissionController(1)
+        order: List[str] = []
+
+        async def operation(name: str, priority: Priority) -> None:
+            try:
+                async with admission.admit(priority):
+                    order.append(name)
+                    await asyncio.sleep(0)
+            except Overloaded:
+                order.append(f'{name}:shed')
+
+        await admission.acquire(Priority.READ)
+        tasks = [
+            asyncio.create_task(operation(name, priority))
+            for name, priority in (
+                ('read', Priority.READ), ('inline', Priority.INLINE),
+                ('write', Priority.WRITE), ('second read', Priority.READ),
+            )
+        ]
+        await asyncio.sleep(0)
+        assert admission.queued == 3
+        admission.release()
+        await asyncio.gather(*tasks)
+        assert (admission.in_flight, admission.queued) == (0, 0)
+        stats = admission.stats()
+        assert stats['shed'] == {'INLINE': 1}
+        assert stats['admitted'] == {'READ': 3, 'WRITE': 1}
+        assert stats['max_queued'] == 3
+        return order
+
+    assert asyncio.run(scenario()) == [
+        'inline:shed', 'write', 'read', 'second read'
+    ]
+
+
+def test_cancelled_waiters_release_their_slots() -> None:
+    async def scenario() -> None:
+        admission = AdmissionController(1)
+        await admission.acquire(Priority.WRITE)
+        waiting = asyncio.create_task(admission.acquire(Priority.READ))
+        handed_over = asyncio.create_task(admission.acquire(Priority.READ))
+        await asyncio.sleep(0)
+        assert admission.queued == 2
+        # cancelled while queued
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert admission.queued == 1
+        # cancelled after the slot was handed over, before it ran
+        admission.release()
+        handed_over.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await handed_over
+        assert (admission.in_flight, admission.queued) == (0, 0)
+        # nothing leaked, the only slot is free
+        await asyncio.wait_for(admission.acquire(Priority.INLINE), 1)
+        assert admission.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_maintenance_is_not_admitted(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        db_tools = DBToolsAsync(
+            str(tmp_path / 'test.db'), logging_level=logging.WARNING,
+            max_in_flight=1
+        )
+        # the only slot is taken, a backup must not wait for it
+        await db_tools.admission.acquire(Priority.WRITE)
+        backup = await asyncio.wait_for(
+            db_tools.backup_async(
+                backup_dir=str(tmp_path / 'backups'), step_sleep=0
+            ), 10
+        )
+        assert Path(backup['path']).exists()
+        with pytest.raises(Overloaded):
+            await db_tools.get_random_approved_item_async()
+        db_tools.admission.release()
+        assert db_tools.admission.stats()['admitted'] == {'WRITE': 1}
+        assert db_tools.maintenance_stats() == {
+            'pending': {}, 'runs': {'backup': 1}
+        }
+        db_tools.executor.shutdown()
+        db_tools.maintenance_executor.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List
+
+from db_tools import ApprovalStates, DBTools
+
+APPROVED = ApprovalStates.APPROVED.value
+NOT_APPROVED = ApprovalStates.NOT_APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+INAPPROPRIATE = ApprovalStates.INAPPROPRIATE.value
+
+
+def _changed_days_ago(db_tools: DBTools, prediction_id: int, days: int):
+    db_tools.execute_query(
+        "UPDATE predictions SET state_changed_at = datetime('now', ?) "
+        'WHERE prediction_id = ?', (f'-{days} days', prediction_id)
+    )
+
+
+def _archive(db_tools: DBTools, archive_db_name: str) -> Dict:
+    return db_tools.archive_predictions(
+        retention_days=30, archive_db_name=archive_db_name, batch_size=2,
+        batch_pause=0
+    )
+
+
+def _archived_ids(archive_db_name: str) -> List[int]:
+    with closing(sqlite3.connect(archive_db_name)) as connection:
+        return sorted(row[0] for row in connection.execute(
+            'SELECT prediction_id FROM predictions'
+        ))
+
+
+def test_archive_retention_window(db_tools: DBTools, tmp_path: Path) -> None:
+    archive_db_name = str(tmp_path / 'archive.db')
+    ids = {
+        (state, days): db_tools.add_prediction(f'{state} {days}', 2, state)
+        for state in (APPROVED, NOT_APPROVED, REJECTED, INAPPROPRIATE)
+        for days in (0, 29, 31, 365)
+    }
+    for (_, days), prediction_id in ids.items():
+        _changed_days_ago(db_tools, prediction_id, days)
+    user_stats = db_tools.get_user_statistic(2)
+    expected = sorted(
+        prediction_id for (state, days), prediction_id in ids.items()
+        if state in (REJECTED, INAPPROPRIATE) and days > 30
+    )
+
+    assert _archive(db_tools, archive_db_name)['archived'] == len(expected)
+    assert _archived_ids(archive_db_name) == expected
+    for (state, days), prediction_id in ids.items():
+        kept = db_tools.get_prediction_by_id(prediction_id) is not None
+        assert kept == (prediction_id not in expected), (state, days)
+    # the statistic is kept for the lifetime
+    assert db_tools.get_user_statistic(2) == user_stats
+    assert _archive(db_tools, archive_db_name)['archived'] == 0
+
+
+def test_migration_backfills_state_changed_at(tmp_path: Path) -> None:
+    db_name = str(tmp_path / 'old.db')
+    # predictions moderated before state_changed_at was tracked
+    with closing(sqlite3.connect(db_name)) as connection:
+        connection.execute(DBTools.CREATE_USERS_TABLE_QUERY)
+        connection.execute(DBTools.CREATE_PREDICTIONS_TABLE_QUERY)
+        connection.executemany(
+            'INSERT INTO predictions (prediction_text, approval_state, '
+            'user_id) VALUES (?, ?, 2)',
+            [(state, state) for state in (APPROVED, REJECTED, INAPPROPRIATE)]
+        )
+        connection.commit()
+    db_tools = DBTools(db_name, logging_level=logging.WARNING)
+    assert sorted(db_tools.fetch_all(
+        'SELECT approval_state, state_changed_at IS NULL FROM predictions'
+    )) == [(APPROVED, 1), (INAPPROPRIATE, 0), (REJECTED, 0)]
+    # the archive keeps them for the retention period from the migration
+    archive_db_name = str(tmp_path / 'archive.db')
+    assert _archive(db_tools, archive_db_name)['archived'] == 0
+    assert db_tools.get_leaderboard('month', 10) == []
+    assert db_tools.get_leaderboard('all', 10) == [(2, None, 1)]
@@ -0,0 +1,51 @@
+import random
+
+from compact_store import CompactPredictionStore
+from db_tools import ApprovalStates
+
+APPROVED = ApprovalStates.APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+
+
+def test_memory_does_not_grow_with_the_ids() -> None:
+    small = CompactPredictionStore([(1, 'prediction', APPROVED)])
+    large = CompactPredictionStore([(50_000_000, 'prediction', APPROVED)])
+    assert large.memory_usage() == small.memory_usage() < 1000
+    assert 50_000_000 in large and 1 not in large
+
+
+def test_matches_a_dict() -> None:
+    rnd = random.Random(0)
+    store = CompactPredictionStore()
+    expected = {}
+    for step in range(3000):
+        prediction_id = rnd.choice((rnd.randint(1, 200), 10 ** 9 + step))
+        action = rnd.random()
+        if action < 0.6:
+            text = f'text {rnd.randint(1, 3)}'
+            state = rnd.choice((APPROVED, REJECTED))
+            store.add(prediction_id, text, state)
+            expected[prediction_id] = (text, state)
+        elif action < 0.8:
+            store.set_state(prediction_id, REJECTED)
+            if prediction_id in expected:
+                text, _ = expected[prediction_id]
+                expected[prediction_id] = (text, REJECTED)
+        else:
+            store.remove(prediction_id)
+            expected.pop(prediction_id, None)
+        if step % 1000 == 999:
+            store.compact()
+            assert store.dead_rows == 0
+    assert len(store) == len(expected)
+    for prediction_id, prediction in expected.items():
+        assert store.get(prediction_id) == prediction
+    assert store.get(-1) is None and store.get(10 ** 12) is None
+    assert sorted(store.items(APPROVED)) == sorted(
+        (prediction_id, text)
+        for prediction_id, (text, state) in expected.items()
+        if state == APPROVED
+    )
+    assert store.count(REJECTED) == sum(
+        state == REJECTED for _, state in expected.values()
+    )
@@ -0,0 +1,158 @@
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import List, Tuple
+
+from db_tools import ApprovalStates, DBTools
+
+APPROVED = ApprovalStates.APPROVED.value
+NOT_APPROVED = ApprovalStates.NOT_APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+INAPPROPRIATE = ApprovalStates.INAPPROPRIATE.value
+
+
+def _user_stats(db_tools: DBTools) -> List[Tuple]:
+    return sorted(db_tools.fetch_all(
+        'SELECT user_id, submitted, approved, not_approved, rejected, '
+        'inappropriate FROM user_stats'
+    ))
+
+
+def _recount_user_stats(db_tools: DBTools) -> List[Tuple]:
+    return sorted(db_tools.fetch_all(
+        'SELECT user_id, COUNT(*), '
+        f"SUM(approval_state = '{APPROVED}'), "
+        f"SUM(approval_state = '{NOT_APPROVED}'), "
+        f"SUM(approval_state = '{REJECTED}'), "
+        f"SUM(approval_state = '{INAPPROPRIATE}') "
+        'FROM predictions WHERE user_id IS NOT NULL GROUP BY user_id'
+    ))
+
+
+def _leaderboard(db_tools: DBTools) -> List[Tuple]:
+    return sorted(db_tools.fetch_all(
+        'SELECT period, period_start, user_id, approved '
+        'FROM approved_leaderboard WHERE approved > 0'
+    ))
+
+
+def _recount_leaderboard(db_tools: DBTools) -> List[Tuple]:
+    return sorted(db_tools.fetch_all(
+        "SELECT 'all', '', user_id, COUNT(*) FROM predictions "
+        f"WHERE approval_state = '{APPROVED}' AND user_id IS NOT NULL "
+        'GROUP BY user_id '
+        "UNION ALL SELECT 'month', strftime('%Y-%m', state_changed_at), "
+        'user_id, COUNT(*) FROM predictions '
+        f"WHERE approval_state = '{APPROVED}' AND user_id IS NOT NULL "
+        'AND state_changed_at IS NOT NULL GROUP BY 2, 3 '
+        "UNION ALL SELECT 'week', strftime('%Y-W%W', state_changed_at), "
+        'user_id, COUNT(*) FROM predictions '
+        f"WHERE approval_state = '{APPROVED}' AND user_id IS NOT NULL "
+        'AND state_changed_at IS NOT NULL GROUP BY 2, 3'
+    ))
+
+
+def _assert_aggregates_match(db_tools: DBTools) -> None:
+    assert _user_stats(db_tools) == _recount_user_stats(db_tools)
+    assert _leaderboard(db_tools) == _recount_leaderboard(db_tools)
+
+
+def _triggers(db_tools: DBTools) -> List[str]:
+    return sorted(row[0] for row in db_tools.fetch_all(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    ))
+
+
+def test_triggers_maintain_aggregates(db_tools: DBTools) -> None:
+    ids = [
+        db_tools.add_prediction(f'prediction {i}', user_id, state)
+        for i, (user_id, state) in enumerate([
+            (2, APPROVED), (2, NOT_APPROVED), (2, REJECTED),
+            (3, APPROVED), (3, NOT_APPROVED), (3, INAPPROPRIATE),
+            (None, APPROVED),
+        ])
+    ]
+    _assert_aggregates_match(db_tools)
+    db_tools.update_prediction_status(ids[1], APPROVED)
+    db_tools.update_prediction_status(ids[3], REJECTED)
+    db_tools.update_prediction_status(ids[4], INAPPROPRIATE)
+    db_tools.update_prediction_status(ids[0], APPROVED)
+    _assert_aggregates_match(db_tools)
+
+
+def test_bulk_import_maintains_aggregates(db_tools: DBTools) -> None:
+    triggers = _triggers(db_tools)
+    db_tools.add_prediction('before the import', 2, APPROVED)
+    max_mod_seq = db_tools.fetch_one(db_tools.GET_MAX_MOD_SEQ_QUERY)[0]
+    states = (APPROVED, NOT_APPROVED, REJECTED, INAPPROPRIATE)
+    predictions = [
+        {
+            'prediction_text': f'imported {i}',
+            'approval_state': states[i % len(states)],
+            'user_id': 2 + i % 5 if i % 7 else None,
+        }
+        for i in range(1000)
+    ]
+    totals = list(db_tools.import_predictions(predictions, chunk_size=300))
+    assert totals[-1] == (1000, 1000)
+    _assert_aggregates_match(db_tools)
+    assert _triggers(db_tools) == triggers
+    # the rows of a chunk share the mod_seq after the last one
+    mod_seqs = db_tools.fetch_all(
+        'SELECT mod_seq, COUNT(*) FROM predictions WHERE mod_seq > ? '
+        'GROUP BY mod_seq', (max_mod_seq, )
+    )
+    assert [count for _, count in mod_seqs] == [300, 300, 300, 100]
+    assert db_tools.fetch_one(
+        'SELECT COUNT(*) FROM predictions WHERE mod_seq IS NULL'
+    )[0] == 0
+    # the triggers maintain the aggregates again after the import
+    imported_id = db_tools.fetch_one(
+        "SELECT prediction_id FROM predictions "
+        "WHERE prediction_text = 'imported 1'"
+    )[0]
+    db_tools.update_prediction_status(imported_id, APPROVED)
+    db_tools.add_prediction('after the import', 3, APPROVED)
+    _assert_aggregates_match(db_tools)
+
+
+def test_migration_sets_state_changed_at_default(tmp_path: Path) -> None:
+    db_name = str(tmp_path / 'old.db')
+    # the predictions table the way databases of older versions have it
+    with closing(sqlite3.connect(db_name)) as connection:
+        connection.execute(DBTools.CREATE_USERS_TABLE_QUERY)
+        connection.execute(DBTools.CREATE_PREDICTIONS_TABLE_QUERY)
+        for column, column_type in DBTools.ADDED_PREDICTIONS_COLUMNS:
+            connection.execute(
+                f'ALTER TABLE predictions ADD COLUMN {column} {column_type}'
+            )
+        connection.execute(
+            'CREATE TRIGGER predictions_state_changed_at_insert '
+            'AFTER INSERT ON predictions '
+            'WHEN NEW.state_changed_at IS NULL BEGIN '
+            'UPDATE predictions SET state_changed_at = CURRENT_TIMESTAMP '
+            'WHERE prediction_id = NEW.prediction_id; END'
+        )
+        connection.execute(
+            "INSERT INTO predictions (prediction_text, approval_state) "
+            f"VALUES ('old', '{APPROVED}')"
+        )
+        connection.commit()
+    db_tools = DBTools(db_name, logging_level=logging.WARNING)
+    defaults = {
+        row[1]: row[4]
+        for row in db_tools.fetch_all('PRAGMA table_info(predictions)')
+    }
+    assert defaults['state_changed_at'] == 'CURRENT_TIMESTAMP'
+    assert 'predictions_state_changed_at_insert' not in _triggers(db_tools)
+    prediction_id = db_tools.add_prediction('new', 2)
+    assert db_tools.fetch_one(
+        'SELECT state_changed_at IS NOT NULL FROM predictions '
+        'WHERE prediction_id = ?', (prediction_id, )
+    ) == (1, )
+    assert db_tools.fetch_one(
+        'SELECT COUNT(*) FROM predictions WHERE mod_seq IS NULL'
+    ) == (0, )
+    assert db_tools.fetch_one('PRAGMA integrity_check') == ('ok', )
+
@@ -0,0 +1,94 @@
+import logging
+from pathlib import Path
+
+from db_tools import ApprovalStates, DBTools
+
+APPROVED = ApprovalStates.APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+
+
+def _count(db_tools: DBTools) -> int:
+    return db_tools.fetch_one(
+        f'SELECT COUNT(*) FROM {db_tools.PREDICTIONS_TABLE_NAME}'
+    )[0]
+
+
+def test_import_summary_counts_rows(db_tools: DBTools) -> None:
+    existing = db_tools.fetch_one(
+        f'SELECT prediction_text FROM {db_tools.PREDICTIONS_TABLE_NAME}'
+    )[0]
+    before = _count(db_tools)
+    predictions = [
+        {'prediction_text': 'first', 'approval_state': APPROVED,
+         'user_id': 1},
+        {'prediction_text': 'second', 'approval_state': REJECTED,
+         'user_id': 1},
+        # a duplicate within the import and one of the database
+        {'prediction_text': 'first', 'user_id': 2},
+        {'prediction_text': existing},
+        {'prediction_text': 'third', 'approval_state': APPROVED,
+         'user_id': '2'},
+    ]
+    totals = list(db_tools.import_predictions(predictions, chunk_size=2))
+    assert totals == [(2, 2), (4, 2), (5, 3)]
+    assert _count(db_tools) == before + 3
+
+
+def test_import_summary_with_ids(db_tools: DBTools) -> None:
+    taken_id = db_tools.add_prediction('taken', 1)
+    predictions = [
+        {'prediction_id': taken_id, 'prediction_text': 'skipped'},
+        {'prediction_id': 10 ** 6, 'prediction_text': 'kept',
+         'approval_state': APPROVED, 'user_id': 1},
+    ]
+    assert list(
+        db_tools.import_predictions(predictions, keep_ids=True)
+    ) == [(2, 1)]
+    assert db_tools.get_prediction_by_id(10 ** 6)[1] == 'kept'
+
+
+def test_import_users_summary(db_tools: DBTools) -> None:
+    db_tools.add_user(10 ** 9, 'existing')
+    users = [
+        {'user_id': 10 ** 9, 'user_name': 'existing'},
+        {'user_id': str(10 ** 9 + 1), 'user_name': 'new'},
+        {'user_id': 10 ** 9 + 2, 'user_name': 'banned', 'state': 'banned'},
+    ]
+    assert list(db_tools.import_users(users)) == [(3, 2)]
+
+
+def test_export_import_round_trip_keeps_pools(
+    db_tools: DBTools, tmp_path: Path
+) -> None:
+    pool_id = db_tools.add_pool('cats')
+    cat_id = db_tools.add_prediction('meow', 1, APPROVED, pool_id=pool_id)
+    db_tools.add_prediction('meow', 1, APPROVED)
+    exported = list(db_tools.iter_table(db_tools.PREDICTIONS_TABLE_NAME))
+
+    target = DBTools(
+        str(tmp_path / 'target.db'), logging_level=logging.WARNING
+    )
+    assert target.add_pool('cats') == pool_id
+    before = _count(target)
+    # the default predictions are already there, the rest is imported
+    # once, the same text into both pools
+    for _ in range(2):
+        list(target.import_predictions(exported))
+    assert _count(target) == before + 2
+    for row in exported:
+        if row['prediction_text'] != 'meow':
+            continue
+        assert target.fetch_one(
+            f'SELECT approval_state FROM {target.PREDICTIONS_TABLE_NAME} '
+            'WHERE prediction_text = ? AND pool_id = ?',
+            ('meow', row['pool_id'])
+        ) == (APPROVED, )
+    assert {
+        row['pool_id'] for row in exported
+        if row['prediction_text'] == 'meow'
+    } == {pool_id, db_tools.DEFAULT_POOL_ID}
+    assert target.get_random_approved_item(pool_id)[1] == 'meow'
+    assert list(target.import_predictions([
+        {'prediction_id': cat_id + 100, 'prediction_text': 'meow',
+         'pool_id': str(pool_id)},
+    ], keep_ids=True)) == [(1, 0)]
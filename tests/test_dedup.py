@@ -0,0 +1,18 @@
+from dedup import DuplicateIndex, shingles, signature
+
+
+def test_texts_without_word_characters_are_no_duplicates() -> None:
+    assert shingles('!!! 🙂 ...') == []
+    assert signature('🙂🙂') == []
+    index = DuplicateIndex(threshold=0.5)
+    index.add(1, '!!!')
+    index.add(2, 'Тебя ждёт удача!')
+    assert len(index) == 1
+    for text in ('!!!', '???', '🙂🙂', ''):
+        assert index.find_duplicate(text) is None
+    assert index.find_duplicate('тебя ждёт удача') == (2, 1.0)
+
+    index.build([(3, '???'), (4, 'Завтра будет солнечно'), (5, '—')])
+    assert len(index) == 1
+    assert index.find_duplicate('!!!') is None
+    assert index.find_duplicate('Завтра будет солнечно!') == (4, 1.0)
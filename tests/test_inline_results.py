@@ -0,0 +1,41 @@
+import json
+
+from inline_results import (
+    BUN_TITLE, PREDICTION_TITLE, InlineResultFactory, prediction_id_of,
+)
+
+
+def test_results_round_trip() -> None:
+    factory = InlineResultFactory()
+    text = 'Тебя ждёт "удача" на 100% \\ завтра\n'
+    bun, prediction = json.loads(factory.results((42, text)))
+    assert bun['type'] == prediction['type'] == 'article'
+    assert bun['title'] == BUN_TITLE
+    assert bun['input_message_content']['message_text'].endswith('% булка!')
+    assert prediction_id_of(bun['id']) is None
+    assert prediction['title'] == PREDICTION_TITLE
+    assert prediction['input_message_content']['message_text'] == text
+    assert prediction_id_of(prediction['id']) == 42
+
+
+def test_result_ids_are_unique() -> None:
+    factory = InlineResultFactory()
+    ids = [
+        article['id']
+        for _ in range(3)
+        for article in json.loads(factory.results((7, 'text')))
+    ]
+    assert len(set(ids)) == len(ids)
+    assert [prediction_id_of(result_id) for result_id in ids] == [
+        None, 7,
+    ] * 3
+
+
+def test_results_without_prediction() -> None:
+    articles = json.loads(InlineResultFactory().results(None))
+    assert [article['title'] for article in articles] == [BUN_TITLE]
+
+
+def test_unknown_result_ids() -> None:
+    for result_id in ('', 'p', 'p-1', 'px-1', 'q42-1', 'b3'):
+        assert prediction_id_of(result_id) is None
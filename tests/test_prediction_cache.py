@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import List
+
+from db_tools import ApprovalStates, DBTools
+from prediction_cache import ApprovedPredictionsCache
+
+APPROVED = ApprovalStates.APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+
+
+def _approved(db_tools: DBTools) -> List:
+    return sorted(db_tools.fetch_all(
+        DBTools.GET_APPROVED_PREDICTIONS_QUERY, (DBTools.DEFAULT_POOL_ID, )
+    ))
+
+
+def test_pools_are_recounted_only_after_deletions(db_tools: DBTools) -> None:
+    cache = ApprovedPredictionsCache(
+        db_tools.db_name, logging_level=logging.WARNING
+    )
+    statements: List[str] = []
+    # pylint: disable=protected-access
+    cache._connection.set_trace_callback(statements.append)
+
+    def recounts() -> int:
+        counted = sum(
+            'COUNT(*)' in statement and 'approval_state' in statement
+            for statement in statements
+        )
+        statements.clear()
+        return counted
+
+    def cached() -> List:
+        # pylint: disable=protected-access
+        return sorted(cache._stores[DBTools.DEFAULT_POOL_ID].items(APPROVED))
+
+    async def scenario() -> None:
+        await cache.load(DBTools.DEFAULT_POOL_ID)
+        await cache.refresh()
+        db_tools.add_prediction('suggested', 2)
+        approved_id = db_tools.add_prediction('approved', 2, APPROVED)
+        db_tools.add_prediction('rejected', 2, REJECTED)
+        recounts()
+        assert await cache.refresh() == {DBTools.DEFAULT_POOL_ID}
+        assert recounts() == 0
+        assert cached() == _approved(db_tools)
+
+        # archival-like deletions of predictions that are not approved
+        db_tools.execute_query(
+            'DELETE FROM predictions WHERE approval_state = ?', (REJECTED, )
+        )
+        assert await cache.refresh() == set()
+        assert recounts() == 0
+
+        db_tools.execute_query(
+            'DELETE FROM predictions WHERE prediction_id = ?',
+            (approved_id, )
+        )
+        assert await cache.refresh() == {DBTools.DEFAULT_POOL_ID}
+        assert recounts() == 1
+        assert cache.full_reloads == 1
+        assert cached() == _approved(db_tools)
+        assert approved_id not in [row[0] for row in cached()]
+
+        db_tools.add_prediction('after the deletion', 2)
+        await cache.refresh()
+        assert recounts() == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        cache.close()
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from db_tools import ApprovalStates, DBTools
+from prediction_snapshot import PredictionSnapshot, build_snapshot
+
+
+def _approved(db_tools: DBTools):
+    return sorted(db_tools.fetch_all(
+        DBTools.GET_APPROVED_PREDICTIONS_QUERY, (DBTools.DEFAULT_POOL_ID, )
+    ))
+
+
+def test_build_snapshot_from_database(
+    db_tools: DBTools, tmp_path: Path
+) -> None:
+    path = str(tmp_path / 'approved.snapshot')
+    db_tools.add_prediction('снапшот', 2, ApprovalStates.APPROVED.value)
+    assert build_snapshot(db_tools.db_name, path) == len(_approved(db_tools))
+    snapshot = PredictionSnapshot(path)
+    try:
+        assert sorted(
+            snapshot.get(index) for index in range(len(snapshot))
+        ) == _approved(db_tools)
+        assert snapshot.version == db_tools.fetch_one(
+            DBTools.GET_MAX_MOD_SEQ_QUERY
+        )[0]
+        assert not snapshot.reload()
+
+        pool_id = db_tools.add_pool('other')
+        db_tools.add_prediction(
+            'другой пул', 2, ApprovalStates.APPROVED.value, pool_id=pool_id
+        )
+        added_id = db_tools.add_prediction(
+            'новое', 2, ApprovalStates.APPROVED.value
+        )
+        build_snapshot(db_tools.db_name, path)
+        assert snapshot.reload()
+        items = [snapshot.get(index) for index in range(len(snapshot))]
+        assert (added_id, 'новое') in items
+        assert sorted(items) == _approved(db_tools)
+    finally:
+        snapshot.close()
@@ -0,0 +1,35 @@
+from rate_limiter import TokenBucketLimiter
+
+
+def test_refund_gives_the_token_back() -> None:
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+    assert limiter.allow(1, now=0)
+    assert limiter.allow(1, now=0)
+    assert not limiter.allow(1, now=0)
+    limiter.refund(1, now=0)
+    assert limiter.allow(1, now=0)
+    assert not limiter.allow(1, now=0)
+    assert limiter.take_violations() == {1: 2}
+
+
+def test_refund_does_not_overfill() -> None:
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+    assert limiter.allow(1, now=0)
+    limiter.refund(1, now=0)
+    limiter.refund(1, now=10)
+    assert limiter.evict(now=10) == 1
+    assert limiter.allow(1, now=10)
+    assert limiter.allow(1, now=10)
+    assert not limiter.allow(1, now=10)
+
+
+def test_global_refusal_keeps_the_user_token() -> None:
+    # the way /suggest combines the per-user and the global limits
+    user_limiter = TokenBucketLimiter(rate=0.01, burst=1)
+    global_limiter = TokenBucketLimiter(rate=0.01, burst=1)
+    assert global_limiter.allow(now=0)
+    assert user_limiter.allow(1, now=0)
+    assert not global_limiter.allow(now=0)
+    user_limiter.refund(1, now=0)
+    assert user_limiter.allow(1, now=0)
+    assert not user_limiter.violations
@@ -0,0 +1,27 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from replay_updates import copy_database
+
+
+def test_copy_database_includes_the_wal(tmp_path: Path) -> None:
+    live, scratch = str(tmp_path / 'live.db'), str(tmp_path / 'replay.db')
+    with closing(sqlite3.connect(live)) as connection:
+        connection.execute('PRAGMA journal_mode = WAL')
+        # the commits stay in the -wal file, like between checkpoints
+        connection.execute('PRAGMA wal_autocheckpoint = 0')
+        connection.execute('CREATE TABLE predictions (text TEXT)')
+        connection.executemany(
+            'INSERT INTO predictions VALUES (?)',
+            [(f'prediction {i}', ) for i in range(100)]
+        )
+        connection.commit()
+        copy_database(live, scratch)
+    with closing(sqlite3.connect(scratch)) as connection:
+        assert connection.execute(
+            'SELECT COUNT(*) FROM predictions'
+        ).fetchone() == (100, )
+        assert connection.execute('PRAGMA integrity_check').fetchone() == (
+            'ok',
+        )
@@ -0,0 +1,297 @@
+"""
+Conformance checks of the storage backends.
+
+Every test runs against a fresh instance of every PredictionStorage
+backend and describes behaviour the bot relies on, so a backend passing
+them can replace another without touching the handlers.
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Tuple
+
+import pytest
+
+from db_tools import DBToolsAsync
+from memory_storage import MemoryStorageAsync
+from storage import (
+    ApprovalStates, DuplicateUserError, PREDICTION_COLUMNS,
+    PredictionStorage, PredictionStorageAsync,
+)
+
+APPROVED = ApprovalStates.APPROVED.value
+NOT_APPROVED = ApprovalStates.NOT_APPROVED.value
+REJECTED = ApprovalStates.REJECTED.value
+# ids of users added by the tests, far away from the default ones
+CHECK_USER_IDS = iter(range(10 ** 9, 2 * 10 ** 9))
+
+
+def _sqlite_backend(directory: Path) -> PredictionStorageAsync:
+    # without the admission control, which sheds concurrent inline
+    # reads, see benchmarks/db_admission_bench.py
+    return DBToolsAsync(
+        str(directory / 'storage.db'), logging_level=logging.WARNING,
+        max_in_flight=None
+    )
+
+
+def _memory_backend(directory: Path) -> PredictionStorageAsync:
+    return MemoryStorageAsync()
+
+
+# backend name -> factory of a fresh instance in the given directory
+BACKENDS: Dict[str, Callable[[Path], PredictionStorageAsync]] = {
+    'sqlite': _sqlite_backend,
+    'memory': _memory_backend,
+}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def storage(
+    request: pytest.FixtureRequest, tmp_path: Path
+) -> Iterator[PredictionStorageAsync]:
+    backend = BACKENDS[request.param](tmp_path)
+    yield backend
+    backend.executor.shutdown()
+
+
+def _new_user(storage: PredictionStorage) -> int:
+    user_id = next(CHECK_USER_IDS)
+    storage.add_user(user_id, f'user_{user_id}')
+    return user_id
+
+
+def _fields(row: Tuple) -> Dict:
+    return dict(zip(PREDICTION_COLUMNS, row))
+
+
+def test_users(storage: PredictionStorage) -> None:
+    user_id = next(CHECK_USER_IDS)
+    assert not storage.user_exists(user_id)
+    storage.add_user(user_id, 'conformance')
+    assert storage.user_exists(user_id)
+    rows = [
+        row for row in storage.iter_table(storage.USERS_TABLE_NAME)
+        if row['user_id'] == user_id
+    ]
+    assert rows == [{
+        'user_id': user_id, 'user_name': 'conformance', 'state': 'active'
+    }], rows
+
+
+def test_duplicate_user(storage: PredictionStorageAsync) -> None:
+    user_id = _new_user(storage)
+    with pytest.raises(DuplicateUserError):
+        storage.add_user(user_id, 'again')
+
+    async def scenario() -> None:
+        with pytest.raises(DuplicateUserError):
+            await storage.add_user_async(user_id, 'again')
+
+    asyncio.run(scenario())
+    assert [
+        row['user_name']
+        for row in storage.iter_table(storage.USERS_TABLE_NAME)
+        if row['user_id'] == user_id
+    ] == [f'user_{user_id}']
+
+
+def test_add_and_get_prediction(storage: PredictionStorage) -> None:
+    user_id = _new_user(storage)
+    first = storage.add_prediction('first', user_id)
+    second = storage.add_prediction(
+        'second', user_id, REJECTED, duplicate_of=first,
+        moderation_priority=3
+    )
+    assert second > first
+    fields = _fields(storage.get_prediction_by_id(first))
+    assert fields['prediction_id'] == first
+    assert fields['prediction_text'] == 'first'
+    assert fields['approval_state'] == NOT_APPROVED
+    assert fields['user_id'] == user_id
+    assert fields['pool_id'] == storage.DEFAULT_POOL_ID
+    assert fields['duplicate_of'] is None
+    assert fields['moderation_priority'] == 0
+    fields = _fields(storage.get_prediction_by_id(second))
+    assert fields['duplicate_of'] == first
+    assert fields['moderation_priority'] == 3
+    assert fields['approval_state'] == REJECTED
+    assert storage.get_prediction_by_id(second + 1000) is None
+
+
+def test_random_approved_by_pool(storage: PredictionStorage) -> None:
+    user_id = _new_user(storage)
+    pool_id = storage.add_pool('conformance')
+    assert storage.get_random_approved_prediction(pool_id) is None
+    prediction_id = storage.add_prediction(
+        'pooled', user_id, APPROVED, pool_id=pool_id
+    )
+    storage.add_prediction('rejected', user_id, REJECTED, pool_id=pool_id)
+    assert storage.get_random_approved_prediction(pool_id) == 'pooled'
+    assert storage.get_random_approved_item(pool_id) == (
+        prediction_id, 'pooled'
+    )
+    assert all(
+        storage.get_random_approved_prediction() != 'pooled'
+        for _ in range(20)
+    )
+    storage.update_prediction_status(prediction_id, REJECTED)
+    assert storage.get_random_approved_prediction(pool_id) is None
+    assert storage.get_random_approved_item(pool_id) is None
+    storage.update_prediction_status(prediction_id, APPROVED)
+    assert storage.get_random_approved_prediction(pool_id) == 'pooled'
+    # a missing prediction is ignored
+    storage.update_prediction_status(prediction_id + 1000, APPROVED)
+
+
+def test_user_predictions_and_statistic(storage: PredictionStorage) -> None:
+    user_id = _new_user(storage)
+    assert storage.get_user_predictions(user_id) == []
+    assert storage.get_user_statistic(user_id) == []
+    ids = [
+        storage.add_prediction(text, user_id, state)
+        for text, state in (
+            ('a', APPROVED), ('b', REJECTED), ('c', NOT_APPROVED),
+            ('d', NOT_APPROVED),
+        )
+    ]
+    storage.update_prediction_status(ids[2], APPROVED)
+    assert [
+        row[0] for row in storage.get_user_predictions(user_id)
+    ] == ids
+    assert storage.get_user_statistic(user_id) == [
+        (APPROVED, 2), (NOT_APPROVED, 1), (REJECTED, 1)
+    ], storage.get_user_statistic(user_id)
+
+
+def test_unapproved_queue(storage: PredictionStorage) -> None:
+    user_id = _new_user(storage)
+    since = storage.add_prediction('mark', user_id, REJECTED)
+    older = len(storage.get_unapproved_predictions())
+    low = storage.add_prediction('low', user_id)
+    high = storage.add_prediction('high', user_id, moderation_priority=2)
+    pool_id = storage.add_pool('queue')
+    middle = storage.add_prediction(
+        'middle', user_id, duplicate_of=low, moderation_priority=1,
+        pool_id=pool_id
+    )
+    expected = [
+        (high, 'high', None, storage.DEFAULT_POOL_ID),
+        (middle, 'middle', low, pool_id),
+        (low, 'low', None, storage.DEFAULT_POOL_ID),
+    ]
+    assert storage.get_unapproved_predictions_since(since) == (
+        expected, older
+    ), storage.get_unapproved_predictions_since(since)
+    assert [
+        row for row in storage.get_unapproved_predictions()
+        if row[0] in (high, middle, low)
+    ] == expected
+    storage.update_prediction_status(high, APPROVED)
+    assert storage.get_unapproved_predictions_since(since) == (
+        expected[1:], older
+    )
+    assert storage.get_unapproved_predictions_since(middle) == ([], older + 2)
+
+
+def test_bot_state(storage: PredictionStorage) -> None:
+    assert storage.get_state('conformance') is None
+    assert storage.get_state('conformance', '0') == '0'
+    storage.set_state('conformance', '1')
+    storage.set_state('conformance', '2')
+    assert storage.get_state('conformance', '0') == '2'
+    storage.set_state('conformance', None)
+    assert storage.get_state('conformance', '0') is None
+
+
+def test_pools(storage: PredictionStorage) -> None:
+    assert storage.get_pools()[storage.DEFAULT_POOL_NAME] == (
+        storage.DEFAULT_POOL_ID
+    )
+    pool_id = storage.add_pool('work')
+    assert pool_id != storage.DEFAULT_POOL_ID
+    assert storage.add_pool('work') == pool_id
+    assert storage.add_pool('home') not in (pool_id, storage.DEFAULT_POOL_ID)
+    assert storage.get_pools()['work'] == pool_id
+    assert storage.get_pool_name(pool_id) == 'work'
+    assert storage.get_pool_name(pool_id + 1000) is None
+    assert storage.get_chat_pool(-100) == storage.DEFAULT_POOL_ID
+    storage.set_chat_pool(-100, pool_id)
+    storage.set_chat_pool(-200, storage.DEFAULT_POOL_ID)
+    assert storage.get_chat_pool(-100) == pool_id
+    storage.set_chat_pool(-100, storage.DEFAULT_POOL_ID)
+    assert storage.get_chat_pool(-100) == storage.DEFAULT_POOL_ID
+
+
+def test_leaderboard(storage: PredictionStorage) -> None:
+    with pytest.raises(ValueError):
+        storage.get_leaderboard('year', 10)
+    best, second = _new_user(storage), _new_user(storage)
+    for text in ('a', 'b'):
+        storage.add_prediction(text, best, APPROVED)
+    approved_later = storage.add_prediction('c', best)
+    storage.update_prediction_status(approved_later, APPROVED)
+    revoked = storage.add_prediction('d', best, APPROVED)
+    storage.update_prediction_status(revoked, REJECTED)
+    storage.add_prediction('e', second, APPROVED)
+    storage.add_prediction('f', second, REJECTED)
+    for period in storage.LEADERBOARD_PERIODS:
+        leaders = storage.get_leaderboard(period, 1000)
+        approved = [row[2] for row in leaders]
+        assert approved == sorted(approved, reverse=True), (period, leaders)
+        assert all(count > 0 for count in approved)
+        rows = {row[0]: row for row in leaders}
+        assert rows[best] == (best, f'user_{best}', 3), (period, leaders)
+        assert rows[second] == (second, f'user_{second}', 1)
+        assert len(storage.get_leaderboard(period, 1)) == 1
+
+
+def test_iter_predictions(storage: PredictionStorage) -> None:
+    user_id = _new_user(storage)
+    prediction_id = storage.add_prediction('streamed', user_id, APPROVED)
+    rows = list(storage.iter_table(storage.PREDICTIONS_TABLE_NAME))
+    assert all(set(PREDICTION_COLUMNS) <= set(row) for row in rows)
+    streamed = [row for row in rows if row['prediction_id'] == prediction_id]
+    assert len(streamed) == 1
+    assert streamed[0]['prediction_text'] == 'streamed'
+    with pytest.raises(ValueError):
+        list(storage.iter_table('sqlite_master'))
+
+
+def test_async_counterparts(storage: PredictionStorageAsync) -> None:
+    async def scenario() -> None:
+        user_id = next(CHECK_USER_IDS)
+        await storage.add_user_async(user_id, 'async')
+        assert await storage.user_exists_async(user_id)
+        pool_id = await storage.add_pool_async('async')
+        prediction_id = await storage.add_prediction_async(
+            'async', user_id, pool_id=pool_id
+        )
+        await storage.update_prediction_status_async(prediction_id, APPROVED)
+        assert await storage.get_random_approved_prediction_async(
+            pool_id
+        ) == 'async'
+        assert await storage.get_random_approved_item_async(
+            pool_id
+        ) == (prediction_id, 'async')
+        assert (
+            await storage.get_prediction_by_id_async(prediction_id)
+            == storage.get_prediction_by_id(prediction_id)
+        )
+        assert await storage.get_user_statistic_async(user_id) == [
+            (APPROVED, 1)
+        ]
+        await storage.set_chat_pool_async(-300, pool_id)
+        assert await storage.get_chat_pool_async(-300) == pool_id
+        assert await storage.get_pool_name_async(pool_id) == 'async'
+        assert (await storage.get_pools_async())['async'] == pool_id
+        await storage.set_state_async('async', 'value')
+        assert await storage.get_state_async('async') == 'value'
+        leaders = await storage.get_leaderboard_async('all', 1000)
+        assert (user_id, 'async', 1) in leaders
+        assert (await storage.get_unapproved_predictions_since_async(
+            prediction_id
+        ))[0] == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from pathlib import Path
+
+from telegram import Update
+
+from update_recorder import UpdateRecorder, read_recording
+
+USER = {
+    'id': 123456789, 'is_bot': False, 'first_name': 'Ivan',
+    'last_name': 'Petrov', 'username': 'ivan_petrov',
+}
+FORWARDED_USER = {
+    'id': 987654321, 'is_bot': False, 'first_name': 'Maria',
+    'last_name': 'Sidorova', 'username': 'maria_s',
+}
+JOINED_USER = {
+    'id': 555666777, 'is_bot': False, 'first_name': 'Oleg',
+    'username': 'oleg_joined',
+}
+GROUP = {'id': -1001234567890, 'type': 'supergroup', 'title': 'Family'}
+PERSONAL_VALUES = (
+    '123456789', '987654321', '555666777', '1234567890', 'Ivan', 'Petrov',
+    'ivan_petrov', 'Maria', 'Sidorova', 'maria_s', 'Oleg', 'oleg_joined',
+    'Family', '+79001234567',
+)
+
+
+def _update(message: dict) -> Update:
+    return Update.de_json({'update_id': 1, 'message': {
+        'message_id': 1, 'date': 1700000000, 'chat': GROUP, 'from': USER,
+        **message,
+    }}, None)
+
+
+def test_anonymize_removes_every_user_and_chat(tmp_path: Path) -> None:
+    file_path = str(tmp_path / 'updates.jsonl.gz')
+    recorder = UpdateRecorder(file_path, anonymize=True, salt=b'salt')
+    updates = [
+        _update({'text': 'hello', 'forward_origin': {
+            'type': 'user', 'date': 1700000000,
+            'sender_user': FORWARDED_USER,
+        }}),
+        _update({'new_chat_members': [JOINED_USER, FORWARDED_USER]}),
+        _update({'left_chat_member': FORWARDED_USER}),
+        _update({'contact': {
+            'phone_number': '+79001234567', 'first_name': 'Maria',
+            'last_name': 'Sidorova', 'user_id': 987654321,
+        }}),
+        _update({'text': 'hidden', 'forward_origin': {
+            'type': 'hidden_user', 'date': 1700000000,
+            'sender_user_name': 'Maria Sidorova',
+        }}),
+    ]
+    for update in updates:
+        asyncio.run(recorder.record(update, None))
+    recorder.close()
+
+    recorded = [update for _, update in read_recording(file_path)]
+    assert len(recorded) == len(updates)
+    serialized = json.dumps(recorded, ensure_ascii=False)
+    for value in PERSONAL_VALUES:
+        assert value not in serialized, value
+
+    forwarded = recorded[0]['message']['forward_origin']['sender_user']
+    joined = recorded[1]['message']['new_chat_members'][1]
+    left = recorded[2]['message']['left_chat_member']
+    contact = recorded[3]['message']['contact']
+    # the same user gets the same id everywhere in the recording
+    assert forwarded['id'] == joined['id'] == left['id'] == contact['user_id']
+    assert forwarded['username'] == f"user{forwarded['id']}"
+    assert recorded[0]['message']['chat']['id'] < 0
+    # the recording is still made of valid updates
+    for update in recorded:
+        assert Update.de_json(update, None).message is not None
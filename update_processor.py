@@ -0,0 +1,133 @@
+"""
+This module provides an update processor for python-telegram-bot that
+processes updates concurrently with a global concurrency cap while
+keeping strict ordering of updates within every chat and every user.
+
+- Inline queries and chosen inline results fan out freely, only
+  the global cap applies to them.
+- Callback queries (the admin moderation buttons) are serialized
+  among themselves.
+- Every other update waits for the previous updates of the same chat
+  and of the same user to be processed.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, List, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+CALLBACK_QUERY_KEY = ('callback_query', )
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Concurrent update processor with per-chat and per-user ordering.
+
+    The base class semaphore bounds the number of updates accepted for
+    processing (including the ones waiting for their turn), the cap on
+    updates actually running is applied only after the ordering locks
+    are acquired, so updates waiting for their chat don't take slots
+    from other chats.
+
+    Attributes:
+        max_running_updates (int): The global concurrency cap.
+        processed (int): Number of processed updates.
+    """
+
+    def __init__(
+        self, max_running_updates: int, max_pending_updates: int = 1024
+    ):
+        super().__init__(max(max_running_updates, max_pending_updates))
+        self.max_running_updates = max_running_updates
+        self.processed = 0
+        self._running_slots = asyncio.Semaphore(max_running_updates)
+        self._running = 0
+        self._waiting = 0
+        # ordering key -> (lock, number of updates holding or waiting it)
+        self._locks: Dict[Hashable, List[Any]] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def ordering_keys(update: object) -> Tuple[Hashable, ...]:
+        """
+        Returns the keys the update must be ordered by.
+
+        :param update: The incoming update.
+        :return: Ordering keys, always in the same (chat, user) order
+            so updates can never wait for each other in a cycle.
+        """
+        if not isinstance(update, Update):
+            return ()
+        if update.inline_query or update.chosen_inline_result:
+            return ()
+        if update.callback_query:
+            return (CALLBACK_QUERY_KEY, )
+        keys = []
+        if update.effective_chat:
+            keys.append(('chat', update.effective_chat.id))
+        if update.effective_user:
+            keys.append(('user', update.effective_user.id))
+        return tuple(keys)
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        keys = self.ordering_keys(update)
+        locks = [self._acquire_lock_entry(key) for key in keys]
+        acquired = []
+        started = False
+        self._waiting += 1
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            async with self._running_slots:
+                self._waiting -= 1
+                self._running += 1
+                started = True
+                try:
+                    await coroutine
+                finally:
+                    self._running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self._waiting -= 1
+            for lock in acquired:
+                lock.release()
+            for key in keys:
+                self._release_lock_entry(key)
+
+    def _acquire_lock_entry(self, key: Hashable) -> asyncio.Lock:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_lock_entry(self, key: Hashable) -> None:
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the processing statistic.
+
+        :return: A dict with the number of running, waiting (for their
+            turn or for a slot) and processed updates and the number of
+            ordering keys currently in use.
+        """
+        return {
+            'running': self._running,
+            'waiting': self._waiting,
+            'processed': self.processed,
+            'ordering_keys': len(self._locks),
+        }
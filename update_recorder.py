@@ -0,0 +1,156 @@
+"""
+This module provides recording of incoming telegram updates
+to a gzip-compressed JSON lines file, so production traffic can be
+replayed offline with replay_updates.py.
+
+Every line of a recording looks like:
+    {"ts": <unix timestamp>, "update": <Update.to_dict()>}
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from utils import setup_logger
+
+# keys of nested objects that describe a user or a chat, or carry
+# personal fields; other dicts shaped like a User or a Chat (see
+# _is_user_or_chat) are anonymized too, whatever their key
+ANONYMIZED_OBJECTS = (
+    'from', 'user', 'chat', 'sender_chat', 'forward_from', 'sender_user',
+    'new_chat_members', 'left_chat_member', 'contact', 'forward_origin',
+    'origin',
+)
+# personal fields that are dropped from anonymized objects
+PERSONAL_FIELDS = ('last_name', 'title', 'vcard', 'author_signature')
+# required personal fields that are replaced with a placeholder
+PLACEHOLDER_FIELDS = {
+    'first_name': 'Anonymous', 'sender_user_name': 'Anonymous',
+    'phone_number': '0',
+}
+# integer fields holding a user or a chat id, anywhere in the update
+ANONYMIZED_ID_FIELDS = (
+    'user_id', 'chat_id', 'migrate_to_chat_id', 'migrate_from_chat_id',
+)
+
+
+class UpdateRecorder:
+    """
+    Writes incoming updates with their arrival time to a gzip-compressed
+    JSON lines file.
+
+    Attributes:
+        file_path (str): The path of the recording.
+        anonymize (bool): Whether user and chat ids and names
+            are replaced before writing.
+        logger (logging.Logger): The logger instance for this class.
+    """
+
+    def __init__(
+        self, file_path: str, anonymize: bool = False,
+        salt: Optional[bytes] = None, logging_level: int = logging.INFO
+    ):
+        self.file_path = file_path
+        self.anonymize = anonymize
+        # a random salt makes anonymized ids unlinkable between recordings
+        # (os.urandom, because the local secrets.py shadows the stdlib one)
+        self._salt = salt if salt is not None else os.urandom(16)
+        self._file = gzip.open(file_path, 'at', encoding='utf-8')
+        setup_logger(self.__class__.__name__, level=logging_level)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(
+            'Recording updates to %s (anonymize=%s)', file_path, anonymize
+        )
+
+    # noinspection PyUnusedLocal
+    async def record(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        """
+        Writes the update to the recording. Meant to be registered
+        as a TypeHandler callback.
+
+        :param update: The incoming update.
+        :param context: The context object for this update.
+        :return: None
+        """
+        update_dict = update.to_dict()
+        if self.anonymize:
+            update_dict = self._anonymized(update_dict)
+        self._file.write(
+            json.dumps(
+                {'ts': time.time(), 'update': update_dict},
+                ensure_ascii=False
+            ) + '\n'
+        )
+
+    def close(self) -> None:
+        """Flushes and closes the recording."""
+        self._file.close()
+        self.logger.info('Recording %s closed', self.file_path)
+
+    def _anonymized_id(self, value: int) -> int:
+        digest = hmac.new(
+            self._salt, str(abs(value)).encode(), hashlib.sha256
+        ).digest()
+        # keep ids positive/negative as telegram does for users/groups
+        anonymized = int.from_bytes(digest[:6], 'big') or 1
+        return -anonymized if value < 0 else anonymized
+
+    def _anonymized(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            personal = key in ANONYMIZED_OBJECTS or _is_user_or_chat(value)
+            result = {}
+            for item_key, item_value in value.items():
+                if personal and item_key in PERSONAL_FIELDS:
+                    continue
+                if (
+                    item_key in ANONYMIZED_ID_FIELDS
+                    and isinstance(item_value, int)
+                ):
+                    result[item_key] = self._anonymized_id(item_value)
+                else:
+                    result[item_key] = self._anonymized(item_value, item_key)
+            if personal:
+                if isinstance(value.get('id'), int):
+                    result['id'] = self._anonymized_id(value['id'])
+                for field, placeholder in PLACEHOLDER_FIELDS.items():
+                    if field in result:
+                        result[field] = placeholder
+                # keep usernames present, handlers store them
+                if 'username' in result:
+                    result['username'] = f"user{abs(result.get('id', 0))}"
+            return result
+        if isinstance(value, list):
+            return [self._anonymized(item, key) for item in value]
+        return value
+
+
+def _is_user_or_chat(value: Dict) -> bool:
+    # User has first_name, Chat has type, both have an integer id
+    return isinstance(value.get('id'), int) and (
+        'first_name' in value or 'type' in value
+    )
+
+
+def read_recording(file_path: str) -> Iterator[Tuple[float, Dict]]:
+    """
+    Reads a recording written by UpdateRecorder.
+
+    :param file_path: The path of the recording.
+    :return: An iterator of (timestamp, update dict) tuples.
+    """
+    with gzip.open(file_path, 'rt', encoding='utf-8') as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record['ts'], record['update']
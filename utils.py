@@ -1,6 +1,7 @@
 # TODO: add docstring
 
 import logging
+import os
 from pathlib import Path
 
 
@@ -8,18 +9,30 @@ def setup_logger(
     logger_name, log_file=None, level=logging.INFO,
     formatter_str='%(asctime)s - %(name)s - %(levelname)s: %(message)s'
 ):
-    """Setup logger with a given name. Creates a log folder if it does not exist."""
+    """
+    Setup logger with a given name. Creates a log folder if it does not exist.
+    Safe to call again for the same logger (e.g. by every instance of
+    a class): only the level is updated and missing handlers are added,
+    so messages are never logged twice.
+    """
     logger = logging.getLogger(logger_name)
     logger.setLevel(level)
     formatter = logging.Formatter(formatter_str)
 
     # console output
-    streamHandler = logging.StreamHandler()
-    streamHandler.setFormatter(formatter)
-    logger.addHandler(streamHandler)
+    if not any(
+        type(handler) is logging.StreamHandler for handler in logger.handlers
+    ):
+        streamHandler = logging.StreamHandler()
+        streamHandler.setFormatter(formatter)
+        logger.addHandler(streamHandler)
 
     # file output
-    if log_file is not None:
+    if log_file is not None and not any(
+        isinstance(handler, logging.FileHandler)
+        and handler.baseFilename == os.path.abspath(log_file)
+        for handler in logger.handlers
+    ):
         # TODO: spilt to path and file_name parameters
         Path(log_file.rsplit('/', 1)[0]).mkdir(parents=True, exist_ok=True)
         fileHandler = logging.FileHandler(log_file, encoding='utf-8')